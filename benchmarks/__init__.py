@@ -0,0 +1,7 @@
+'''
+Benchmarks of finndex, each run as a module from the repository root (ex.: python -m benchmarks.suite), so that both
+the finndex package and the shared upstream stubs (benchmarks.stubupstream) are importable.
+'''
+
+__author__ = "Finn Frankis"
+__copyright__ = "Copyright 2020, Crypticko"
@@ -0,0 +1,99 @@
+'''
+Benchmarks news article extraction on saved article pages (benchmarks/fixtures/articles), comparing the original approach
+(each page downloaded in turn, fully parsed with html.parser, and its text built with repeated concatenation) with the
+concurrent, strained, cached extraction stage in webutil.
+
+Run from the repository root with:
+   python -m benchmarks.bench_article_extraction
+'''
+
+import os
+import time
+
+import requests
+from bs4 import BeautifulSoup
+
+from finndex.util import webutil
+from benchmarks.stubupstream import StubNewsSites
+
+__author__ = "Finn Frankis"
+__copyright__ = "Copyright 2020, Crypticko"
+
+FIXTURES_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'articles')
+FIXTURES = {'cnn': 'cnn.html', 'CoinDesk': 'coindesk.html', 'business-insider': 'businessinsider.html'}
+
+ARTICLES = 30
+LATENCY = 0.1 # seconds per page
+REPEATS = 20
+
+def extract_cnn_text_originally(content):
+   parser = BeautifulSoup(content, 'html.parser')
+   text = ''
+   for element in parser.select('div'):
+      if element.has_attr('class') and 'zn-body__paragraph' in element['class']:
+         text += element.text
+   return text.replace('"', ' ')
+
+def extract_coin_desk_text_originally(content):
+   parser = BeautifulSoup(content, 'html.parser')
+   text = ""
+   for element in parser.find_all("div", {"class": "article-pharagraph"}):
+      text += element.text
+   return text
+
+def extract_business_insider_text_originally(content):
+   parser = BeautifulSoup(content, 'html.parser')
+   text = ""
+   for element in parser.find_all("p", {"class": ""}):
+      if element.img == None:
+         text += element.text
+   return text.replace("\n", "").replace("\xa0", " ")
+
+ORIGINAL_EXTRACTORS = {'cnn': extract_cnn_text_originally,
+                       'CoinDesk': extract_coin_desk_text_originally,
+                       'business-insider': extract_business_insider_text_originally}
+
+def time_parsing(pages, extractors):
+   start = time.perf_counter()
+   for repeat in range(REPEATS):
+      for source, content in pages.items():
+         extractors[source](content)
+   return (time.perf_counter() - start) / REPEATS / len(pages) * 1000
+
+def main():
+   pages = {}
+   for source, name in FIXTURES.items():
+      with open(os.path.join(FIXTURES_DIRECTORY, name), encoding='utf-8') as page:
+         pages[source] = page.read()
+
+   for source, content in pages.items():
+      assert webutil.ARTICLE_EXTRACTORS[source](content) == ORIGINAL_EXTRACTORS[source](content), source
+
+   print("parsing per page ({}):".format(webutil.get_html_parser()))
+   print("   full parse, concatenation: {:8.1f} ms".format(time_parsing(pages, ORIGINAL_EXTRACTORS)))
+   print("   strained parse, join:      {:8.1f} ms".format(time_parsing(pages, webutil.ARTICLE_EXTRACTORS)))
+
+   stub = StubNewsSites(FIXTURES_DIRECTORY, latency=LATENCY)
+   sources = list(FIXTURES)
+   articles = [(sources[article % len(sources)], "{}/{}?article={}".format(stub.address, FIXTURES[sources[article % len(sources)]], article))
+                  for article in range(ARTICLES)]
+
+   print("{} articles at {:.0f} ms per page:".format(ARTICLES, LATENCY * 1000))
+   start = time.perf_counter()
+   expected = [ORIGINAL_EXTRACTORS[source](requests.get(url).content.decode('utf-8')) for source, url in articles]
+   print("   one after another:         {:8.1f} ms".format((time.perf_counter() - start) * 1000))
+
+   start = time.perf_counter()
+   actual = webutil.get_article_texts(articles)
+   print("   concurrent extraction:     {:8.1f} ms".format((time.perf_counter() - start) * 1000))
+   assert actual == expected
+
+   stub.requests = 0
+   start = time.perf_counter()
+   webutil.get_article_texts(articles)
+   print("   cached extraction:         {:8.1f} ms ({} requests)".format((time.perf_counter() - start) * 1000, stub.requests))
+
+   stub.shutdown()
+
+if __name__ == "__main__":
+   main()
@@ -0,0 +1,67 @@
+'''
+Benchmarks scoring candidate weight vectors against forward returns, comparing one weighted average and one pearsonr
+call per (weight vector, currency) pair with the vectorized backtest engine.
+
+Run from the repository root with:
+   python -m benchmarks.bench_backtest
+'''
+
+import time
+
+import numpy as np
+import pandas as pd
+from scipy.stats import pearsonr
+
+from finndex.aggregate import backtest, panel
+from finndex.util.cryptocurrencies import Cryptocurrencies
+
+__author__ = "Finn Frankis"
+__copyright__ = "Copyright 2020, Crypticko"
+
+DAYS = 3 * 365
+METRICS = ["FearGreed", "Trends", "BlkCnt", "TxCnt", "AdrActCnt"]
+LOOPED_CONFIGURATIONS = 500
+VECTORIZED_CONFIGURATIONS = 100000
+
+def build_backtest():
+   rng = np.random.default_rng(0)
+   currencies = list(Cryptocurrencies)
+   dates = pd.date_range("2017-01-01", periods=DAYS, freq="D", name="date")
+   values = rng.uniform(0, 1, size=(DAYS, len(currencies), len(METRICS)))
+   prices = 1000 * np.exp(np.cumsum(rng.normal(0, 0.03, size=(DAYS, len(currencies))), axis=0))
+   return backtest.Backtest(panel.MetricPanel(dates, currencies, METRICS, values), prices, horizon=7)
+
+def score_individually(engine, weights_matrix):
+   '''
+   ' The original approach: compute each weight vector's scores, then call pearsonr once per currency.
+   '''
+   correlations = np.empty((len(engine.panel.currencies), len(weights_matrix)))
+   present = ~np.isnan(engine.returns[:, 0])
+   for configuration, weights in enumerate(weights_matrix):
+      scores = engine.panel.weigh(weights)
+      for currency in range(len(engine.panel.currencies)):
+         correlations[currency, configuration] = pearsonr(scores[present, currency], engine.returns[present, currency])[0]
+   return correlations
+
+def main():
+   engine = build_backtest()
+   weights_matrix = backtest.random_weights(len(METRICS), LOOPED_CONFIGURATIONS, seed=0)
+
+   start = time.perf_counter()
+   expected = score_individually(engine, weights_matrix)
+   print("pearsonr per configuration:   {:9.1f} ms for {} configurations".format((time.perf_counter() - start) * 1000,
+                                                                                  LOOPED_CONFIGURATIONS))
+
+   start = time.perf_counter()
+   actual = engine.score(weights_matrix)
+   print("vectorized engine:            {:9.1f} ms for {} configurations".format((time.perf_counter() - start) * 1000,
+                                                                                  LOOPED_CONFIGURATIONS))
+   assert np.allclose(expected, actual[:-1])
+
+   start = time.perf_counter()
+   engine.random_search(VECTORIZED_CONFIGURATIONS, seed=0)
+   print("vectorized random search:     {:9.1f} ms for {} configurations".format((time.perf_counter() - start) * 1000,
+                                                                                  VECTORIZED_CONFIGURATIONS))
+
+if __name__ == "__main__":
+   main()
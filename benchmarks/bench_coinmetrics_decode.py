@@ -0,0 +1,84 @@
+'''
+Benchmarks the decoding of a CoinMetrics API payload into a data frame, comparing the columnar decoder against the
+original row-wise parse path on a synthetic 10-year, 10-metric payload.
+
+Run from the repository root with:
+   python -m benchmarks.bench_coinmetrics_decode
+'''
+
+import datetime
+import json
+import random
+import timeit
+
+import pandas as pd
+
+from finndex.fundamental import coinmetrics
+
+__author__ = "Finn Frankis"
+__copyright__ = "Copyright 2020, Crypticko"
+
+YEARS = 10
+METRICS = 10
+MISSING_PROBABILITY = 0.02
+REPEATS = 5
+
+def build_payload(years = YEARS, metrics = METRICS):
+   '''
+   ' Builds a synthetic CoinMetrics 'metricData' dictionary with one entry per day and a small fraction of missing values.
+   '
+   ' years (int): the number of years of daily history to generate
+   ' metrics (int): the number of metrics per day
+   '''
+   random.seed(0)
+   metric_codes = ["Metric{}".format(i) for i in range(metrics)]
+   start = datetime.date(2010, 1, 1)
+
+   series = []
+   for day in range(years * 365):
+      date = start + datetime.timedelta(days=day)
+      values = [None if random.random() < MISSING_PROBABILITY else "{:.6f}".format(random.uniform(0, 1e6)) 
+                  for metric in metric_codes]
+      series += [{'time': date.strftime("%Y-%m-%dT00:00:00.000Z"), 'values': values}]
+
+   return {'metrics': metric_codes, 'series': series}
+
+def decode_row_wise(metric_data):
+   '''
+   ' The original parse path of get_coinmetrics_dates, retained for comparison.
+   '
+   ' metric_data (dict): the 'metricData' portion of a CoinMetrics API response
+   '''
+   metrics_list_retrieved = metric_data['metrics']
+   metrics_frame = pd.DataFrame(metric_data['series'])
+   metrics_frame = pd.concat([metrics_frame.drop('values',axis=1), metrics_frame['values'].apply(pd.Series)],axis=1)
+   metrics_frame = metrics_frame.rename({i:metric for (i, metric) in enumerate(metrics_list_retrieved)}, axis=1)
+   metrics_frame = metrics_frame.rename({'time':'date'}, axis=1)
+   metrics_frame.index = pd.to_datetime(metrics_frame['date'])
+   metrics_frame.index = metrics_frame.index.tz_localize(None)
+   metrics_frame.index = metrics_frame.index.floor('d')
+
+   for metric in metrics_list_retrieved:
+      metrics_frame[metric] = metrics_frame.apply(lambda row: float(row[metric]) if row[metric] != None else None, axis=1)
+
+   return metrics_frame[metrics_list_retrieved].astype('float')
+
+def main():
+   payload = build_payload()
+   raw = json.dumps({'metricData': payload})
+   print("Payload: {} days x {} metrics ({:.1f} MB of JSON)".format(len(payload['series']), len(payload['metrics']), 
+                                                                   len(raw) / 1e6))
+
+   expected = decode_row_wise(payload)
+   actual = coinmetrics.decode_metric_data(payload)
+   assert (expected.values == actual.values)[~expected.isna().values].all() and (expected.index == actual.index).all()
+
+   for name, decoder in [("row-wise", decode_row_wise), ("columnar", coinmetrics.decode_metric_data)]:
+      best = min(timeit.repeat(lambda: decoder(payload), number=1, repeat=REPEATS))
+      print("{:>10}: {:8.2f} ms".format(name, best * 1000))
+
+   best = min(timeit.repeat(lambda: json.loads(raw), number=1, repeat=REPEATS))
+   print("{:>10}: {:8.2f} ms".format("json.loads", best * 1000))
+
+if __name__ == "__main__":
+   main()
@@ -0,0 +1,71 @@
+'''
+Measures the cold-start import time of the finndex package and its main modules using `python -X importtime`, and
+checks that importing them neither launches the NLP server nor loads the heavy optional dependencies.
+
+Run from the repository root with:
+   python -m benchmarks.bench_import
+'''
+
+import os
+import subprocess
+import sys
+
+__author__ = "Finn Frankis"
+__copyright__ = "Copyright 2020, Crypticko"
+
+MODULES = ["finndex",
+           "finndex.fundamental.coinmetrics",
+           "finndex.sentiment.fearandgreed",
+           "finndex.sentiment.trends",
+           "finndex.aggregate.historical"]
+
+# modules which should only be loaded once the feature needing them runs
+DEFERRED_MODULES = ["IPython", "ipywidgets", "scipy", "plotly", "pytrends", "bs4"]
+
+SLOWEST_SHOWN = 5
+REPEATS = 3
+
+def measure_import(module):
+   '''
+   ' Imports a module in a fresh interpreter under `python -X importtime`. Returns the total import time in
+   ' microseconds, the slowest imports as (cumulative microseconds, name) pairs, and the deferred modules which were loaded.
+   '
+   ' module (str): the dotted name of the module to be imported
+   '''
+   check = "import sys, {}; print(','.join(name for name in {} if name in sys.modules))".format(module, DEFERRED_MODULES)
+   completed = subprocess.run([sys.executable, "-X", "importtime", "-c", check],
+                              capture_output=True, text=True, check=True, env=dict(os.environ, PYTHONPATH=os.getcwd()))
+
+   timings = []
+   for line in completed.stderr.splitlines():
+      if not line.startswith("import time:") or "cumulative" in line:
+         continue
+      _, cumulative, name = line[len("import time:"):].split("|")
+      name = name[1:] # drop the single space which follows the separator
+      timings += [(int(cumulative), name.rstrip())]
+
+   # -X importtime indents nested imports, so the unindented entries together account for the whole import
+   top_level = [(cumulative, name) for cumulative, name in timings if name == name.lstrip()]
+   total = sum(cumulative for cumulative, name in top_level)
+
+   loaded = [name for name in completed.stdout.strip().split(",") if name]
+   return total, sorted(timings, reverse=True)[:SLOWEST_SHOWN], loaded
+
+def main():
+   failed = False
+   for module in MODULES:
+      runs = [measure_import(module) for repeat in range(REPEATS)]
+      total, slowest, loaded = min(runs, key=lambda run: run[0])
+
+      print("{}: {:.1f} ms".format(module, total / 1000))
+      for cumulative, name in slowest:
+         print("   {:8.1f} ms  {}".format(cumulative / 1000, name.strip()))
+      if loaded:
+         print("   loaded deferred modules: {}".format(", ".join(loaded)))
+         failed = True
+
+   if failed:
+      sys.exit(1)
+
+if __name__ == "__main__":
+   main()
@@ -0,0 +1,74 @@
+'''
+Benchmarks news sentiment scoring against a stub Stanford NLP server with a fixed per-request latency, comparing one
+annotate request per article (the original approach) with the batched, concurrent, cached pipeline and with the
+in-process lexicon scorer.
+
+Run from the repository root with:
+   python -m benchmarks.bench_nlp_pipeline
+'''
+
+import json
+import random
+import time
+
+import numpy as np
+import requests
+
+from finndex.sentiment import lexicon, pipeline
+from benchmarks.stubupstream import StubCoreNLP
+
+__author__ = "Finn Frankis"
+__copyright__ = "Copyright 2020, Crypticko"
+
+ARTICLES = 50
+SENTENCES_PER_ARTICLE = 40
+LATENCY = 0.05 # seconds per annotate request
+NLP_TIMEOUT = 100000
+
+WORDS = ["bitcoin", "rallied", "market", "investors", "fear", "price", "surged", "fell", "regulators", "exchange"]
+
+def build_articles(count = ARTICLES):
+   random.seed(0)
+   return [". ".join(" ".join(random.choice(WORDS) for word in range(12)) for sentence in range(SENTENCES_PER_ARTICLE))
+              for article in range(count)]
+
+def score_individually(server_url, texts):
+   '''
+   ' The original approach: one annotate request per article, sent one after another.
+   '''
+   properties = {'annotators': 'sentiment', 'outputFormat': 'json', 'timeout': NLP_TIMEOUT}
+   averages = []
+   for text in texts:
+      response = requests.post(server_url, params={'properties': json.dumps(properties)}, data=text.encode('utf-8'))
+      averages += [np.average([float(sentence['sentimentValue']) for sentence in response.json()['sentences']])]
+   return averages
+
+def main():
+   stub = StubCoreNLP(latency=LATENCY)
+   articles = build_articles()
+
+   start = time.perf_counter()
+   expected = score_individually(stub.address, articles)
+   print("one request per article: {:8.1f} ms ({} requests)".format((time.perf_counter() - start) * 1000, stub.requests))
+
+   scorer = pipeline.CoreNLPPipeline(stub.address, NLP_TIMEOUT, batch_characters=20000)
+   stub.requests = 0
+   start = time.perf_counter()
+   actual = scorer.score_texts(articles)
+   print("batched pipeline:        {:8.1f} ms ({} requests)".format((time.perf_counter() - start) * 1000, stub.requests))
+   assert np.allclose(expected, actual)
+
+   stub.requests = 0
+   start = time.perf_counter()
+   scorer.score_texts(articles)
+   print("cached pipeline:         {:8.1f} ms ({} requests)".format((time.perf_counter() - start) * 1000, stub.requests))
+
+   scorer = lexicon.LexiconScorer()
+   start = time.perf_counter()
+   scorer.score_texts(articles)
+   print("lexicon scorer:          {:8.1f} ms (in-process)".format((time.perf_counter() - start) * 1000))
+
+   stub.shutdown()
+
+if __name__ == "__main__":
+   main()
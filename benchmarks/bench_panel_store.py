@@ -0,0 +1,88 @@
+'''
+Benchmarks opening a multi-year (date x currency x metric) panel and selecting one coin over one year from it, comparing
+a CSV table (shaped like sds358-project/aggregate.csv, with one column per coin and metric), a JSON document, and the
+memory-mapped panel store.
+
+Run from the repository root with:
+   python -m benchmarks.bench_panel_store
+'''
+
+import json
+import os
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from finndex.aggregate import panel, panelstore
+from finndex.util.cryptocurrencies import Cryptocurrencies
+
+__author__ = "Finn Frankis"
+__copyright__ = "Copyright 2020, Crypticko"
+
+YEARS = 10
+METRICS = ["BlkCnt", "CapMrktCurUSD", "TxCnt", "AdrActCnt", "PriceUSD", "Trends", "FearGreed"]
+REPEATS = 5
+
+def build_panel(years = YEARS):
+   rng = np.random.default_rng(0)
+   dates = pd.date_range("2010-01-01", periods=years * 365, freq="D", name="date")
+   currencies = list(Cryptocurrencies)
+   values = rng.uniform(0, 1, size=(len(dates), len(currencies), len(METRICS)))
+   return panel.MetricPanel(dates, currencies, METRICS, values)
+
+def time_repeatedly(function):
+   start = time.perf_counter()
+   for repeat in range(REPEATS):
+      result = function()
+   return (time.perf_counter() - start) / REPEATS * 1000, result
+
+def main():
+   metrics_panel = build_panel()
+   directory = tempfile.mkdtemp(prefix="finndex-panel-")
+   start_date, end_date = pd.Timestamp("2015-01-01"), pd.Timestamp("2016-01-01")
+   currency = Cryptocurrencies.ETHEREUM
+
+   csv_path = os.path.join(directory, "panel.csv")
+   columns = ["{}_{}".format(currency.name, metric) for currency in metrics_panel.currencies for metric in METRICS]
+   frame = pd.DataFrame(metrics_panel.values.reshape(len(metrics_panel.dates), -1), index=metrics_panel.dates,
+                        columns=columns)
+   frame.to_csv(csv_path)
+
+   json_path = os.path.join(directory, "panel.json")
+   with open(json_path, "w") as json_file:
+      json.dump({'dates': [date.strftime("%Y-%m-%d") for date in metrics_panel.dates],
+                 'values': metrics_panel.values.tolist()}, json_file)
+
+   store_path = os.path.join(directory, "store")
+   panelstore.write_panel(store_path, metrics_panel)
+
+   def read_csv():
+      table = pd.read_csv(csv_path, index_col="date", parse_dates=True)
+      window = table.loc[(table.index >= start_date) & (table.index < end_date)]
+      return window[["{}_{}".format(currency.name, metric) for metric in METRICS]].to_numpy()
+
+   def read_json():
+      with open(json_path) as json_file:
+         document = json.load(json_file)
+      dates = pd.DatetimeIndex(document['dates'])
+      selected = (dates >= start_date) & (dates < end_date)
+      return np.array(document['values'])[selected][:, metrics_panel.currencies.index(currency)]
+
+   def read_store():
+      return panelstore.open_panel(store_path).select(start_date, end_date, [currency]).values[:, 0]
+
+   print("{} years x {} coins x {} metrics ({:.1f} MB of values):".format(YEARS, len(metrics_panel.currencies),
+         len(METRICS), metrics_panel.values.nbytes / 1e6))
+   csv_time, expected = time_repeatedly(read_csv)
+   print("   CSV table:      {:8.2f} ms".format(csv_time))
+   json_time, from_json = time_repeatedly(read_json)
+   print("   JSON document:  {:8.2f} ms".format(json_time))
+   store_time, from_store = time_repeatedly(read_store)
+   print("   panel store:    {:8.2f} ms".format(store_time))
+
+   assert np.allclose(expected, from_store) and np.allclose(from_json, from_store)
+
+if __name__ == "__main__":
+   main()
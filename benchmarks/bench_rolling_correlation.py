@@ -0,0 +1,53 @@
+'''
+Benchmarks rolling, lagged correlations between metrics and price, comparing one pearsonr call per window with the
+running-sum computation in finndex.aggregate.analytics.
+
+Run from the repository root with:
+   python -m benchmarks.bench_rolling_correlation
+'''
+
+import time
+
+import numpy as np
+from scipy.stats import pearsonr
+
+from finndex.aggregate import analytics
+
+__author__ = "Finn Frankis"
+__copyright__ = "Copyright 2020, Crypticko"
+
+DAYS = 3 * 365
+CURRENCIES = 10
+METRICS = 5
+WINDOWS = [30, 90]
+LAGS = list(range(-30, 31))
+
+def main():
+   rng = np.random.default_rng(0)
+   values = np.cumsum(rng.normal(0, 1, size=(DAYS, CURRENCIES, METRICS)), axis=0) + 1000
+   prices = np.exp(np.cumsum(rng.normal(0, 0.03, size=(DAYS, CURRENCIES)), axis=0)) * 1000
+
+   windows_per_series = sum(DAYS - window + 1 for window in WINDOWS) * len(LAGS)
+   total_windows = windows_per_series * CURRENCIES * METRICS
+
+   # pearsonr is timed on one (currency, metric) series and extrapolated to the whole panel
+   start = time.perf_counter()
+   expected = np.full((len(LAGS), len(WINDOWS), DAYS), np.nan)
+   for lag_index, lag in enumerate(LAGS):
+      lagged = analytics.shift(values[:, 0, 0], lag)
+      for window_index, window in enumerate(WINDOWS):
+         for end in range(window, DAYS + 1):
+            x, y = lagged[end - window:end], prices[end - window:end, 0]
+            if not np.isnan(x).any():
+               expected[lag_index, window_index, end - 1] = pearsonr(x, y)[0]
+   looped = (time.perf_counter() - start) * CURRENCIES * METRICS
+   print("pearsonr per window:  {:10.1f} s (extrapolated) for {} windows".format(looped, total_windows))
+
+   start = time.perf_counter()
+   correlations = analytics.rolling_correlations(values, prices[:, :, np.newaxis], WINDOWS, LAGS)
+   print("running sums:         {:10.1f} s for {} windows".format(time.perf_counter() - start, total_windows))
+
+   assert np.allclose(expected, correlations[:, :, :, 0, 0], equal_nan=True, atol=1e-8)
+
+if __name__ == "__main__":
+   main()
@@ -0,0 +1,97 @@
+'''
+Benchmarks a sliding-window study over a grid of (window, weights, currencies) configurations, comparing one
+HistoricalSentimentManager per configuration (the loop used by sds358-project) with the process-pool sweep runner, and
+checks that every result of the sweep matches the manager's. Upstream data is served by the in-process stub, so neither
+approach touches the network.
+
+Run from the repository root with:
+   python -m benchmarks.bench_sweep
+'''
+
+import json
+import os
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.stubupstream import HISTORY_END, StubUpstream
+
+__author__ = "Finn Frankis"
+__copyright__ = "Copyright 2020, Crypticko"
+
+WINDOW_DAYS = 90
+STEP_DAYS = 7
+SPAN_DAYS = 2 * 365
+WEIGHT_STEPS = 4
+LOOPED_CONFIGURATIONS = 100
+
+def main():
+   os.environ.setdefault('FINNDEX_CACHE_DIR', tempfile.mkdtemp(prefix="finndex-sweep-"))
+   StubUpstream().install()
+
+   from finndex.aggregate import backtest, sweep
+   from finndex.aggregate.historical import HistoricalMetricType, HistoricalSentimentManager
+   from finndex.util.cryptocurrencies import Cryptocurrencies
+
+   metrics = [HistoricalMetricType.FEAR_AND_GREED, HistoricalMetricType.TRENDS, HistoricalMetricType.DAILY_ADDRESSES,
+              HistoricalMetricType.TRANSACTION_CNT]
+   end_date = pd.Timestamp(HISTORY_END)
+   windows = sweep.get_sliding_windows(end_date - pd.Timedelta(days=SPAN_DAYS), end_date,
+                                       pd.Timedelta(days=WINDOW_DAYS), pd.Timedelta(days=STEP_DAYS))
+   weights_matrix = backtest.grid_weights(len(metrics), WEIGHT_STEPS)
+   currencies_lists = [[Cryptocurrencies.BITCOIN], [Cryptocurrencies.BITCOIN, Cryptocurrencies.ETHEREUM]]
+   grid = sweep.build_grid(windows, weights_matrix, currencies_lists)
+
+   # the loop is timed over a sample (with a warm source cache), then scaled to the whole grid
+   sample = grid[::max(1, len(grid) // LOOPED_CONFIGURATIONS)][:LOOPED_CONFIGURATIONS]
+   start = time.perf_counter()
+   for configuration in sample:
+      HistoricalSentimentManager(metrics, configuration.currencies_list, configuration.start_date.to_pydatetime(),
+                                 configuration.end_date.to_pydatetime(), configuration.weights).get_historical_sentiment()
+   looped = (time.perf_counter() - start) / len(sample) * len(grid)
+   print("manager per configuration:  {:9.1f} s for {} configurations (estimated from {})".format(looped, len(grid),
+                                                                                                 len(sample)))
+
+   output_path = os.path.join(tempfile.mkdtemp(prefix="finndex-sweep-"), "results.jsonl")
+   runner = sweep.SweepRunner(grid, metrics, panel_path=os.path.join(os.path.dirname(output_path), "panel"))
+   start = time.perf_counter()
+   runner.load()
+   loaded = time.perf_counter() - start
+   written = runner.run(output_path)
+   swept = time.perf_counter() - start
+   print("sweep runner ({} workers):   {:9.1f} s for {} configurations ({:.1f} s loading)".format(runner.workers, swept,
+                                                                                                 written, loaded))
+
+   # every result is checked against a manager over its range and currencies, which weighs all of the grid's weights
+   with open(output_path) as results:
+      results = {result['position']: result for result in map(json.loads, results)}
+   assert sorted(results) == list(range(len(grid)))
+
+   expected = {}
+   for position, configuration in enumerate(grid):
+      group = (configuration.start_date, configuration.end_date, tuple(configuration.currencies_list))
+      if group not in expected:
+         manager = HistoricalSentimentManager(metrics, configuration.currencies_list,
+                                              configuration.start_date.to_pydatetime(),
+                                              configuration.end_date.to_pydatetime())
+         expected[group] = (manager.get_panel(), manager.get_historical_sentiments(weights_matrix),
+                            manager.get_aligned_prices())
+      metrics_panel, sentiments, prices = expected[group]
+      sentiment = sentiments[position // len(currencies_lists) % len(weights_matrix)] # the grid's order (see build_grid)
+
+      result = results[position]
+      for currency in configuration.currencies_list:
+         column = metrics_panel.currencies.index(currency)
+         actual = pd.Series(result['sentiment'][currency.value.ticker], dtype='float')
+         assert pd.DatetimeIndex(actual.index).equals(pd.DatetimeIndex(metrics_panel.dates))
+         assert np.allclose(actual.values, sentiment[:, column], equal_nan=True)
+
+         correlation = sweep.correlate(sentiment[:, column], prices[:, column])
+         actual_correlation = result['price_correlation'][currency.value.ticker]
+         assert np.allclose(np.nan if actual_correlation is None else actual_correlation, correlation, equal_nan=True)
+   print("every result matches HistoricalSentimentManager")
+
+if __name__ == "__main__":
+   main()
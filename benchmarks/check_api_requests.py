@@ -0,0 +1,46 @@
+'''
+Checks that the API treats requests which mean the same thing alike and rejects requests which are ambiguous, against
+the local stub upstreams: a batch which lists a coin twice returns the same result (and ETag) as one listing it once,
+and a request which lists a metric twice, or gives more or fewer weights than metrics, is rejected.
+
+Run from the repository root with:
+   python -m benchmarks.check_api_requests
+'''
+
+import datetime
+import os
+import tempfile
+
+from benchmarks.stubupstream import HISTORY_END, StubUpstream
+
+__author__ = "Finn Frankis"
+__copyright__ = "Copyright 2020, Crypticko"
+
+METRICS = 'fear_and_greed,daily_addresses'
+
+def main():
+   os.environ.setdefault('FINNDEX_CACHE_DIR', tempfile.mkdtemp(prefix='finndex-check-'))
+   StubUpstream().install()
+
+   from finndex.api import api
+   client = api.create_app().test_client()
+   dates = "start_date={}&end_date={}".format(HISTORY_END - datetime.timedelta(weeks=4), HISTORY_END)
+
+   once = client.get("/api/batch?coins=btc&{}&metrics={}".format(dates, METRICS))
+   twice = client.get("/api/batch?coins=btc,BTC&{}&metrics={}".format(dates, METRICS))
+   assert once.status_code == 200 and twice.status_code == 200, (once.status_code, twice.status_code)
+   assert twice.get_json() == once.get_json() and twice.headers['ETag'] == once.headers['ETag']
+
+   for path in ["/api/batch?coins=btc&{}&metrics={},fear_and_greed".format(dates, METRICS),
+                "/api/sentiment/coin=btc?{}&metrics={},fear_and_greed".format(dates, METRICS),
+                "/api/sentiment/coin=btc?{}&metrics={}&weights=0.3,0.7,0.9".format(dates, METRICS),
+                "/api/sentiment/coin=btc?{}&metrics={}&weights=1".format(dates, METRICS),
+                "/api/batch?coins=btc,eth&{}&metrics={}&weights=0.3,0.7,0.9".format(dates, METRICS),
+                "/api/batch?coins=btc,eth&{}&metrics={}&weights=1".format(dates, METRICS)]:
+      response = client.get(path)
+      assert response.status_code == 400 and response.get_data(as_text=True).startswith("Error: "), path
+
+   print("every request is handled as expected")
+
+if __name__ == "__main__":
+   main()
@@ -0,0 +1,118 @@
+'''
+Load-tests the finndex API against local stub upstreams, reporting the throughput (requests per second) and latency
+percentiles of a mix of sentiment, price, and batch requests.
+
+Run from the repository root with, for example:
+   python -m benchmarks.loadtest_api --requests 500 --concurrency 16 --latency 0.2 --compute-workers 4
+'''
+
+import argparse
+import datetime
+import os
+import random
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import requests
+
+from benchmarks.stubupstream import HISTORY_END, StubUpstream
+
+__author__ = "Finn Frankis"
+__copyright__ = "Copyright 2020, Crypticko"
+
+COINS = ['btc', 'eth', 'ltc', 'xrp', 'link']
+METRICS = 'fear_and_greed,trends,daily_addresses,transaction_cnt'
+
+def build_paths(count, distinct_ranges):
+   '''
+   ' Builds a random mix of request paths. Fewer distinct date ranges means more repeated (cacheable) requests.
+   '
+   ' count (int): the number of paths
+   ' distinct_ranges (int): the number of distinct date ranges from which each request's range is drawn
+   '''
+   random.seed(0)
+   paths = []
+   for request in range(count):
+      end_date = HISTORY_END - datetime.timedelta(days=random.randrange(distinct_ranges))
+      dates = "start_date={}&end_date={}".format(end_date - datetime.timedelta(weeks=4), end_date)
+      coin = random.choice(COINS)
+
+      kind = random.random()
+      if kind < 0.5:
+         paths += ["/api/sentiment/coin={}?{}&metrics={}".format(coin, dates, METRICS)]
+      elif kind < 0.8:
+         paths += ["/api/price/coin={}?{}".format(coin, dates)]
+      else:
+         paths += ["/api/batch?coins={}&{}&metrics={}".format(",".join(COINS), dates, METRICS)]
+   return paths
+
+def start_server(app, threads):
+   '''
+   ' Serves an application on a free local port in a background thread, using waitress if installed and Werkzeug's
+   ' threaded server otherwise. Returns the server's base address.
+   '''
+   try:
+      import waitress.server
+   except ImportError:
+      from werkzeug.serving import make_server
+      server = make_server('127.0.0.1', 0, app, threaded=True)
+      port = server.server_port
+      target = server.serve_forever
+   else:
+      server = waitress.server.create_server(app, host='127.0.0.1', port=0, threads=threads)
+      port = server.effective_port
+      target = server.run
+
+   threading.Thread(target=target, daemon=True).start()
+   return "http://127.0.0.1:{}".format(port)
+
+def main():
+   parser = argparse.ArgumentParser(description='Load-tests the finndex API against stub upstreams.')
+   parser.add_argument('--requests', type=int, default=300)
+   parser.add_argument('--concurrency', type=int, default=16)
+   parser.add_argument('--latency', type=float, default=0.1, help='the stub upstream latency in seconds')
+   parser.add_argument('--distinct-ranges', type=int, default=30, help='the number of distinct date ranges requested')
+   parser.add_argument('--threads', type=int, default=16, help='the number of server request threads')
+   parser.add_argument('--compute-workers', type=int, default=0)
+   parser.add_argument('--compute-pool', choices=['thread', 'process'], default='thread')
+   args = parser.parse_args()
+
+   os.environ.setdefault('FINNDEX_CACHE_DIR', tempfile.mkdtemp(prefix='finndex-loadtest-'))
+
+   stub = StubUpstream(latency=args.latency)
+   stub.install()
+
+   from finndex.api import api
+   app = api.create_app({'COMPUTE_WORKERS': args.compute_workers, 'COMPUTE_POOL': args.compute_pool})
+   address = start_server(app, args.threads)
+
+   local = threading.local()
+   def timed_get(path):
+      if not hasattr(local, 'session'):
+         local.session = requests.Session()
+      start = time.perf_counter()
+      response = local.session.get(address + path)
+      return time.perf_counter() - start, response.status_code
+
+   paths = build_paths(args.requests, args.distinct_ranges)
+   start = time.perf_counter()
+   with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+      results = list(executor.map(timed_get, paths))
+   elapsed = time.perf_counter() - start
+
+   latencies = np.array([latency for latency, status in results]) * 1000
+   errors = sum(1 for latency, status in results if status != 200)
+
+   print("requests:     {} ({} errors) at concurrency {}".format(len(results), errors, args.concurrency))
+   print("throughput:   {:.1f} requests/s".format(len(results) / elapsed))
+   print("latency p50:  {:.1f} ms".format(np.percentile(latencies, 50)))
+   print("latency p99:  {:.1f} ms".format(np.percentile(latencies, 99)))
+   print("upstream:     {} requests".format(stub.requests))
+
+   stub.shutdown()
+
+if __name__ == '__main__':
+   main()
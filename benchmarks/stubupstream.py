@@ -0,0 +1,392 @@
+'''
+Provides local stand-ins for the upstream services (CoinMetrics, Fear and Greed, Google Trends, the Stanford NLP server,
+and the news sites) so that the benchmarks can run offline with a controllable latency.
+'''
+
+import datetime
+import json
+import os
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+import pandas as pd
+
+__author__ = "Finn Frankis"
+__copyright__ = "Copyright 2020, Crypticko"
+
+HISTORY_END = datetime.date(2020, 6, 1)
+HISTORY_DAYS = 3 * 365
+
+COINMETRICS_DIRECTORY = "coinmetrics" # recorded payloads, one per asset, within a ReplayUpstream directory
+FEAR_AND_GREED_FILE = "fearandgreed.json"
+TRENDS_DIRECTORY = "trends"
+
+def build_coinmetrics_payload(asset, metric_codes, start_date = None, days = HISTORY_DAYS, end_date = HISTORY_END):
+   '''
+   ' Builds a deterministic CoinMetrics 'metricData' dictionary with one reading per day, ending at a fixed date.
+   '
+   ' asset (str): the CoinMetrics asset identifier, which seeds the generated values
+   ' metric_codes (list<str>): the metrics to be generated
+   ' start_date (date): the first date to be included, or None for the full history
+   ' days (int): the length of the full history
+   ' end_date (date): the last date to be included
+   '''
+   first = end_date - datetime.timedelta(days=days - 1)
+   if start_date is not None:
+      first = max(first, start_date)
+
+   rng = np.random.default_rng(sum(map(ord, asset)))
+   walk = np.cumsum(rng.normal(0, 1, size=(days, len(metric_codes))), axis=0) + 1000
+   offset = (first - (end_date - datetime.timedelta(days=days - 1))).days
+
+   series = []
+   for day in range(offset, days):
+      date = end_date - datetime.timedelta(days=days - 1 - day)
+      series += [{'time': date.strftime("%Y-%m-%dT00:00:00.000Z"), 'values': ["{:.4f}".format(value) for value in walk[day]]}]
+
+   return {'metricData': {'metrics': list(metric_codes), 'series': series}}
+
+def build_fear_and_greed_payload(days = HISTORY_DAYS, end_date = HISTORY_END):
+   '''
+   ' Builds a deterministic Fear and Greed API response, ordered from the latest reading to the earliest.
+   '
+   ' days (int): the number of daily readings
+   ' end_date (date): the date of the latest reading
+   '''
+   data = []
+   for day in range(days):
+      date = end_date - datetime.timedelta(days=day)
+      reading = {'value': str((day * 37) % 101), 'value_classification': 'Neutral', 'timestamp': date.strftime("%m-%d-%Y")}
+      if day == 0:
+         reading['time_until_update'] = '3600'
+      data += [reading]
+   return {'name': 'Fear and Greed Index', 'data': data}
+
+def build_trends_series(keyword, start_date, end_date):
+   '''
+   ' Builds a deterministic series of hourly Trends values between two times.
+   '
+   ' keyword (str): the search term, which seeds the generated values
+   ' start_date (datetime) - the start time
+   ' end_date (datetime) - the end time
+   '''
+   index = pd.date_range(start_date, end_date, freq='h', name='date')
+   values = (np.sin(index.asi8 / 3.6e12 / 24 + len(keyword)) + 1) * 50
+   return pd.Series(values.round(), index=index, name=keyword)
+
+class StubUpstream:
+   '''
+   ' Serves CoinMetrics and Fear and Greed payloads from a local HTTP server and provides a Trends fetch function,
+   ' each responding after a fixed latency.
+   '''
+   def __init__(self, latency = 0.0, days = HISTORY_DAYS):
+      '''
+      ' Creates (but does not start) the stub.
+      '
+      ' latency (float): the delay, in seconds, before each response
+      ' days (int): the length of the generated histories
+      '''
+      self.latency = latency
+      self.days = days
+      self.requests = 0
+
+      self._bodies = {} # path -> encoded response
+      self._bodies_lock = threading.Lock()
+
+      stub = self
+
+      class Handler(BaseHTTPRequestHandler):
+         protocol_version = 'HTTP/1.1'
+
+         def log_message(self, format, *args):
+            pass
+
+         def do_GET(self):
+            stub.requests += 1
+            time.sleep(stub.latency)
+
+            body = stub.get_body(self.path)
+            if body is None:
+               self.send_response(404)
+               self.send_header('Content-Length', '0')
+               self.end_headers()
+               return
+
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+      self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+      self.server.daemon_threads = True
+
+   @property
+   def address(self):
+      return "http://127.0.0.1:{}".format(self.server.server_port)
+
+   def get_body(self, path):
+      '''
+      ' Retrieves the encoded response to a request, or None if the path is not served. Each distinct response is built
+      ' once and then reused, so that serving it takes little time from the process being measured.
+      '
+      ' path (str): the requested path, including the query string
+      '''
+      with self._bodies_lock:
+         if path in self._bodies:
+            return self._bodies[path]
+
+      url = urlparse(path)
+      query = parse_qs(url.query)
+      if url.path.startswith('/v2/assets/'):
+         start_date = datetime.date.fromisoformat(query['start'][0]) if 'start' in query else None
+         payload = self.get_coinmetrics_payload(url.path.split('/')[3], query['metrics'][0].split(','), start_date)
+      elif url.path.startswith('/fng/'):
+         payload = self.get_fear_and_greed_payload()
+      else:
+         return None
+
+      body = json.dumps(payload).encode('utf-8')
+      with self._bodies_lock:
+         self._bodies[path] = body
+      return body
+
+   def get_coinmetrics_payload(self, asset, metric_codes, start_date):
+      '''
+      ' Builds the response to a CoinMetrics request.
+      '
+      ' asset (str): the CoinMetrics asset identifier
+      ' metric_codes (list<str>): the requested metrics
+      ' start_date (date): the first requested date, or None for the full history
+      '''
+      return build_coinmetrics_payload(asset, metric_codes, start_date, self.days)
+
+   def get_fear_and_greed_payload(self):
+      '''
+      ' Builds the response to a Fear and Greed request.
+      '''
+      return build_fear_and_greed_payload(self.days)
+
+   def get_trends_series(self, keyword, start_date, end_date):
+      '''
+      ' Builds the hourly Trends values of a keyword between two times.
+      '''
+      return build_trends_series(keyword, start_date, end_date)
+
+   def fetch_trends(self, keyword, start_date, end_date):
+      '''
+      ' A replacement for trends.fetch_hourly_interest which responds after the stub's latency.
+      '''
+      self.requests += 1
+      time.sleep(self.latency)
+      return self.get_trends_series(keyword, start_date, end_date)
+
+   def install(self):
+      '''
+      ' Starts the server and points every finndex source at the stub rather than the real upstream services.
+      '''
+      from finndex.fundamental import coinmetrics
+      from finndex.sentiment import fearandgreed, trends
+
+      threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+      coinmetrics.COIN_METRICS_API_PREFIX = self.address + "/v2/"
+      fearandgreed.FEAR_AND_GREED_ADDRESS = self.address + "/fng/?limit=0&date_format=us"
+      trends.TRENDS_CACHE.fetch = self.fetch_trends
+
+   def shutdown(self):
+      self.server.shutdown()
+
+class ReplayUpstream(StubUpstream):
+   '''
+   ' Serves payloads previously saved by record_payloads, falling back to generated payloads for any asset, source, or
+   ' keyword which was not recorded. CoinMetrics responses are trimmed to the requested metrics and start date, as the
+   ' API trims them.
+   '''
+   def __init__(self, directory, latency = 0.0, days = HISTORY_DAYS):
+      '''
+      ' Creates (but does not start) the stub.
+      '
+      ' directory (str): the directory holding the recorded payloads
+      ' latency (float): the delay, in seconds, before each response
+      ' days (int): the length of the generated histories
+      '''
+      super().__init__(latency, days)
+      self.directory = directory
+      self._recorded = {} # path -> loaded payload, or None if not recorded
+
+   def get_coinmetrics_payload(self, asset, metric_codes, start_date):
+      recorded = self._read(COINMETRICS_DIRECTORY, asset + ".json")
+      if recorded is None or not set(metric_codes) <= set(recorded['metricData']['metrics']):
+         return super().get_coinmetrics_payload(asset, metric_codes, start_date)
+
+      metric_data = recorded['metricData']
+      positions = [metric_data['metrics'].index(code) for code in metric_codes]
+      first = start_date.isoformat() if start_date is not None else ""
+
+      series = [{'time': entry['time'], 'values': [entry['values'][position] for position in positions]}
+                  for entry in metric_data['series'] if entry['time'][:10] >= first]
+      return {'metricData': {'metrics': list(metric_codes), 'series': series}}
+
+   def get_fear_and_greed_payload(self):
+      recorded = self._read(FEAR_AND_GREED_FILE)
+      return recorded if recorded is not None else super().get_fear_and_greed_payload()
+
+   def get_trends_series(self, keyword, start_date, end_date):
+      recorded = self._read(TRENDS_DIRECTORY, keyword + ".json")
+      if recorded is None:
+         return super().get_trends_series(keyword, start_date, end_date)
+
+      series = pd.Series(recorded['values'], index=pd.DatetimeIndex(recorded['dates'], name='date'), name=keyword, dtype='float')
+      return series.loc[(series.index >= start_date) & (series.index <= end_date)]
+
+   def _read(self, *components):
+      path = os.path.join(self.directory, *components)
+      if path not in self._recorded:
+         recorded = None
+         if os.path.isfile(path):
+            with open(path) as recording:
+               recorded = json.load(recording)
+         self._recorded[path] = recorded
+      return self._recorded[path]
+
+def record_payloads(directory, assets, metric_codes, keywords = (), trends_start = None, trends_end = None):
+   '''
+   ' Saves the full CoinMetrics history of several assets, the full Fear and Greed history, and (optionally) the hourly
+   ' Trends values of several keywords, as currently served by the upstream services that finndex is pointed at, so
+   ' that ReplayUpstream can later serve them offline.
+   '
+   ' directory (str): the directory in which the payloads are saved
+   ' assets (list<str>): the CoinMetrics asset identifiers (ex.: btc)
+   ' metric_codes (list<str>): the CoinMetrics metrics recorded for every asset
+   ' keywords (list<str>): the Trends search terms (ex.: Bitcoin)
+   ' trends_start (datetime): the first hour of Trends values recorded
+   ' trends_end (datetime): the last hour of Trends values recorded
+   '''
+   from finndex.fundamental import coinmetrics
+   from finndex.sentiment import fearandgreed, trends
+   from finndex.util import webutil
+
+   os.makedirs(os.path.join(directory, COINMETRICS_DIRECTORY), exist_ok=True)
+   os.makedirs(os.path.join(directory, TRENDS_DIRECTORY), exist_ok=True)
+
+   for asset in assets:
+      url = coinmetrics.COIN_METRICS_API_PREFIX + coinmetrics.NETWORK_METRIC_SUFFIX.format(asset) + ",".join(metric_codes)
+      with open(os.path.join(directory, COINMETRICS_DIRECTORY, asset + ".json"), 'w') as recording:
+         recording.write(webutil.getPageContent(url))
+
+   with open(os.path.join(directory, FEAR_AND_GREED_FILE), 'w') as recording:
+      recording.write(webutil.getPageContent(fearandgreed.FEAR_AND_GREED_ADDRESS))
+
+   for keyword in keywords:
+      series = trends.TRENDS_CACHE.fetch(keyword, trends_start, trends_end)
+      with open(os.path.join(directory, TRENDS_DIRECTORY, keyword + ".json"), 'w') as recording:
+         json.dump({'dates': series.index.strftime("%Y-%m-%dT%H:%M:%S").tolist(), 'values': series.tolist()}, recording)
+
+class StubCoreNLP:
+   '''
+   ' Stands in for the Stanford NLP server: splits each posted document into sentences at periods and blank lines and
+   ' assigns every sentence a deterministic sentiment from 0-4, responding after a fixed latency.
+   '''
+   def __init__(self, latency = 0.0):
+      self.latency = latency
+      self.requests = 0
+
+      stub = self
+
+      class Handler(BaseHTTPRequestHandler):
+         protocol_version = 'HTTP/1.1'
+
+         def log_message(self, format, *args):
+            pass
+
+         def do_POST(self):
+            stub.requests += 1
+            document = self.rfile.read(int(self.headers['Content-Length'])).decode('utf-8')
+            time.sleep(stub.latency)
+
+            body = json.dumps({'sentences': annotate_sentences(document)}).encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+      self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+      self.server.daemon_threads = True
+      threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+   @property
+   def address(self):
+      return "http://127.0.0.1:{}".format(self.server.server_port)
+
+   def shutdown(self):
+      self.server.shutdown()
+
+class StubNewsSites:
+   '''
+   ' Serves saved article pages from a directory, responding after a fixed latency. The query string is ignored, so any
+   ' number of distinct URLs can be built for the same page (ex.: /cnn.html?article=3).
+   '''
+   def __init__(self, directory, latency = 0.0):
+      self.directory = directory
+      self.latency = latency
+      self.requests = 0
+
+      stub = self
+
+      class Handler(BaseHTTPRequestHandler):
+         protocol_version = 'HTTP/1.1'
+
+         def log_message(self, format, *args):
+            pass
+
+         def do_GET(self):
+            stub.requests += 1
+            time.sleep(stub.latency)
+
+            path = os.path.join(stub.directory, os.path.basename(urlparse(self.path).path))
+            if not os.path.isfile(path):
+               self.send_response(404)
+               self.send_header('Content-Length', '0')
+               self.end_headers()
+               return
+
+            with open(path, 'rb') as page:
+               body = page.read()
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/html; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+      self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+      self.server.daemon_threads = True
+      threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+   @property
+   def address(self):
+      return "http://127.0.0.1:{}".format(self.server.server_port)
+
+   def shutdown(self):
+      self.server.shutdown()
+
+def annotate_sentences(document):
+   '''
+   ' Splits a document into sentences (at periods and line breaks) in the Stanford NLP server's JSON format, with
+   ' character offsets counted in UTF-16 code units as the server counts them.
+   '
+   ' document (str): the text to be split
+   '''
+   sentences = []
+   position, java_offset = 0, 0
+   for match in re.finditer(r"[^.\n\s][^.\n]*", document):
+      java_offset += len(document[position:match.start()].encode('utf-16-le')) // 2
+      position = match.start()
+      sentences += [{'sentimentValue': str(sum(map(ord, match.group().strip())) % 5),
+                     'tokens': [{'characterOffsetBegin': java_offset}]}]
+   return sentences
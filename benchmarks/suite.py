@@ -0,0 +1,357 @@
+'''
+Times each data path of finndex offline (the CoinMetrics, Fear and Greed, and Trends retrievals, the historical
+sentiment, and the API endpoints) across a grid of history lengths and coin counts, replaying recorded upstream
+payloads through a local stub server. Each case reports its wall time with empty caches (cold) and with the upstream
+caches filled (warm), its peak traced memory, the number of upstream requests, and the time spent in each stage, and
+is compared against the regression thresholds in thresholds.json.
+
+Payloads saved with --record (which requires network access) are replayed where present; any asset, source, or keyword
+not recorded is served from deterministic generated payloads instead. Beyond the ten coins which finndex names,
+synthetic coins are added, so the API endpoints (which accept only named coins) are timed for up to ten. The full
+default grid takes the better part of an hour, nearly all of it in the 100-coin cases, which download tens of thousands
+of Trends chunks into empty caches; pass fewer --years or --coins for a quick check.
+
+Run from the repository root with, for example:
+   python -m benchmarks.suite
+   python -m benchmarks.suite --years 1 3 10 --coins 1 10 100 --benchmarks coinmetrics historical --output results.json
+   python -m benchmarks.suite --update-thresholds
+   python -m benchmarks.suite --record benchmarks/fixtures/upstream
+'''
+
+import argparse
+import collections
+import datetime
+import functools
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import warnings
+from enum import Enum
+
+import numpy as np
+
+from benchmarks.stubupstream import HISTORY_END, ReplayUpstream, record_payloads
+
+__author__ = "Finn Frankis"
+__copyright__ = "Copyright 2020, Crypticko"
+
+BENCHMARKS_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+RECORDINGS_DIRECTORY = os.path.join(BENCHMARKS_DIRECTORY, "fixtures", "upstream")
+THRESHOLDS_PATH = os.path.join(BENCHMARKS_DIRECTORY, "thresholds.json")
+
+DEFAULT_YEARS = [1, 10]
+DEFAULT_COINS = [1, 10, 100]
+HISTORY_YEARS = 11 # the length of the served histories, leaving room before the longest window for interpolation
+REPEATS = 3 # warm runs per case, of which the median is reported
+MAX_API_COINS = 10
+
+TIME_MARGIN = 3.0 # thresholds written by --update-thresholds allow times to grow threefold, since machines vary
+MEMORY_MARGIN = 1.5
+
+COINMETRICS_METRICS = ["BLOCK_COUNT", "TRANSACTION_CNT", "DAILY_ADDRESSES"]
+HISTORICAL_METRICS = ["FEAR_AND_GREED", "TRENDS", "BLOCK_COUNT", "TRANSACTION_CNT", "DAILY_ADDRESSES"]
+RECORDED_METRICS = ["BlkCnt", "CapMrktCurUSD", "PriceUSD", "TxCnt", "AdrActCnt"]
+
+class StageTimer:
+   '''
+   ' Accumulates the time spent within several functions, each assigned to a named stage, by temporarily replacing them
+   ' with timed wrappers. Calls on concurrent threads are summed, so a stage's total may exceed the wall time.
+   '''
+   def __init__(self):
+      self.totals = collections.defaultdict(float)
+      self._patches = []
+      self._lock = threading.Lock()
+
+   def wrap(self, owner, attribute, stage):
+      '''
+      ' Times every call of a function (or method) under a given stage until restore is called.
+      '
+      ' owner (object): the module, class, or instance holding the function
+      ' attribute (str): the name of the function
+      ' stage (str): the stage to which its time is assigned
+      '''
+      raw = owner.__dict__[attribute] if attribute in vars(owner) else getattr(owner, attribute)
+      function = getattr(owner, attribute) if isinstance(raw, classmethod) else raw
+
+      @functools.wraps(function)
+      def timed(*args, **kwargs):
+         start = time.perf_counter()
+         try:
+            return function(*args, **kwargs)
+         finally:
+            with self._lock:
+               self.totals[stage] += time.perf_counter() - start
+
+      # a class method is already bound to its class, so its wrapper must not be bound again
+      setattr(owner, attribute, staticmethod(timed) if isinstance(raw, classmethod) else timed)
+      self._patches += [(owner, attribute, raw)]
+
+   def reset(self):
+      with self._lock:
+         self.totals.clear()
+
+   def restore(self):
+      for owner, attribute, raw in reversed(self._patches):
+         setattr(owner, attribute, raw)
+      self._patches = []
+
+def instrument(timer):
+   '''
+   ' Assigns the functions making up each data path to the stages reported by the suite.
+   '''
+   from finndex.aggregate import panel
+   from finndex.fundamental import coinmetrics, coinmetricscache
+   from finndex.sentiment import fearandgreed, trends, trendscache
+   from finndex.util import webutil
+
+   timer.wrap(webutil, 'getPageContent', 'download')
+   timer.wrap(trends.TRENDS_CACHE, 'fetch', 'download')
+   timer.wrap(coinmetrics, 'decode_metric_data', 'decode')
+   timer.wrap(fearandgreed, 'decode_fg_data', 'decode')
+   timer.wrap(coinmetricscache.CoinMetricsCache, '_load', 'cache')
+   timer.wrap(coinmetricscache.CoinMetricsCache, '_save', 'cache')
+   timer.wrap(trendscache.TrendsCache, '_get_held', 'cache')
+   timer.wrap(coinmetrics, 'get_interpolation_bounds', 'window')
+   timer.wrap(panel.MetricPanel, 'from_frame', 'panel')
+   timer.wrap(panel.MetricPanel, 'weigh', 'weigh')
+
+def build_currencies(count):
+   '''
+   ' Builds a list of currencies: the named cryptocurrencies if there are enough, and otherwise the named ones followed
+   ' by synthetic coins (with ticker symbols such as C011), which the stub serves like any other.
+   '
+   ' count (int): the number of currencies
+   '''
+   from finndex.util.cryptocurrencies import Cryptocurrencies, Stock
+
+   if count <= len(Cryptocurrencies):
+      return list(Cryptocurrencies)[:count]
+
+   members = {currency.name: currency.value for currency in Cryptocurrencies}
+   for number in range(len(Cryptocurrencies) + 1, count + 1):
+      members["COIN_{}".format(number)] = Stock("C{:03d}".format(number), "Coin {}".format(number))
+   return list(Enum("BenchmarkCurrencies", members))
+
+def reset_caches(directory):
+   '''
+   ' Empties every cache held in memory and points the on-disk cache at a new, empty directory.
+   '
+   ' directory (str): the directory beneath which the new cache directory is created
+   '''
+   from finndex.api import api
+   from finndex.fundamental import coinmetrics
+   from finndex.sentiment import fearandgreed, trends
+
+   os.environ['FINNDEX_CACHE_DIR'] = tempfile.mkdtemp(dir=directory)
+   coinmetrics.COIN_METRICS_CACHE.clear()
+   trends.TRENDS_CACHE.clear()
+   fearandgreed.FEAR_AND_GREED_STORE = fearandgreed.FearAndGreedStore()
+   api.RESULT_CACHE.clear()
+
+def build_benchmarks():
+   '''
+   ' Builds a dictionary with each benchmark's name as the key and, as the value, a function which builds the timed
+   ' callable for a list of currencies and a date range (or returns None if the benchmark does not apply to them).
+   '''
+   from finndex.aggregate.historical import HistoricalMetricType, HistoricalSentimentManager
+   from finndex.api import api
+   from finndex.fundamental import coinmetrics
+   from finndex.sentiment import fearandgreed, trends
+   from finndex.util.cryptocurrencies import Cryptocurrencies
+
+   client = api.create_app().test_client()
+
+   def request(paths):
+      api.RESULT_CACHE.clear() # every request is computed, though the upstream caches may already hold its inputs
+      for path in paths:
+         response = client.get(path)
+         assert response.status_code == 200, path
+
+   def api_paths(currencies, start_date, end_date, format_path):
+      if len(currencies) > MAX_API_COINS or not all(isinstance(currency, Cryptocurrencies) for currency in currencies):
+         return None
+      dates = "start_date={}&end_date={}".format(start_date.date(), end_date.date())
+      metrics = ",".join(HISTORICAL_METRICS).lower()
+      paths = format_path([currency.value.ticker.lower() for currency in currencies], dates, metrics)
+      return lambda: request(paths)
+
+   return {
+      'coinmetrics': lambda currencies, start_date, end_date: lambda: coinmetrics.get_coinmetrics_dates(
+                        [coinmetrics.CoinMetricsData[metric] for metric in COINMETRICS_METRICS], start_date, end_date,
+                        currencies),
+      'fear_and_greed': lambda currencies, start_date, end_date: lambda: fearandgreed.get_fg_dates(
+                        start_date, end_date, currencies),
+      'trends': lambda currencies, start_date, end_date: lambda: trends.get_trends_dates(start_date, end_date, currencies),
+      'historical': lambda currencies, start_date, end_date: lambda: HistoricalSentimentManager(
+                        [HistoricalMetricType[metric] for metric in HISTORICAL_METRICS], currencies, start_date,
+                        end_date).get_historical_sentiment(),
+      'api_sentiment': lambda currencies, start_date, end_date: api_paths(currencies, start_date, end_date,
+                        lambda tickers, dates, metrics: ["/api/sentiment/coin={}?{}&metrics={}".format(ticker, dates, metrics)
+                                                         for ticker in tickers]),
+      'api_price': lambda currencies, start_date, end_date: api_paths(currencies, start_date, end_date,
+                        lambda tickers, dates, metrics: ["/api/price/coin={}?{}".format(ticker, dates) for ticker in tickers]),
+      'api_batch': lambda currencies, start_date, end_date: api_paths(currencies, start_date, end_date,
+                        lambda tickers, dates, metrics: ["/api/batch?coins={}&{}&metrics={}".format(",".join(tickers), dates,
+                                                                                                   metrics)]),
+   }
+
+def measure(run, timer, stub, directory):
+   '''
+   ' Measures a single case, returning a dictionary of its results (times in milliseconds, memory in megabytes).
+   '
+   ' run (function): performs the case
+   ' timer (StageTimer): the timer assigned to the instrumented functions
+   ' stub (StubUpstream): the stub serving the upstream requests
+   ' directory (str): the directory beneath which each run's cache directory is created
+   '''
+   # memory is traced in a separate cold run, since tracing slows every allocation; running it first also has the stub
+   # build each response before any run is timed
+   reset_caches(directory)
+   tracemalloc.start()
+   try:
+      run()
+      peak = tracemalloc.get_traced_memory()[1]
+   finally:
+      tracemalloc.stop()
+
+   reset_caches(directory)
+   timer.reset()
+   requests = stub.requests
+   start = time.perf_counter()
+   run()
+   cold = time.perf_counter() - start
+   stages = {stage: total * 1000 for stage, total in sorted(timer.totals.items())}
+   requests = stub.requests - requests
+
+   warm = []
+   for repeat in range(REPEATS):
+      start = time.perf_counter()
+      run()
+      warm += [time.perf_counter() - start]
+
+   return {'cold_ms': cold * 1000, 'warm_ms': float(np.median(warm)) * 1000, 'peak_mb': peak / 1e6,
+           'requests': requests, 'stages_ms': stages}
+
+def get_case_name(benchmark, years, coins):
+   return "{} {}y {}c".format(benchmark, years, coins)
+
+def check_thresholds(results, thresholds):
+   '''
+   ' Compares every result against its thresholds, returning a list of descriptions of those exceeded.
+   '
+   ' results (dict): the results of each case, keyed by case name
+   ' thresholds (dict): the maximum of each measurement of each case, keyed by case name
+   '''
+   regressions = []
+   for name, result in results.items():
+      for measurement, limit in thresholds.get(name, {}).items():
+         if result[measurement] > limit:
+            regressions += ["{}: {} {:.1f} exceeds {:.1f}".format(name, measurement, result[measurement], limit)]
+   return regressions
+
+def build_thresholds(results):
+   '''
+   ' Builds thresholds from a set of results, allowing each time and each peak to grow by a fixed margin.
+   '''
+   return {name: {'cold_ms': round(result['cold_ms'] * TIME_MARGIN, 1),
+                  'warm_ms': round(result['warm_ms'] * TIME_MARGIN, 1),
+                  'peak_mb': round(result['peak_mb'] * MEMORY_MARGIN, 1)} for name, result in sorted(results.items())}
+
+def print_result(name, result):
+   stages = ", ".join("{} {:.1f}".format(stage, total) for stage, total in result['stages_ms'].items())
+   print("{:<28} {:>10.1f} {:>10.1f} {:>9.1f} {:>9}   {}".format(name, result['cold_ms'], result['warm_ms'],
+                                                                result['peak_mb'], result['requests'], stages))
+
+def record(directory):
+   '''
+   ' Records the live upstream payloads of every named coin.
+   '''
+   from finndex.util.cryptocurrencies import Cryptocurrencies
+
+   end_date = datetime.datetime.utcnow().replace(minute=0, second=0, microsecond=0)
+   record_payloads(directory, [currency.value.ticker.lower() for currency in Cryptocurrencies], RECORDED_METRICS,
+                   [currency.value.name for currency in Cryptocurrencies], end_date - datetime.timedelta(weeks=4), end_date)
+   print("Recorded upstream payloads in {}".format(directory))
+
+def main():
+   parser = argparse.ArgumentParser(description='Times the finndex data paths offline against recorded payloads.')
+   parser.add_argument('--years', type=int, nargs='+', default=DEFAULT_YEARS, help='the lengths of the timed windows')
+   parser.add_argument('--coins', type=int, nargs='+', default=DEFAULT_COINS, help='the numbers of coins requested')
+   parser.add_argument('--benchmarks', nargs='+', help='the benchmarks to run (by default, all of them)')
+   parser.add_argument('--latency', type=float, default=0.0, help='the stub upstream latency in seconds')
+   parser.add_argument('--recordings', default=RECORDINGS_DIRECTORY, help='the directory of recorded payloads')
+   parser.add_argument('--thresholds', default=THRESHOLDS_PATH)
+   parser.add_argument('--update-thresholds', action='store_true', help='rewrite the thresholds from this run')
+   parser.add_argument('--output', help='a file to which the results are written as JSON')
+   parser.add_argument('--record', metavar='DIRECTORY', help='record the live upstream payloads and exit')
+   args = parser.parse_args()
+
+   if args.record:
+      record(args.record)
+      return
+
+   # pandas warns that it cannot sort currencies when combining the per-currency Trends frames, which it need not do
+   warnings.filterwarnings('ignore', message="'<' not supported between instances", category=RuntimeWarning)
+
+   directory = tempfile.mkdtemp(prefix='finndex-suite-')
+   os.environ['FINNDEX_CACHE_DIR'] = directory
+
+   stub = ReplayUpstream(args.recordings, latency=args.latency, days=HISTORY_YEARS * 365)
+   stub.install()
+
+   timer = StageTimer()
+   instrument(timer)
+   benchmarks = build_benchmarks()
+
+   end_date = datetime.datetime.combine(HISTORY_END, datetime.time())
+   results = {}
+   print("{:<28} {:>10} {:>10} {:>9} {:>9}   {}".format("case", "cold ms", "warm ms", "peak MB", "requests",
+                                                        "stages, cold ms (summed across threads)"))
+   try:
+      for name in args.benchmarks or benchmarks:
+         for years in args.years:
+            for coins in args.coins:
+               run = benchmarks[name](build_currencies(coins), end_date - datetime.timedelta(days=365 * years), end_date)
+               if run is None:
+                  continue
+               case = get_case_name(name, years, coins)
+               results[case] = measure(run, timer, stub, directory)
+               print_result(case, results[case])
+   finally:
+      timer.restore()
+      stub.shutdown()
+
+   if args.output:
+      with open(args.output, 'w') as output:
+         json.dump(results, output, indent=2)
+
+   thresholds = {}
+   if os.path.isfile(args.thresholds):
+      with open(args.thresholds) as thresholds_file:
+         thresholds = json.load(thresholds_file)
+
+   if args.update_thresholds:
+      thresholds.update(build_thresholds(results))
+      with open(args.thresholds, 'w') as thresholds_file:
+         json.dump(thresholds, thresholds_file, indent=2, sort_keys=True)
+         thresholds_file.write("\n")
+      print("Updated thresholds in {}".format(args.thresholds))
+      return
+
+   regressions = check_thresholds(results, thresholds)
+   unchecked = [case for case in results if case not in thresholds]
+   if unchecked:
+      print("No thresholds for: {}".format(", ".join(unchecked)))
+   if regressions:
+      print("Regressions:")
+      for regression in regressions:
+         print("   " + regression)
+      sys.exit(1)
+   print("No regressions in {} cases".format(len(results) - len(unchecked)))
+
+if __name__ == '__main__':
+   main()
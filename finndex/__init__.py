@@ -1,14 +1,14 @@
 '''
-Sets up the library by starting the NLP sever and initializing the graphing engine's date format.
+Sets up the library. Importing the package has no side effects: the NLP server is started on the first sentiment
+request (or explicitly using nlp.startServer), and the graphing engine is configured by calling use_plotly_backend.
 '''
 
-from finndex.sentiment import nlp
-import pandas as pd
-from pandas.plotting import register_matplotlib_converters
-
 __author__ = "Finn Frankis"
 __copyright__ = "Copyright 2020, Crypticko"
 
-
-nlp.startServer(nlp.STANFORD_NLP_TIMEOUT, nlp.STANFORD_NLP_PORT)
-pd.options.plotting.backend = "plotly"
\ No newline at end of file
+def use_plotly_backend():
+   '''
+   ' Configures pandas to draw all plots (ex.: DataFrame.plot) using plotly rather than matplotlib.
+   '''
+   import pandas as pd
+   pd.options.plotting.backend = "plotly"
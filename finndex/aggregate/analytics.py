@@ -0,0 +1,169 @@
+'''
+Measures how each metric leads or lags price, and how that relationship drifts over time, through rolling-window Pearson
+correlations at many lags. Every window of a series is evaluated from running (cumulative) sums, so each (lag, series)
+pair costs time linear in the number of dates however many windows are evaluated, and every currency and metric is
+computed at once.
+'''
+
+import numpy as np
+import pandas as pd
+
+from finndex.aggregate import panel
+
+__author__ = "Finn Frankis"
+__copyright__ = "Copyright 2020, Crypticko"
+
+LAG_LABEL = "lag"
+WINDOW_LABEL = "window"
+SENTIMENT_LABEL = "Sentiment"
+
+def shift(values, lag):
+   '''
+   ' Shifts an array forward along its first (date) axis, so that the entry for each date holds the value from 'lag'
+   ' dates earlier; a negative lag holds the value from later. Entries shifted in from outside the array are NaN.
+   '
+   ' values (ndarray): the array to be shifted
+   ' lag (int): the number of dates by which to shift
+   '''
+   shifted = np.full(values.shape, np.nan)
+   if lag == 0:
+      shifted[:] = values
+   elif lag > 0:
+      shifted[lag:] = values[:-lag]
+   else:
+      shifted[:lag] = values[-lag:]
+   return shifted
+
+def standardize(values):
+   '''
+   ' Rescales each series (along the first axis) to a mean of 0 and a standard deviation of 1. Correlations are unchanged,
+   ' but the running sums of squares stay small, so that subtracting them does not lose precision.
+   '
+   ' values (ndarray): the series, with dates along the first axis
+   '''
+   present = ~np.isnan(values)
+   counts = np.maximum(present.sum(axis=0), 1)
+   centered = values - np.where(present, values, 0).sum(axis=0) / counts
+   deviation = np.sqrt(np.where(present, centered * centered, 0).sum(axis=0) / counts)
+   return centered / np.where(deviation > 0, deviation, 1)
+
+def get_window_difference(running, window):
+   '''
+   ' Computes the sum of every full window from a running sum, for the windows ending on dates window - 1 onward.
+   '
+   ' running (ndarray): the running sum, with dates along the first axis
+   ' window (int): the number of dates in each window
+   '''
+   return np.concatenate([running[window - 1:window], running[window:] - running[:-window]])
+
+def rolling_correlations(values, target, windows, lags = (0,)):
+   '''
+   ' Computes the Pearson correlation between a target and each of several series over every trailing window, for
+   ' several window lengths and lags at once. At a lag of L, the series on each date is compared with the target L
+   ' dates later, so a positive lag measures how the series leads the target. A window containing any missing value, or
+   ' in which either side is constant, has a correlation of NaN.
+   '
+   ' Returns an array of shape (lags, windows, dates, ...), in which the entry for each date describes the window ending
+   ' on that date (in the target's dates).
+   '
+   ' values (ndarray): the series, with dates along the first axis (ex.: of shape (dates, currencies, metrics))
+   ' target (ndarray): the target series, broadcastable against the values (ex.: of shape (dates, currencies, 1))
+   ' windows (list<int>): the numbers of dates in each window
+   ' lags (list<int>): the number of dates by which the series are compared ahead of the target
+   '''
+   values = standardize(np.asarray(values, dtype='float'))
+   target = np.broadcast_to(standardize(np.asarray(target, dtype='float')), values.shape)
+
+   correlations = np.full((len(lags), len(windows)) + values.shape, np.nan)
+   for lag_index, lag in enumerate(lags):
+      lagged = shift(values, lag)
+      missing = np.isnan(lagged) | np.isnan(target)
+      x = np.where(missing, 0.0, lagged)
+      y = np.where(missing, 0.0, target)
+
+      # running sums, computed once per lag and shared by every window length
+      sums = [np.cumsum(series, axis=0) for series in (missing.astype('float'), x, y, x * x, y * y, x * y)]
+
+      for window_index, window in enumerate(windows):
+         if window > len(values):
+            continue
+         missing_count, sum_x, sum_y, sum_xx, sum_yy, sum_xy = [get_window_difference(running, window) for running in sums]
+
+         covariance = sum_xy - sum_x * sum_y / window
+         variance_x = sum_xx - sum_x * sum_x / window
+         variance_y = sum_yy - sum_y * sum_y / window
+
+         # variances which vanish but for rounding error are treated as exactly zero
+         tolerance = 1e-9 * window
+         valid = (missing_count == 0) & (variance_x > tolerance) & (variance_y > tolerance)
+         with np.errstate(divide='ignore', invalid='ignore'):
+            correlation = covariance / np.sqrt(variance_x * variance_y)
+         correlations[lag_index, window_index, window - 1:] = np.where(valid, np.clip(correlation, -1, 1), np.nan)
+
+   return correlations
+
+def get_panel_correlations(metrics_panel, prices, windows, lags = (0,), use_returns = False):
+   '''
+   ' Computes the rolling correlation between every metric of every currency and that currency's price (or daily
+   ' return) for several window lengths and lags. Returns an array of shape (lags, windows, dates, currencies, metrics).
+   '
+   ' metrics_panel (MetricPanel): the metrics of each currency on each date
+   ' prices (ndarray): the price of each currency on each date, of shape (dates, currencies) and ordered like the panel
+   ' windows (list<int>): the numbers of dates in each window
+   ' lags (list<int>): the number of dates by which each metric is compared ahead of the price
+   ' use_returns (bool): whether to correlate with the relative change in price from the previous date rather than the price
+   '''
+   target = np.asarray(prices, dtype='float')
+   if use_returns:
+      with np.errstate(divide='ignore', invalid='ignore'):
+         target = np.vstack([np.full((1, target.shape[1]), np.nan), target[1:] / target[:-1] - 1])
+
+   return rolling_correlations(metrics_panel.values, target[:, :, np.newaxis], windows, lags)
+
+def correlations_to_frame(correlations, metrics_panel, windows, lags):
+   '''
+   ' Labels an array returned by get_panel_correlations as a data frame indexed by date, whose columns are labeled by
+   ' lag, window, currency, and metric.
+   '
+   ' correlations (ndarray): the array to be labeled
+   ' metrics_panel (MetricPanel): the panel whose correlations were computed
+   ' windows (list<int>): the window lengths, as passed to get_panel_correlations
+   ' lags (list<int>): the lags, as passed to get_panel_correlations
+   '''
+   lag_count, window_count, date_count, currency_count, metric_count = correlations.shape
+   columns = pd.MultiIndex.from_product([list(lags), list(windows), metrics_panel.currencies, metrics_panel.metrics],
+                                        names=[LAG_LABEL, WINDOW_LABEL, None, None])
+
+   # move the dates to the front, keeping (lag, window, currency, metric) as the column order
+   flattened = np.moveaxis(correlations, 2, 0).reshape(date_count, -1)
+   return pd.DataFrame(flattened, index = metrics_panel.dates, columns = columns)
+
+def find_leading_lags(correlations, lags):
+   '''
+   ' Determines, for each window length, currency, and metric, the lag at which the metric's correlation with price is
+   ' strongest on average (by absolute value) across every window. Returns a tuple of two arrays of shape (windows,
+   ' currencies, metrics): the best lags and the mean correlation at those lags.
+   '
+   ' correlations (ndarray): an array returned by get_panel_correlations
+   ' lags (list<int>): the lags, as passed to get_panel_correlations
+   '''
+   present = ~np.isnan(correlations)
+   counts = present.sum(axis=2)
+   mean_correlations = np.where(present, correlations, 0).sum(axis=2) / np.maximum(counts, 1)
+   mean_correlations = np.where(counts > 0, mean_correlations, np.nan)
+
+   strength = np.where(np.isnan(mean_correlations), -np.inf, np.abs(mean_correlations))
+   best = np.argmax(strength, axis=0)
+   best_correlations = np.take_along_axis(mean_correlations, best[np.newaxis], axis=0)[0]
+   return np.asarray(lags)[best], best_correlations
+
+def add_sentiment(metrics_panel, sentiment):
+   '''
+   ' Builds a panel containing every metric of a given panel as well as the weighted sentiment, as the metric
+   ' SENTIMENT_LABEL, so that the sentiment's correlations are computed alongside those of its inputs.
+   '
+   ' metrics_panel (MetricPanel): the metrics of each currency on each date
+   ' sentiment (ndarray): the sentiment of each currency on each date, of shape (dates, currencies)
+   '''
+   values = np.concatenate([metrics_panel.values, np.asarray(sentiment, dtype='float')[:, :, np.newaxis]], axis=2)
+   return panel.MetricPanel(metrics_panel.dates, metrics_panel.currencies, metrics_panel.metrics + [SENTIMENT_LABEL], values)
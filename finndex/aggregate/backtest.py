@@ -0,0 +1,171 @@
+'''
+Evaluates many candidate weight vectors at once by correlating the score each produces with forward price returns, for
+every currency and for the index. Because a score is a linear combination of the metrics, the correlation of every
+candidate follows from the metrics' covariance matrix and their covariances with the returns, which are computed once;
+scoring thousands of candidates then costs a few matrix products.
+'''
+
+import itertools
+
+import numpy as np
+import pandas as pd
+
+__author__ = "Finn Frankis"
+__copyright__ = "Copyright 2020, Crypticko"
+
+INDEX_LABEL = "Index"
+CORRELATION_LABEL = "Correlation"
+
+def get_forward_returns(prices, horizon = 1):
+   '''
+   ' Computes the relative change in price from each date to the date a given number of days later. The final dates,
+   ' whose later price is unknown, have a return of NaN.
+   '
+   ' prices (ndarray): the price of each currency on each date, of shape (dates, currencies)
+   ' horizon (int): the number of days over which each return is measured
+   '''
+   prices = np.asarray(prices, dtype='float')
+   returns = np.full(prices.shape, np.nan)
+   with np.errstate(divide='ignore', invalid='ignore'):
+      returns[:-horizon] = prices[horizon:] / prices[:-horizon] - 1
+   return returns
+
+def grid_weights(metric_count, steps):
+   '''
+   ' Builds every weight vector whose weights are multiples of 1 / steps summing to 1, as a matrix with one vector per
+   ' row. There are (steps + metric_count - 1) choose (metric_count - 1) such vectors.
+   '
+   ' metric_count (int): the number of weights in each vector
+   ' steps (int): the number of increments into which the total weight is divided
+   '''
+   # each vector corresponds to a choice of metric_count - 1 dividers among steps + metric_count - 1 positions
+   combinations = list(itertools.combinations(range(steps + metric_count - 1), metric_count - 1))
+   dividers = np.array(combinations, dtype='int').reshape(len(combinations), metric_count - 1)
+   bounds = np.hstack([np.full((len(dividers), 1), -1), dividers, np.full((len(dividers), 1), steps + metric_count - 1)])
+   return (np.diff(bounds, axis=1) - 1) / steps
+
+def random_weights(metric_count, count, seed = None):
+   '''
+   ' Draws weight vectors uniformly from those whose (non-negative) weights sum to 1, as a matrix with one vector per row.
+   '
+   ' metric_count (int): the number of weights in each vector
+   ' count (int): the number of vectors
+   ' seed (int): the seed of the random number generator, for repeatable draws
+   '''
+   return np.random.default_rng(seed).dirichlet(np.ones(metric_count), size=count)
+
+def correlate_linear_combinations(features, target, weights_matrix):
+   '''
+   ' Computes the Pearson correlation between a target and each of many linear combinations of features, using only the
+   ' rows in which the target and every feature are present. A combination with no variance has a correlation of NaN.
+   '
+   ' features (ndarray): the features on each row, of shape (rows, features)
+   ' target (ndarray): the target on each row
+   ' weights_matrix (ndarray): one weight vector per combination, of shape (combinations, features)
+   '''
+   present = ~np.isnan(target) & ~np.isnan(features).any(axis=1)
+   if present.sum() < 2:
+      return np.full(len(weights_matrix), np.nan)
+
+   centered_features = features[present] - features[present].mean(axis=0)
+   centered_target = target[present] - target[present].mean()
+
+   # the (scaled) covariances among the features and between each feature and the target
+   feature_covariance = centered_features.T @ centered_features
+   target_covariance = centered_features.T @ centered_target
+   target_variance = centered_target @ centered_target
+
+   covariance = weights_matrix @ target_covariance
+   variance = np.einsum('ij,jk,ik->i', weights_matrix, feature_covariance, weights_matrix)
+
+   with np.errstate(divide='ignore', invalid='ignore'):
+      correlation = covariance / np.sqrt(variance * target_variance)
+   return np.where((variance > 0) & (target_variance > 0), correlation, np.nan)
+
+class Backtest:
+   '''
+   ' Scores weight vectors by how well the scores they produce correlate with forward price returns, for each currency
+   ' and for the index (the weighted average of every currency's metrics and returns).
+   '''
+   def __init__(self, metrics_panel, prices, horizon = 1, index_weights = None):
+      '''
+      ' Creates a new backtest.
+      '
+      ' metrics_panel (MetricPanel): the metrics of each currency on each date
+      ' prices (ndarray): the price of each currency on each date, of shape (dates, currencies) and ordered like the panel
+      ' horizon (int): the number of days over which each return is measured
+      ' index_weights (list<float>): the weight of each currency in the index; by default, every currency is weighted
+      '                              equally
+      '''
+      self.panel = metrics_panel
+      self.horizon = horizon
+      self.returns = get_forward_returns(prices, horizon)
+
+      currency_count = len(metrics_panel.currencies)
+      if index_weights is None:
+         index_weights = np.full(currency_count, 1.0 / currency_count)
+      self.index_weights = np.asarray(index_weights, dtype='float')
+      self.index_weights = self.index_weights / self.index_weights.sum()
+
+   def get_targets(self):
+      '''
+      ' Retrieves the labels of the targets scored: each currency, followed by the index.
+      '''
+      return self.panel.currencies + [INDEX_LABEL]
+
+   def score(self, weights_matrix):
+      '''
+      ' Computes the correlation between forward returns and the scores produced by every weight vector, returning an
+      ' array of shape (targets, configurations), with the targets ordered as returned by get_targets.
+      '
+      ' weights_matrix (array-like): one weight vector (with one weight per metric of the panel) per row
+      '''
+      weights_matrix = np.atleast_2d(np.asarray(weights_matrix, dtype='float'))
+      values = self.panel.values
+
+      correlations = [correlate_linear_combinations(values[:, currency], self.returns[:, currency], weights_matrix)
+                        for currency in range(len(self.panel.currencies))]
+
+      # a weighted average across currencies commutes with a weighted average across metrics
+      index_values = np.einsum('dcm,c->dm', values, self.index_weights)
+      index_returns = self.returns @ self.index_weights
+      correlations += [correlate_linear_combinations(index_values, index_returns, weights_matrix)]
+
+      return np.vstack(correlations)
+
+   def optimize(self, weights_matrix):
+      '''
+      ' Finds the weight vector producing the highest correlation for each target. Returns a data frame with one row per
+      ' target and a column for each metric's weight and for the correlation.
+      '
+      ' weights_matrix (array-like): the candidate weight vectors, one per row
+      '''
+      weights_matrix = np.atleast_2d(np.asarray(weights_matrix, dtype='float'))
+      correlations = self.score(weights_matrix)
+
+      rows = []
+      for target_correlations in correlations:
+         if np.isnan(target_correlations).all():
+            rows += [np.full(weights_matrix.shape[1] + 1, np.nan)]
+            continue
+         best = np.nanargmax(target_correlations)
+         rows += [np.append(weights_matrix[best], target_correlations[best])]
+
+      return pd.DataFrame(rows, index = self.get_targets(), columns = self.panel.metrics + [CORRELATION_LABEL])
+
+   def grid_search(self, steps = 10):
+      '''
+      ' Finds the best weights for each target among every weight vector whose weights are multiples of 1 / steps.
+      '
+      ' steps (int): the number of increments into which the total weight is divided
+      '''
+      return self.optimize(grid_weights(len(self.panel.metrics), steps))
+
+   def random_search(self, count = 10000, seed = None):
+      '''
+      ' Finds the best weights for each target among randomly drawn weight vectors.
+      '
+      ' count (int): the number of weight vectors drawn
+      ' seed (int): the seed of the random number generator, for repeatable searches
+      '''
+      return self.optimize(random_weights(len(self.panel.metrics), count, seed))
@@ -6,16 +6,12 @@ import datetime
 import functools
 from enum import Enum
 
-import ipywidgets as widgets
-import numpy as np
 import pandas as pd
 
+from finndex.aggregate import analytics, backtest, panel, queryplan
 from finndex.fundamental import coinmetrics
 from finndex.sentiment import fearandgreed, trends
-from finndex.util import cryptocurrencies, dateutil, mathutil
-from IPython.display import display
-
-from scipy.stats import pearsonr
+from finndex.util import cryptocurrencies, dateutil, instrumentation, mathutil
 
 __author__ = "Finn Frankis"
 __copyright__ = "Copyright 2019, Crypticko"
@@ -42,14 +38,50 @@ class HistoricalMetricType(Enum):
    MARKET_CAP = functools.partial(coinmetrics.get_coinmetrics_dates, [coinmetrics.CoinMetricsData.MARKET_CAP])
    PRICE_USD = functools.partial(coinmetrics.get_coinmetrics_dates, [coinmetrics.CoinMetricsData.PRICE_USD])
 
+'''
+The name of the (inner) column in which each metric's values are retrieved, and under which each is stored in a panel.
+'''
+METRIC_COLUMNS = {HistoricalMetricType.FEAR_AND_GREED: "FearGreed",
+                  HistoricalMetricType.TRENDS: "Trends",
+                  HistoricalMetricType.BLOCK_COUNT: coinmetrics.CoinMetricsData.BLOCK_COUNT.value,
+                  HistoricalMetricType.TRANSACTION_CNT: coinmetrics.CoinMetricsData.TRANSACTION_CNT.value,
+                  HistoricalMetricType.DAILY_ADDRESSES: coinmetrics.CoinMetricsData.DAILY_ADDRESSES.value,
+                  HistoricalMetricType.MARKET_CAP: coinmetrics.CoinMetricsData.MARKET_CAP.value,
+                  HistoricalMetricType.PRICE_USD: coinmetrics.CoinMetricsData.PRICE_USD.value}
+
+'''
+The metric under which a stored panel holds each currency's unnormalized price, distinct from the (normalized) PriceUSD
+metric.
+'''
+PRICE_COLUMN = "Price"
+
+def get_selection_range(keywords_list, start_date, end_date):
+   '''
+   ' Determines the range of a stored panel (see panelstore) holding exactly the dates which retrieving a set of metrics
+   ' would give: those from the start date up to (but excluding) the end date, widened to every day from the start
+   ' date's day through the end date's day if Trends is among the metrics, since Trends includes both. Returns a tuple
+   ' of the first date and the date before which the range stops, as accepted by StoredPanel.select.
+   '
+   ' keywords_list (list<HistoricalMetricType>): the metrics to be read
+   ' start_date (datetime): the start date of the retrieval
+   ' end_date (datetime): the end date of the retrieval
+   '''
+   if HistoricalMetricType.TRENDS not in keywords_list:
+      return start_date, end_date
+   return pd.Timestamp(start_date).floor('d'), pd.Timestamp(end_date).floor('d') + pd.Timedelta(days=1)
+
 '''
 Computes and plots a set of daily historical sentiment values given a set of keywords. Weights can be modified using sliders;
-if weights are provided in the 'weights' parameter, presents a static graph using those weights.
+if weights are provided in the 'weights' parameter, presents a static graph using those weights. If a stored panel
+(see panelstore) is provided in the 'panel_store' parameter, the metrics are read from it rather than retrieved, as are
+the prices if it holds them (under PRICE_COLUMN).
+Retrievals are planned together (see queryplan), so that every CoinMetrics metric of a currency, including its price,
+arrives in a single upstream call.
 '''
 class HistoricalSentimentManager:
    def __init__(self, keywords_list, currencies_list, 
                         start_date = datetime.datetime.now() - datetime.timedelta(weeks=4), 
-                        end_date = datetime.datetime.now(), weights = None):
+                        end_date = datetime.datetime.now(), weights = None, concurrent = True, panel_store = None):
       self.keywords_list = keywords_list
       self.currencies_list = currencies_list
       self.start_date = start_date
@@ -59,7 +91,39 @@ class HistoricalSentimentManager:
       else:
          self.weights = [1.0 / len(keywords_list) for keyword in keywords_list] # equal weighting for all values
       
+      self.concurrent = concurrent # whether to retrieve every metric simultaneously rather than one after another
+      self.panel_store = panel_store # the StoredPanel from which the metrics are read, if any
+      self.planner = queryplan.QueryPlanner(start_date, end_date, currencies_list, concurrent)
+      
+      self.panel = None
       self.historical_sentiment = None
+      self.prices = None
+
+   '''
+   Retrieves every requested metric and assembles them into a (date x currency x metric) panel, with missing entries
+   filled by linear interpolation. With a stored panel, the requested dates, currencies, and metrics are read from it
+   instead.
+   '''
+   def get_panel(self):
+      if self.panel is None and self.panel_store is not None:
+         with instrumentation.time_block(instrumentation.AGGREGATION_SECONDS, step="select"):
+            first, stop = get_selection_range(self.keywords_list, self.start_date, self.end_date)
+            self.panel = self.panel_store.select(first, stop, self.currencies_list,
+                                                 [METRIC_COLUMNS[metric] for metric in self.keywords_list])
+
+      if self.panel is None:
+         with instrumentation.time_block(instrumentation.AGGREGATION_SECONDS, step="retrieve"):
+            # prices are downloaded alongside the other CoinMetrics metrics, at no extra cost, for get_prices to reuse
+            frames = self.planner.retrieve([metric.value for metric in self.keywords_list],
+                                           [coinmetrics.CoinMetricsData.PRICE_USD.value])
+         with instrumentation.time_block(instrumentation.AGGREGATION_SECONDS, step="interpolate"):
+            combined = pd.concat(frames, axis=1)
+            combined = combined.interpolate().interpolate(limit_direction='backward')
+
+         with instrumentation.time_block(instrumentation.AGGREGATION_SECONDS, step="panel"):
+            self.panel = panel.MetricPanel.from_frame(combined)
+
+      return self.panel
 
    '''
    Computes the weighted historical sentiment with the date as the key and the historical sentiment on that date as the value.
@@ -68,23 +132,64 @@ class HistoricalSentimentManager:
       return_frame = self.historical_sentiment
 
       if return_frame is None:
-         frames = [metric.value(self.start_date, self.end_date, self.currencies_list) for metric in self.keywords_list]
-         combined = pd.concat(frames, axis=1)
-         
-         return_frame = pd.DataFrame()
-         for cryptocurrency in combined.columns.levels[0]:
-            interp = combined[cryptocurrency].interpolate().interpolate(limit_direction='backward')
-            weighted = interp.apply(lambda row: np.average(row, weights=self.weights), axis=1)
-            return_frame[cryptocurrency] = weighted
+         metrics_panel = self.get_panel()
+         with instrumentation.time_block(instrumentation.AGGREGATION_SECONDS, step="weigh"):
+            return_frame = metrics_panel.to_frame(metrics_panel.weigh(self.weights))
 
       self.historical_sentiment = return_frame
 
       return return_frame
 
+   '''
+   Computes the historical sentiment for many weight configurations at once. 'weights_matrix' contains one weight vector
+   (ordered like the keywords list) per row; returns an array of shape (configurations, dates, currencies).
+   '''
+   def get_historical_sentiments(self, weights_matrix):
+      return self.get_panel().weigh(weights_matrix)
+
+   '''
+   Retrieves the unnormalized price of each currency, reading it from the stored panel if that holds prices.
+   '''
    def get_prices(self):
-      return HistoricalMetricType.PRICE_USD.value(self.start_date, self.end_date, self.currencies_list, normalize = False)
+      if self.prices is None and self.panel_store is not None and PRICE_COLUMN in self.panel_store.metrics:
+         stored = self.panel_store.select(self.start_date, self.end_date, self.currencies_list, [PRICE_COLUMN])
+         price_columns = pd.MultiIndex.from_product([stored.currencies, [coinmetrics.CoinMetricsData.PRICE_USD.value]])
+         self.prices = pd.DataFrame(stored.values[:, :, 0], index = stored.dates, columns = price_columns)
+
+      if self.prices is None:
+         self.prices = self.planner.retrieve([functools.partial(HistoricalMetricType.PRICE_USD.value, normalize = False)])[0]
+      return self.prices
+
+   '''
+   Builds a backtest which scores candidate weight vectors by the correlation between the sentiment they produce and the
+   forward price returns over 'horizon' days, for each currency and for the index.
+   '''
+   def get_backtest(self, horizon = 1, index_weights = None):
+      return backtest.Backtest(self.get_panel(), self.get_aligned_prices(), horizon, index_weights)
+
+   '''
+   Computes rolling correlations between price and each metric (as well as the weighted sentiment) of each currency
+   for every window length in 'windows' and lag in 'lags'. Returns an array of shape (lags, windows, dates, currencies,
+   metrics), with the sentiment as the final metric; see analytics.get_panel_correlations.
+   '''
+   def get_rolling_correlations(self, windows, lags = (0,), use_returns = False):
+      metrics_panel = self.get_panel()
+      sentiment = self.get_historical_sentiment()[metrics_panel.currencies].to_numpy(dtype='float')
+
+      return analytics.get_panel_correlations(analytics.add_sentiment(metrics_panel, sentiment), self.get_aligned_prices(),
+                                              windows, lags, use_returns)
+
+   '''
+   Retrieves the price of each currency as an array of shape (dates, currencies), aligned with the panel.
+   '''
+   def get_aligned_prices(self):
+      metrics_panel = self.get_panel()
+      price_columns = pd.MultiIndex.from_product([metrics_panel.currencies, [coinmetrics.CoinMetricsData.PRICE_USD.value]])
+      return self.get_prices().reindex(index = metrics_panel.dates, columns = price_columns).to_numpy(dtype='float')
 
    def get_price_correlation(self):
+      from scipy.stats import pearsonr # deferred, since scipy is slow to import and needed only here
+
       historical = self.get_historical_sentiment()
       prices = self.get_prices()
 
@@ -94,4 +199,5 @@ class HistoricalSentimentManager:
    def get_index_sentiment(self, weights=None):
       if weights == None:
          weights = [1.0 / len(self.currencies_list) for currency in self.currencies_list]
-      return self.get_historical_sentiment().apply(lambda row: np.average(row, weights=weights), axis=1)
\ No newline at end of file
+      historical = self.get_historical_sentiment()
+      return pd.Series(panel.weighted_average(historical.values, weights), index = historical.index)
@@ -0,0 +1,214 @@
+'''
+Maintains a running weighted score for each currency which is updated in constant time as new daily observations arrive,
+rather than being recomputed over the whole history as HistoricalSentimentManager does.
+'''
+
+import threading
+
+import numpy as np
+import pandas as pd
+
+__author__ = "Finn Frankis"
+__copyright__ = "Copyright 2020, Crypticko"
+
+NORMALIZE_NONE = None # the values are used as they are (ex.: Fear and Greed, already from 0-1)
+NORMALIZE_MAX = "max" # each value is divided by the largest value seen (as coinmetrics.normalize_col does)
+NORMALIZE_RANGE = "range" # each value is mapped from the range of values seen onto 0-1
+
+def normalize(values, minima, maxima, normalizations):
+   '''
+   ' Normalizes one value per metric according to each metric's normalization and extrema. A metric whose extrema do not
+   ' yet allow normalization (ex.: a maximum of 0) yields NaN.
+   '
+   ' values (ndarray): the value of each metric
+   ' minima (ndarray): the smallest value seen of each metric
+   ' maxima (ndarray): the largest value seen of each metric
+   ' normalizations (list): the normalization (NORMALIZE_NONE, NORMALIZE_MAX, or NORMALIZE_RANGE) of each metric
+   '''
+   normalized = np.array(values, dtype='float')
+   with np.errstate(divide='ignore', invalid='ignore'):
+      for index, normalization in enumerate(normalizations):
+         if normalization == NORMALIZE_MAX:
+            normalized[index] = values[index] / maxima[index] if maxima[index] != 0 else np.nan
+         elif normalization == NORMALIZE_RANGE:
+            spread = maxima[index] - minima[index]
+            normalized[index] = (values[index] - minima[index]) / spread if spread != 0 else np.nan
+   return normalized
+
+class CurrencyState:
+   '''
+   ' The running state of a single currency: the latest value of each metric (which fills any gap until the metric is
+   ' next observed), the extrema of each metric, and the weighted sum of the normalized values.
+   '''
+   def __init__(self, metric_count):
+      self.date = None
+      self.last_values = np.full(metric_count, np.nan)
+      self.minima = np.full(metric_count, np.nan)
+      self.maxima = np.full(metric_count, np.nan)
+      self.contributions = np.zeros(metric_count) # each metric's weight multiplied by its normalized value, or 0
+      self.present_weights = np.zeros(metric_count) # each metric's weight, or 0 if it has no normalized value
+      self.weighted_sum = 0.0
+      self.weight_total = 0.0
+
+   def get_score(self):
+      return self.weighted_sum / self.weight_total if self.weight_total != 0 else np.nan
+
+class IncrementalAggregator:
+   '''
+   ' Computes the weighted score of several currencies from a stream of daily metric observations. Each observation
+   ' updates only the state of the observed metric, so an update costs the same however long the history. As in
+   ' panel.weighted_average, a metric without any value is left out and the remaining weights are rescaled.
+   '''
+   def __init__(self, metrics, weights, normalizations = None):
+      '''
+      ' Creates a new aggregator without any history.
+      '
+      ' metrics (list<str>): the names of the metrics (ex.: "FearGreed", "PriceUSD")
+      ' weights (list<float>): the weight of each metric
+      ' normalizations (dict): the normalization of each metric name (NORMALIZE_NONE, NORMALIZE_MAX, or NORMALIZE_RANGE);
+      '                        metrics which are absent are not normalized
+      '''
+      self.metrics = list(metrics)
+      self.weights = np.asarray(weights, dtype='float')
+      self.normalizations = [(normalizations or {}).get(metric, NORMALIZE_NONE) for metric in self.metrics]
+
+      self._metric_indices = {metric: index for index, metric in enumerate(self.metrics)}
+      self._states = {}
+      self._subscribers = []
+      self._lock = threading.Lock()
+
+   def subscribe(self, callback):
+      '''
+      ' Registers a function to be called with the currency, the date, and the new score whenever a currency's score is
+      ' updated. Callbacks run on the updating thread, in the order in which they were registered.
+      '
+      ' callback (function): the function to be called
+      '''
+      with self._lock:
+         self._subscribers = self._subscribers + [callback]
+
+   def unsubscribe(self, callback):
+      '''
+      ' Stops calling a previously registered function.
+      '
+      ' callback (function): the function registered with subscribe
+      '''
+      with self._lock:
+         self._subscribers = [subscriber for subscriber in self._subscribers if subscriber != callback]
+
+   def seed(self, frame):
+      '''
+      ' Initializes the state of each currency from a history of unnormalized values, without notifying subscribers.
+      ' The frame's outer columns represent the currencies and its inner columns the metrics, as returned by the
+      ' get_*_dates functions (with normalization disabled where a metric is normalized here).
+      '
+      ' frame (DataFrame): the history, indexed by date
+      '''
+      frame = frame.sort_index()
+      with self._lock:
+         for currency in frame.columns.get_level_values(0).unique():
+            history = frame[currency].reindex(columns=self.metrics).to_numpy(dtype='float')
+            state = self._get_state(currency)
+
+            observed = ~np.isnan(history)
+            observed_metrics = observed.any(axis=0)
+            if not observed_metrics.any():
+               continue
+
+            # the last valid value and the extrema of each metric, found in one pass over the history
+            last_rows = len(history) - 1 - np.argmax(observed[::-1], axis=0)
+            last_values = history[last_rows, np.arange(len(self.metrics))]
+            minima = np.fmin(state.minima, np.where(observed, history, np.inf).min(axis=0))
+            maxima = np.fmax(state.maxima, np.where(observed, history, -np.inf).max(axis=0))
+
+            state.last_values = np.where(observed_metrics, last_values, state.last_values)
+            state.minima = np.where(observed_metrics, minima, state.minima)
+            state.maxima = np.where(observed_metrics, maxima, state.maxima)
+            state.date = pd.Timestamp(frame.index[observed.any(axis=1)][-1])
+
+            self._recompute(state, range(len(self.metrics)))
+
+   def update(self, date, currency, observations):
+      '''
+      ' Records the observations of a currency on a given date and returns its new score. Observations may be repeated
+      ' within the latest date (ex.: as intraday values are revised), but may not precede it, since earlier scores are
+      ' never recomputed.
+      '
+      ' date (datetime): the date of the observations
+      ' currency (Cryptocurrencies): the currency observed
+      ' observations (dict): the value of each observed metric, by name; metrics not included keep their latest value
+      '''
+      date = pd.Timestamp(date)
+      with self._lock:
+         state = self._get_state(currency)
+         if state.date is not None and date < state.date:
+            raise ValueError("Observations for {} on {} precede its latest date, {}.".format(currency, date.date(),
+                             state.date.date()))
+
+         changed = []
+         for metric, value in observations.items():
+            if metric not in self._metric_indices or value is None or np.isnan(value):
+               continue
+            index = self._metric_indices[metric]
+            state.last_values[index] = value
+            state.minima[index] = np.fmin(state.minima[index], value)
+            state.maxima[index] = np.fmax(state.maxima[index], value)
+            changed += [index]
+
+         state.date = date
+         self._recompute(state, changed)
+         score, subscribers = state.get_score(), self._subscribers
+
+      for subscriber in subscribers:
+         subscriber(currency, date, score)
+      return score
+
+   def update_many(self, date, observations):
+      '''
+      ' Records the observations of several currencies on a given date, returning a dictionary with each currency as the
+      ' key and its new score as the value.
+      '
+      ' date (datetime): the date of the observations
+      ' observations (dict): the observations (as passed to update) of each currency
+      '''
+      return {currency: self.update(date, currency, currency_observations)
+                 for currency, currency_observations in observations.items()}
+
+   def get_score(self, currency):
+      '''
+      ' Retrieves the latest score of a currency, or NaN if it has never been observed.
+      '
+      ' currency (Cryptocurrencies): the currency whose score is retrieved
+      '''
+      with self._lock:
+         state = self._states.get(currency)
+         return state.get_score() if state is not None else np.nan
+
+   def get_scores(self):
+      '''
+      ' Retrieves the latest score of every observed currency as a series indexed by currency.
+      '''
+      with self._lock:
+         return pd.Series({currency: state.get_score() for currency, state in self._states.items()}, dtype='float')
+
+   def _get_state(self, currency):
+      if currency not in self._states:
+         self._states[currency] = CurrencyState(len(self.metrics))
+      return self._states[currency]
+
+   def _recompute(self, state, indices):
+      # a metric's contribution depends only on its own latest value and extrema, so only the changed metrics are updated
+      indices = list(indices)
+      if not indices:
+         return
+
+      normalized = normalize(state.last_values[indices], state.minima[indices], state.maxima[indices],
+                             [self.normalizations[index] for index in indices])
+      present = ~np.isnan(normalized)
+
+      state.contributions[indices] = np.where(present, self.weights[indices] * np.where(present, normalized, 0), 0)
+      state.present_weights[indices] = np.where(present, self.weights[indices], 0)
+
+      # summed afresh (over the metrics rather than the history) so that rounding errors never accumulate
+      state.weighted_sum = state.contributions.sum()
+      state.weight_total = state.present_weights.sum()
@@ -0,0 +1,91 @@
+'''
+Represents historical data as a dense three-dimensional (date x currency x metric) panel and computes weighted scores
+over it using matrix products rather than per-row averaging.
+'''
+
+import numpy as np
+import pandas as pd
+
+__author__ = "Finn Frankis"
+__copyright__ = "Copyright 2020, Crypticko"
+
+def weighted_average(values, weights):
+   '''
+   ' Computes the weighted average along the final axis of an array for one or many weight vectors at once. Where an entry
+   ' is missing (NaN), that entry is dropped and the remaining weights are rescaled so that they still sum to the same
+   ' total; where every entry is missing, the result is NaN.
+   '
+   ' values (ndarray): an array of any shape whose final axis is the one to be averaged (ex.: date x currency x metric)
+   ' weights (array-like): a single weight vector, with one weight per entry of the final axis, or a matrix with one
+   '                       weight vector per row
+   '''
+   values = np.asarray(values, dtype='float')
+   weights = np.asarray(weights, dtype='float')
+
+   present = ~np.isnan(values)
+   filled = np.where(present, values, 0.0)
+
+   # (... x metrics) . (metrics x configurations) -> (... x configurations)
+   weight_columns = np.atleast_2d(weights).T
+   numerator = filled @ weight_columns
+   denominator = present.astype('float') @ weight_columns
+
+   with np.errstate(divide='ignore', invalid='ignore'):
+      averaged = np.where(denominator != 0, numerator / np.where(denominator != 0, denominator, 1), np.nan)
+
+   if weights.ndim == 1:
+      return averaged[..., 0]
+   return np.moveaxis(averaged, -1, 0) # configurations become the leading axis
+
+class MetricPanel:
+   '''
+   ' Holds a dense (date x currency x metric) array of historical values alongside the labels of each axis.
+   '''
+   def __init__(self, dates, currencies, metrics, values):
+      '''
+      ' Creates a new panel.
+      '
+      ' dates (DatetimeIndex): the labels of the first axis
+      ' currencies (list<Cryptocurrencies>): the labels of the second axis
+      ' metrics (list<str>): the labels of the third axis (ex.: "FearGreed", "PriceUSD")
+      ' values (ndarray): the float array of shape (dates, currencies, metrics)
+      '''
+      self.dates = dates
+      self.currencies = list(currencies)
+      self.metrics = list(metrics)
+      self.values = values
+
+   @classmethod
+   def from_frame(cls, frame):
+      '''
+      ' Builds a panel from a data frame whose outer columns represent the cryptocurrencies and whose inner columns
+      ' represent the metrics, as returned by the get_*_dates functions. Currencies and metrics are ordered by their
+      ' first appearance; a (currency, metric) pair absent from the frame is filled with NaN.
+      '
+      ' frame (DataFrame): the multi-layered frame to be converted
+      '''
+      currencies = list(frame.columns.get_level_values(0).unique())
+      metrics = list(frame.columns.get_level_values(1).unique())
+
+      dense = frame.reindex(columns = pd.MultiIndex.from_product([currencies, metrics]))
+      values = dense.to_numpy(dtype='float').reshape(len(frame.index), len(currencies), len(metrics))
+
+      return cls(frame.index, currencies, metrics, values)
+
+   def weigh(self, weights):
+      '''
+      ' Computes the weighted score of every currency on every date. Returns an array of shape (dates, currencies)
+      ' for a single weight vector or (configurations, dates, currencies) for a matrix of weight vectors.
+      '
+      ' weights (array-like): one weight per metric, or a matrix with one such weight vector per row
+      '''
+      return weighted_average(self.values, weights)
+
+   def to_frame(self, scores):
+      '''
+      ' Labels a (dates, currencies) array of scores as a data frame with the dates as the index and the currencies as
+      ' the columns.
+      '
+      ' scores (ndarray): the array to be labeled
+      '''
+      return pd.DataFrame(scores, index = self.dates, columns = self.currencies)
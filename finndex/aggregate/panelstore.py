@@ -0,0 +1,115 @@
+'''
+Saves (date x currency x metric) panels to disk as a raw float array (in NumPy's .npy format) alongside a small JSON
+index of the axis labels. Stored panels are memory-mapped when opened, so a reader loads only the dates, currencies, and
+metrics it selects, and every process opening the same panel shares a single copy in the operating system's page cache.
+'''
+
+import io
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from finndex.aggregate import panel
+from finndex.util import cacheutil
+from finndex.util.cryptocurrencies import Cryptocurrencies
+
+__author__ = "Finn Frankis"
+__copyright__ = "Copyright 2020, Crypticko"
+
+FORMAT_VERSION = 1
+VALUES_SUFFIX = ".npy"
+INDEX_SUFFIX = ".json"
+
+def get_panel_path(name):
+   '''
+   ' Determines the location within the local cache of the stored panel with a given name.
+   '
+   ' name (str): the name of the panel (ex.: "backtest")
+   '''
+   return os.path.join(cacheutil.get_cache_directory("panels"), name)
+
+def write_panel(path, metrics_panel):
+   '''
+   ' Saves a panel, replacing any panel previously stored at the same location. The values are written before the index,
+   ' and each file is replaced atomically.
+   '
+   ' path (str): the location of the panel, without a suffix; the panel occupies path.npy and path.json
+   ' metrics_panel (MetricPanel): the panel to be saved, whose currencies are Cryptocurrencies
+   '''
+   values = np.ascontiguousarray(metrics_panel.values, dtype='float64')
+
+   buffer = io.BytesIO()
+   np.save(buffer, values)
+   cacheutil.atomic_write(path + VALUES_SUFFIX, buffer.getvalue(), "wb")
+
+   index = {'version': FORMAT_VERSION,
+            'shape': list(values.shape),
+            'dates': [date.strftime("%Y-%m-%d") for date in metrics_panel.dates],
+            'currencies': [currency.name for currency in metrics_panel.currencies],
+            'metrics': list(metrics_panel.metrics)}
+   cacheutil.atomic_write(path + INDEX_SUFFIX, json.dumps(index))
+
+class StoredPanel:
+   '''
+   ' A panel saved by write_panel, opened without reading its values into memory.
+   '''
+   def __init__(self, path):
+      '''
+      ' Opens a stored panel, raising a FileNotFoundError if none is stored at the given location or a ValueError if its
+      ' files do not match.
+      '
+      ' path (str): the location of the panel, without a suffix
+      '''
+      with open(path + INDEX_SUFFIX) as index_file:
+         index = json.load(index_file)
+      if index['version'] != FORMAT_VERSION:
+         raise ValueError("The panel at {} has format version {}; expected {}.".format(path, index['version'], FORMAT_VERSION))
+
+      self.path = path
+      self.values = np.load(path + VALUES_SUFFIX, mmap_mode='r')
+      if list(self.values.shape) != index['shape']:
+         raise ValueError("The values of the panel at {} do not match its index (the panel may be mid-write).".format(path))
+
+      self.dates = pd.DatetimeIndex(np.array(index['dates'], dtype='datetime64[ns]'), name='date')
+      self.currencies = [Cryptocurrencies[name] for name in index['currencies']]
+      self.metrics = index['metrics']
+
+   def select(self, start_date = None, end_date = None, currencies_list = None, metrics = None):
+      '''
+      ' Reads part of the panel into memory, returning it as a MetricPanel. Raises a KeyError if a requested currency or
+      ' metric is not stored.
+      '
+      ' start_date (datetime): the first date to be included, or None to start with the first stored date
+      ' end_date (datetime): the date before which to stop (as with the get_*_dates functions), or None to include the
+      '                      last stored date
+      ' currencies_list (list<Cryptocurrencies>): the currencies to be included, in order, or None for every currency
+      ' metrics (list<str>): the metrics to be included (ex.: "FearGreed"), in order, or None for every metric
+      '''
+      first = 0 if start_date is None else self.dates.searchsorted(pd.Timestamp(start_date), side='left')
+      last = len(self.dates) if end_date is None else self.dates.searchsorted(pd.Timestamp(end_date), side='left')
+
+      currencies_list = self.currencies if currencies_list is None else list(currencies_list)
+      metrics = self.metrics if metrics is None else list(metrics)
+      currency_indices = [self._get_position(self.currencies, currency, "currency") for currency in currencies_list]
+      metric_indices = [self._get_position(self.metrics, metric, "metric") for metric in metrics]
+
+      # slicing the dates only narrows the mapping; indexing the currencies and metrics then reads the selected pages
+      values = self.values[first:last][:, currency_indices][:, :, metric_indices]
+
+      return panel.MetricPanel(self.dates[first:last], currencies_list, metrics, np.array(values, dtype='float64'))
+
+   def _get_position(self, labels, label, kind):
+      try:
+         return labels.index(label)
+      except ValueError:
+         raise KeyError("The panel at {} does not contain the {} {}.".format(self.path, kind, label)) from None
+
+def open_panel(path):
+   '''
+   ' Opens the panel stored at a given location.
+   '
+   ' path (str): the location of the panel, without a suffix (ex.: as returned by get_panel_path)
+   '''
+   return StoredPanel(path)
@@ -0,0 +1,121 @@
+'''
+Plans the retrieval of several historical metrics as the fewest upstream calls. Each metric is retrieved by a function
+of (start_date, end_date, currencies_list), such as a member of HistoricalMetricType; those which read CoinMetrics
+through its cache are merged, so that every requested metric code of an asset is downloaded by a single call (with the
+codes comma-joined) before any of them is read. Each metric is then computed from the cache exactly as it would be alone.
+'''
+
+import functools
+
+from finndex.fundamental import coinmetrics
+from finndex.util import poolutil
+
+__author__ = "Finn Frankis"
+__copyright__ = "Copyright 2020, Crypticko"
+
+def get_coinmetrics_codes(retrieval):
+   '''
+   ' Determines the CoinMetrics codes a retrieval reads through the cache, or None if it is not such a retrieval (ex.: a
+   ' Fear and Greed retrieval, or one which bypasses the cache).
+   '
+   ' retrieval (function): a function of (start_date, end_date, currencies_list)
+   '''
+   if not isinstance(retrieval, functools.partial) or retrieval.func is not coinmetrics.get_coinmetrics_dates:
+      return None
+   if not retrieval.keywords.get('use_cache', True) or not retrieval.args:
+      return None
+   return [metric.value for metric in retrieval.args[0]]
+
+class QueryPlan:
+   '''
+   ' The upstream calls which retrieve a set of metrics: one CoinMetrics call per asset for every code not yet
+   ' downloaded, followed by the retrievals themselves (of which those reading CoinMetrics are served from the cache).
+   '''
+   def __init__(self, assets, coinmetrics_codes, retrievals):
+      self.assets = assets
+      self.coinmetrics_codes = coinmetrics_codes
+      self.retrievals = retrievals
+
+   def get_coinmetrics_calls(self):
+      '''
+      ' Retrieves the merged CoinMetrics calls of the plan, as a list of (asset, codes) pairs.
+      '''
+      return [(asset, self.coinmetrics_codes) for asset in self.assets] if self.coinmetrics_codes else []
+
+class QueryPlanner:
+   '''
+   ' Retrieves metrics over a fixed date range and set of currencies in batches, merging the CoinMetrics calls of each
+   ' batch and remembering which codes have already been downloaded, so that later batches (ex.: prices requested after
+   ' the sentiment) reuse them.
+   '''
+   def __init__(self, start_date, end_date, currencies_list, concurrent = True):
+      '''
+      ' Creates a new planner.
+      '
+      ' start_date (datetime): the start date of every retrieval
+      ' end_date (datetime): the end date of every retrieval
+      ' currencies_list (list<Cryptocurrencies>): the currencies of every retrieval
+      ' concurrent (bool): whether to run independent calls simultaneously rather than one after another
+      '''
+      self.start_date = start_date
+      self.end_date = end_date
+      self.currencies_list = currencies_list
+      self.concurrent = concurrent
+
+      self._downloaded_codes = set()
+
+   def plan(self, retrievals, extra_codes = ()):
+      '''
+      ' Builds the plan retrieving a list of metrics.
+      '
+      ' retrievals (list<function>): the retrieval of each metric, called as retrieval(start_date, end_date, currencies_list)
+      ' extra_codes (list<str>): CoinMetrics codes to be downloaded along with those requested (ex.: PriceUSD, if prices
+      '                         are likely to be requested later), which costs no additional calls
+      '''
+      requested = [code for retrieval in retrievals for code in (get_coinmetrics_codes(retrieval) or [])]
+      codes = []
+      if requested:
+         codes = [code for code in dict.fromkeys(requested + list(extra_codes)) if code not in self._downloaded_codes]
+
+      assets = [currency.value.ticker.lower() for currency in self.currencies_list]
+      return QueryPlan(assets, codes, list(retrievals))
+
+   def execute(self, query_plan):
+      '''
+      ' Runs a plan, returning the frame of each retrieval in the same order as the retrievals.
+      '
+      ' query_plan (QueryPlan): the plan to be run
+      '''
+      def download():
+         # each asset's codes are downloaded together; the CoinMetrics upstream limit bounds the simultaneous calls
+         poolutil.map_concurrent(lambda call: coinmetrics.COIN_METRICS_CACHE.get_series(*call),
+                                 query_plan.get_coinmetrics_calls(), 1 if not self.concurrent else poolutil.MAX_WORKERS)
+         self._downloaded_codes.update(query_plan.coinmetrics_codes)
+
+      retrieve = lambda retrieval: retrieval(self.start_date, self.end_date, self.currencies_list)
+      merged = [retrieval for retrieval in query_plan.retrievals if get_coinmetrics_codes(retrieval) is not None]
+      others = [retrieval for retrieval in query_plan.retrievals if get_coinmetrics_codes(retrieval) is None]
+
+      # the merged CoinMetrics download proceeds alongside the other sources; the CoinMetrics metrics then read the cache
+      tasks = [download] + [functools.partial(retrieve, retrieval) for retrieval in others]
+      if self.concurrent:
+         results = poolutil.map_concurrent(lambda task: task(), tasks)
+      else:
+         results = [task() for task in tasks]
+      frames = dict(zip(map(id, others), results[1:]))
+
+      if self.concurrent:
+         frames.update(zip(map(id, merged), poolutil.map_concurrent(retrieve, merged)))
+      else:
+         frames.update((id(retrieval), retrieve(retrieval)) for retrieval in merged)
+
+      return [frames[id(retrieval)] for retrieval in query_plan.retrievals]
+
+   def retrieve(self, retrievals, extra_codes = ()):
+      '''
+      ' Plans and runs the retrieval of a list of metrics, returning the frame of each in the same order.
+      '
+      ' retrievals (list<function>): the retrieval of each metric, called as retrieval(start_date, end_date, currencies_list)
+      ' extra_codes (list<str>): CoinMetrics codes to be downloaded along with those requested
+      '''
+      return self.execute(self.plan(retrievals, extra_codes))
@@ -0,0 +1,255 @@
+'''
+Runs historical sentiment over a grid of configurations, each a (start date, end date, weights, currencies) combination,
+as in a sliding-window study. The metrics of every configuration are retrieved once, over the union of their date ranges
+and currencies, and saved as a stored panel (see panelstore) alongside each currency's price. A pool of processes then
+evaluates the configurations in chunks, each process memory-mapping the stored panel, so the panel is neither retrieved
+nor copied per process; the operating system's page cache holds the single shared copy. Results are appended to a JSON
+Lines file as soon as each chunk finishes. Each configuration's results are those HistoricalSentimentManager gives.
+'''
+
+import datetime
+import json
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+
+from finndex.aggregate import historical, panel, panelstore
+from finndex.sentiment import trends
+
+__author__ = "Finn Frankis"
+__copyright__ = "Copyright 2020, Crypticko"
+
+FIRST_HOUR_METRIC = "TrendsFirstHour" # the label under which each day's first hourly Trends value is stored
+DEFAULT_PANEL_NAME = "sweep"
+CHUNKS_PER_WORKER = 4 # chunks are small enough for finished results to be written steadily and for workers to stay busy
+
+class SweepConfiguration:
+   '''
+   ' Represents a single configuration of a sweep. Its dates are taken as whole days (floored to midnight).
+   '''
+   def __init__(self, start_date, end_date, weights, currencies_list):
+      '''
+      ' Creates a new configuration.
+      '
+      ' start_date (datetime): the first date of the range
+      ' end_date (datetime): the date before which the range ends
+      ' weights (list<float>): the weight of each of the sweep's metrics, in the same order
+      ' currencies_list (list<Cryptocurrencies>): the currencies whose sentiment is computed
+      '''
+      self.start_date = pd.Timestamp(start_date).floor('d')
+      self.end_date = pd.Timestamp(end_date).floor('d')
+      self.weights = [float(weight) for weight in weights]
+      self.currencies_list = list(currencies_list)
+
+def get_sliding_windows(start_date, end_date, length, step = datetime.timedelta(days=1)):
+   '''
+   ' Builds the date ranges of a given length which fit between two dates, each starting a fixed step after the last.
+   ' Returns a list of (start date, end date) pairs.
+   '
+   ' start_date (datetime): the first date of the earliest range
+   ' end_date (datetime): the date by which every range has ended
+   ' length (timedelta): the length of each range
+   ' step (timedelta): the offset between the starts of consecutive ranges
+   '''
+   windows = []
+   window_start = pd.Timestamp(start_date)
+   while window_start + length <= pd.Timestamp(end_date):
+      windows += [(window_start, window_start + length)]
+      window_start += step
+   return windows
+
+def build_grid(windows, weights_matrix, currencies_lists):
+   '''
+   ' Builds every combination of a date range, a weight vector, and a list of currencies.
+   '
+   ' windows (list<tuple>): the (start date, end date) pairs (ex.: as returned by get_sliding_windows)
+   ' weights_matrix (array-like): one weight vector per row (ex.: as returned by backtest.grid_weights)
+   ' currencies_lists (list<list<Cryptocurrencies>>): the lists of currencies
+   '''
+   return [SweepConfiguration(start_date, end_date, weights, currencies_list)
+           for start_date, end_date in windows for weights in weights_matrix for currencies_list in currencies_lists]
+
+class SweepRunner:
+   '''
+   ' Evaluates a list of configurations over a fixed set of metrics on a pool of processes.
+   '''
+   def __init__(self, configurations, keywords_list, panel_path = None, workers = None, chunk_size = None):
+      '''
+      ' Creates a new runner.
+      '
+      ' configurations (list<SweepConfiguration>): the configurations to be evaluated
+      ' keywords_list (list<HistoricalMetricType>): the metrics weighted by every configuration
+      ' panel_path (str): the location (without a suffix) at which the shared panel is stored; defaults to the "sweep"
+      '                   panel of the local cache
+      ' workers (int): the number of processes; defaults to one per CPU, and 1 evaluates on the calling process
+      ' chunk_size (int): the number of configurations sent to a process at once; defaults to a size giving each
+      '                   process several chunks
+      '''
+      self.configurations = list(configurations)
+      self.keywords_list = list(keywords_list)
+      self.panel_path = panel_path if panel_path is not None else panelstore.get_panel_path(DEFAULT_PANEL_NAME)
+      self.workers = workers if workers is not None else os.cpu_count() or 1
+      self.chunk_size = chunk_size
+
+      self.metrics = [historical.METRIC_COLUMNS[metric] for metric in self.keywords_list]
+      self.loaded = False
+
+   def load(self):
+      '''
+      ' Retrieves every metric and price over the union of the configurations' date ranges and currencies, and saves them
+      ' as the shared panel. With Trends, the first hourly value of each day is saved as well, for the final day of each
+      ' range (see evaluate).
+      '''
+      currencies_list = list(dict.fromkeys(currency for configuration in self.configurations
+                                                     for currency in configuration.currencies_list))
+      manager = historical.HistoricalSentimentManager(self.keywords_list, currencies_list,
+                                                      min(configuration.start_date for configuration in self.configurations),
+                                                      max(configuration.end_date for configuration in self.configurations))
+
+      metrics_panel = manager.get_panel()
+      values = metrics_panel.values[:, [metrics_panel.currencies.index(currency) for currency in currencies_list]]
+      values = values[:, :, [metrics_panel.metrics.index(metric) for metric in self.metrics]]
+      prices = manager.get_aligned_prices()[:, [metrics_panel.currencies.index(currency) for currency in currencies_list]]
+      extra_metrics, extra_values = [historical.PRICE_COLUMN], [prices]
+
+      if historical.HistoricalMetricType.TRENDS in self.keywords_list:
+         first_hours = trends.get_trends_first_hours(metrics_panel.dates[0], metrics_panel.dates[-1], currencies_list)
+         first_hours = first_hours.reindex(index = metrics_panel.dates,
+                                           columns = pd.MultiIndex.from_product([currencies_list, ["Trends"]]))
+         extra_metrics += [FIRST_HOUR_METRIC]
+         extra_values += [first_hours.to_numpy(dtype='float')]
+
+      values = np.concatenate([values] + [extra[:, :, np.newaxis] for extra in extra_values], axis=2)
+      panelstore.write_panel(self.panel_path, panel.MetricPanel(metrics_panel.dates, currencies_list,
+                                                                self.metrics + extra_metrics, values))
+      self.loaded = True
+
+   def get_chunks(self):
+      '''
+      ' Splits the configurations into chunks, returning a list of lists of (position, configuration) pairs.
+      '''
+      chunk_size = self.chunk_size
+      if chunk_size is None:
+         chunk_size = max(1, math.ceil(len(self.configurations) / (self.workers * CHUNKS_PER_WORKER)))
+
+      numbered = list(enumerate(self.configurations))
+      return [numbered[first:first + chunk_size] for first in range(0, len(numbered), chunk_size)]
+
+   def run(self, output_path):
+      '''
+      ' Evaluates every configuration, first loading the shared panel if it has not been, and writes one JSON object per
+      ' configuration (see evaluate) to a file, one per line, as each chunk finishes. The lines appear in the order in
+      ' which configurations finish; each includes the position of its configuration. Returns the number of lines written.
+      '
+      ' output_path (str): the location of the JSON Lines file, which is replaced
+      '''
+      if not self.loaded:
+         self.load()
+
+      written = 0
+      with open(output_path, 'w') as output:
+         if self.workers <= 1:
+            open_shared_panel(self.panel_path, self.keywords_list)
+            for chunk in self.get_chunks():
+               written += write_lines(output, run_chunk(chunk))
+         else:
+            # each process opens the panel once, when started; the chunks carry only the configurations
+            with ProcessPoolExecutor(max_workers=self.workers, initializer=open_shared_panel,
+                                     initargs=(self.panel_path, self.keywords_list)) as executor:
+               futures = [executor.submit(run_chunk, chunk) for chunk in self.get_chunks()]
+               for future in as_completed(futures):
+                  written += write_lines(output, future.result())
+      return written
+
+def write_lines(output, lines):
+   output.write("".join(line + "\n" for line in lines))
+   output.flush()
+   return len(lines)
+
+_shared_panel = None # the stored panel memory-mapped by this process, opened once per process by open_shared_panel
+_shared_keywords = None
+
+def open_shared_panel(path, keywords_list):
+   '''
+   ' Opens the shared panel within the current process (the initializer of each worker).
+   '
+   ' path (str): the location of the panel, without a suffix
+   ' keywords_list (list<HistoricalMetricType>): the metrics weighted by every configuration, in order
+   '''
+   global _shared_panel, _shared_keywords
+   _shared_panel = panelstore.open_panel(path)
+   _shared_keywords = list(keywords_list)
+
+def run_chunk(chunk):
+   '''
+   ' Evaluates a chunk of (position, configuration) pairs against the shared panel, returning one serialized JSON line
+   ' per configuration.
+   '''
+   return [json.dumps(dict(position=position, **evaluate(_shared_panel, _shared_keywords, configuration)))
+           for position, configuration in chunk]
+
+def evaluate(stored_panel, keywords_list, configuration):
+   '''
+   ' Computes the sentiment of each currency of a configuration on each date HistoricalSentimentManager would give,
+   ' along with the Pearson correlation between that sentiment and the currency's aligned price (as the manager's
+   ' get_aligned_prices). Returns a JSON-serializable dictionary with the
+   ' configuration's 'start_date', 'end_date', 'weights', and 'currencies' (as ticker symbols), its 'sentiment' (keyed by
+   ' ticker symbol, then by date), and its 'price_correlation' (keyed by ticker symbol). Missing values are None.
+   '
+   ' stored_panel (StoredPanel): the shared panel, holding every metric and the price of every currency
+   ' keywords_list (list<HistoricalMetricType>): the metrics weighted by the configuration, in order
+   ' configuration (SweepConfiguration): the configuration to be evaluated
+   '''
+   metrics = [historical.METRIC_COLUMNS[metric] for metric in keywords_list]
+   extra_metrics = [historical.PRICE_COLUMN]
+   if historical.HistoricalMetricType.TRENDS in keywords_list:
+      extra_metrics += [FIRST_HOUR_METRIC]
+
+   first, stop = historical.get_selection_range(keywords_list, configuration.start_date, configuration.end_date)
+   selected = stored_panel.select(first, stop, configuration.currencies_list, metrics + extra_metrics)
+   values = selected.values[:, :, :len(metrics)]
+   prices = selected.values[:, :, len(metrics)]
+
+   if len(selected.dates) > 1 and selected.dates[-1] >= configuration.end_date:
+      # only Trends covers the end date, and only with its first hour; as in the manager, every other metric carries
+      # its previous value forward (as does Trends, if that hour is missing), and no price is retrieved for the day
+      trends_position = metrics.index(historical.METRIC_COLUMNS[historical.HistoricalMetricType.TRENDS])
+      first_hours = selected.values[-1, :, -1]
+      values[-1] = values[-2]
+      values[-1, :, trends_position] = np.where(np.isnan(first_hours), values[-2, :, trends_position], first_hours)
+      prices[-1] = np.nan
+
+   sentiment = panel.weighted_average(values, configuration.weights)
+
+   dates = selected.dates.strftime('%Y-%m-%d')
+   tickers = [currency.value.ticker for currency in configuration.currencies_list]
+   return {'start_date': configuration.start_date.strftime('%Y-%m-%d'),
+           'end_date': configuration.end_date.strftime('%Y-%m-%d'),
+           'weights': configuration.weights,
+           'currencies': tickers,
+           'sentiment': {ticker: dict(zip(dates, to_json_values(sentiment[:, column])))
+                         for column, ticker in enumerate(tickers)},
+           'price_correlation': {ticker: to_json_value(correlate(sentiment[:, column], prices[:, column]))
+                                 for column, ticker in enumerate(tickers)}}
+
+def correlate(first, second):
+   '''
+   ' Computes the Pearson correlation between two series over the dates on which both are present, or NaN if there are
+   ' fewer than two such dates or either series is constant over them.
+   '''
+   present = ~np.isnan(first) & ~np.isnan(second)
+   if present.sum() < 2:
+      return np.nan
+
+   first, second = first[present] - first[present].mean(), second[present] - second[present].mean()
+   denominator = np.sqrt((first @ first) * (second @ second))
+   return first @ second / denominator if denominator > 0 else np.nan
+
+def to_json_value(value):
+   return None if np.isnan(value) else float(value)
+
+def to_json_values(values):
+   return [to_json_value(value) for value in values]
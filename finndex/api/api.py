@@ -1,14 +1,136 @@
+'''
+Serves historical sentiment and price data over HTTP. The application is built by create_app; the module-level 'app'
+can be served by any WSGI host (ex.: gunicorn "finndex.api.api:app"), and running this module serves it directly.
+'''
+
+import argparse
+import mimetypes
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
 import flask
-from flask import request, jsonify
+from flask import current_app, g, request, jsonify
 import pandas as pd
 import finndex
 from finndex.aggregate.historical import HistoricalMetricType, HistoricalSentimentManager
+from finndex.api import resultcache, scheduler
+from finndex.util import instrumentation
 from finndex.util.cryptocurrencies import Cryptocurrencies, Stock
 
-app = flask.Flask(__name__, static_url_path='')
-app.config["DEBUG"] = True
+DEFAULT_HOST = '0.0.0.0'
+DEFAULT_PORT = 9200
+DEFAULT_THREADS = 8
+
+WIDGETS_DIRECTORY = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'widgets')
+
+DEFAULT_CONFIG = {'DEBUG': False,
+                  'COMPUTE_WORKERS': 0, # the size of the pool computing results; 0 computes on the request's own thread
+                  'COMPUTE_POOL': 'thread', # either 'thread' or 'process'
+                  'REFRESH': False, # whether to refresh the sources and precompute the widget's results in the background
+                  'WIDGETS_DIRECTORY': WIDGETS_DIRECTORY}
+
+MAX_CACHED_RESULTS = 512
+RESULT_CACHE = resultcache.ResultCache(MAX_CACHED_RESULTS)
+
+api = flask.Blueprint('finndex', __name__)
+
+def compute_sentiment(coin_str, metrics_strlist, weights, start_date, end_date):
+    '''
+    ' Computes the historical sentiment of a single coin, returning a dictionary with each date as the key and the
+    ' sentiment on that date as the value.
+    '''
+    coin = Cryptocurrencies(Stock(coin_str.upper()))
+    sentiment = HistoricalSentimentManager(
+                                [HistoricalMetricType[metric] for metric in metrics_strlist],
+                                [coin],
+                                start_date, end_date, weights).get_historical_sentiment()[coin]
+    sentiment.index = sentiment.index.strftime('%Y-%m-%d')
+    return sentiment.to_dict()
+
+def compute_price(coin_str, start_date, end_date):
+    '''
+    ' Computes the historical price of a single coin, returning a dictionary with each date as the key and the price on
+    ' that date as the value.
+    '''
+    coin = Cryptocurrencies(Stock(coin_str.upper()))
+    sentiment = HistoricalSentimentManager(
+                                [],
+                                [coin],
+                                start_date, end_date, []).get_prices()[coin]["PriceUSD"]
+    sentiment.index = sentiment.index.strftime('%Y-%m-%d')
+    return sentiment.to_dict()
+
+def compute_batch(coins_strlist, metrics_strlist, weights, start_date, end_date):
+    '''
+    ' Computes the historical sentiment and price of several coins using one HistoricalSentimentManager, returning a
+    ' dictionary with each ticker symbol as the key and a dictionary of its 'sentiment' and 'price' as the value.
+    '''
+    coins = [Cryptocurrencies(Stock(coin_str)) for coin_str in coins_strlist]
+    manager = HistoricalSentimentManager(
+                                [HistoricalMetricType[metric] for metric in metrics_strlist],
+                                coins,
+                                start_date, end_date, weights)
+    sentiment = manager.get_historical_sentiment()
+    prices = manager.get_prices()
+
+    batch = {}
+    for coin in coins:
+        coin_sentiment = sentiment[coin]
+        coin_sentiment.index = coin_sentiment.index.strftime('%Y-%m-%d')
+        coin_price = prices[coin]["PriceUSD"]
+        coin_price.index = coin_price.index.strftime('%Y-%m-%d')
+        batch[coin.value.ticker] = {'sentiment': coin_sentiment.to_dict(), 'price': coin_price.to_dict()}
+    return batch
 
-@app.route('/api/sentiment/coin=<coin_str>')
+def run_computation(function, *args):
+    '''
+    ' Runs a computation on the application's compute pool, if one is configured, or on the current thread otherwise.
+    '
+    ' function (function): the computation, which must be a module-level function if the pool is process-based
+    ' args (list): the arguments with which the computation is called
+    '''
+    pool = current_app.extensions.get('finndex_compute_pool')
+    if pool is None:
+        return function(*args)
+    return pool.submit(function, *args).result()
+
+def cached_response(key, end_date, function, *args):
+    '''
+    ' Serves a result from the result cache (computing it if necessary) with the corresponding ETag and Cache-Control
+    ' headers, responding with 304 Not Modified if the client already holds the current version.
+    '
+    ' key (tuple): the normalized description of the request, as built by resultcache.normalize_key
+    ' end_date (datetime): the end date of the request's date range
+    ' function (function): computes the JSON-serializable result when called with the given arguments
+    ' args (list): the arguments with which the function is called
+    '''
+    entry = RESULT_CACHE.get_or_compute(key, end_date, lambda: run_computation(function, *args))
+
+    with instrumentation.time_block(instrumentation.SERIALIZATION_SECONDS, endpoint=request.endpoint):
+        response = jsonify(entry.result)
+    response.set_etag(entry.etag)
+    response.headers['Cache-Control'] = entry.cache_control
+    return response.make_conditional(request)
+
+@api.before_request
+def start_timing():
+    g.request_start = time.perf_counter()
+
+@api.after_request
+def record_timing(response):
+    instrumentation.REGISTRY.observe(instrumentation.REQUEST_SECONDS, time.perf_counter() - g.request_start,
+                                     endpoint=request.endpoint, status=str(response.status_code))
+    return response
+
+@api.route('/metrics')
+def get_metrics():
+    '''
+    ' Reports the latency, download, and cache measurements of this process in the Prometheus text format.
+    '''
+    return flask.Response(instrumentation.render(), mimetype='text/plain; version=0.0.4')
+
+@api.route('/api/sentiment/coin=<coin_str>')
 def get_sentiment_score(coin_str):
     if 'start_date' in request.args:
         start_date = pd.to_datetime(request.args['start_date'])
@@ -25,20 +147,21 @@ def get_sentiment_score(coin_str):
     else:
         return "Error: No metrics field provided. Please specify metrics."
 
+    if len(set(metrics_strlist)) < len(metrics_strlist):
+        return "Error: A metric was listed more than once. Please specify each metric once.", 400
+
     if 'weights' in request.args:
         weights = [float(metric) for metric in request.args['weights'].upper().split(',')]
     else:
         weights = None
 
-    coin = Cryptocurrencies(Stock(coin_str.upper()))
-    sentiment = HistoricalSentimentManager( 
-                                [HistoricalMetricType[metric] for metric in metrics_strlist], 
-                                [coin],
-                                start_date, end_date, weights).get_historical_sentiment()[coin]
-    sentiment.index = sentiment.index.strftime('%Y-%m-%d')
-    return sentiment.to_dict()
+    if weights is not None and len(weights) != len(metrics_strlist):
+        return "Error: The number of weights does not match the number of metrics. Please specify one weight per metric.", 400
+
+    key = resultcache.normalize_key('sentiment', [coin_str], metrics_strlist, weights, start_date, end_date)
+    return cached_response(key, end_date, compute_sentiment, coin_str, metrics_strlist, weights, start_date, end_date)
 
-@app.route('/api/price/coin=<coin_str>')
+@api.route('/api/price/coin=<coin_str>')
 def get_price(coin_str):
     if 'start_date' in request.args:
         start_date = pd.to_datetime(request.args['start_date'])
@@ -50,18 +173,160 @@ def get_price(coin_str):
     else:
         return "Error: No end date field provided. Please specify an end date."
 
-    coin = Cryptocurrencies(Stock(coin_str.upper()))
-    sentiment = HistoricalSentimentManager( 
-                                [], 
-                                [coin],
-                                start_date, end_date, []).get_prices()[coin]["PriceUSD"]
-    sentiment.index = sentiment.index.strftime('%Y-%m-%d')
-    return sentiment.to_dict()
+    key = resultcache.normalize_key('price', [coin_str], [], None, start_date, end_date)
+    return cached_response(key, end_date, compute_price, coin_str, start_date, end_date)
 
 
-@app.route('/widgets/<path:path>', methods=['GET'])
+@api.route('/api/batch')
+def get_batch():
+    '''
+    ' Retrieves the sentiment and price of several coins at once. All coins share one HistoricalSentimentManager,
+    ' so each upstream source is retrieved once for the whole batch rather than once per coin.
+    '''
+    if 'coins' in request.args:
+        coins_strlist = list(dict.fromkeys(request.args['coins'].upper().split(','))) # each coin is computed once
+    else:
+        return "Error: No coins field provided. Please specify coins."
+
+    if 'start_date' in request.args:
+        start_date = pd.to_datetime(request.args['start_date'])
+    else:
+        return "Error: No start date field provided. Please specify a start date."
+
+    if 'end_date' in request.args:
+        end_date = pd.to_datetime(request.args['end_date'])
+    else:
+        return "Error: No end date field provided. Please specify an end date."
+
+    if 'metrics' in request.args:
+        metrics_strlist = request.args['metrics'].upper().split(',')
+    else:
+        return "Error: No metrics field provided. Please specify metrics."
+
+    if len(set(metrics_strlist)) < len(metrics_strlist):
+        return "Error: A metric was listed more than once. Please specify each metric once.", 400
+
+    if 'weights' in request.args:
+        weights = [float(metric) for metric in request.args['weights'].upper().split(',')]
+    else:
+        weights = None
+
+    if weights is not None and len(weights) != len(metrics_strlist):
+        return "Error: The number of weights does not match the number of metrics. Please specify one weight per metric.", 400
+
+    key = resultcache.normalize_key('batch', coins_strlist, metrics_strlist, weights, start_date, end_date)
+    return cached_response(key, end_date, compute_batch, coins_strlist, metrics_strlist, weights, start_date, end_date)
+
+@api.route('/widgets/<path:path>', methods=['GET'])
 def file_retrieve(path):
-    f = open('widgets/' + str(path), "r")
-    return f.read()
+    assets = current_app.extensions['finndex_widgets']
+    if path not in assets:
+        flask.abort(404)
+
+    content, mimetype = assets[path]
+    return flask.Response(content, mimetype=mimetype)
+
+def load_widget_assets(directory):
+    '''
+    ' Reads every file beneath the widgets directory into memory, returning a dictionary with each file's path (relative
+    ' to the directory, using forward slashes) as the key and a tuple of its content and MIME type as the value.
+    '
+    ' directory (str): the directory containing the widget assets
+    '''
+    assets = {}
+    for root, directories, files in os.walk(directory):
+        for name in files:
+            path = os.path.join(root, name)
+            with open(path, 'rb') as asset:
+                content = asset.read()
+            mimetype = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+            assets[os.path.relpath(path, directory).replace(os.sep, '/')] = (content, mimetype)
+    return assets
+
+def create_app(config = None):
+    '''
+    ' Builds the API application, preloading the widget assets and starting the compute pool and the background refresh
+    ' scheduler, if configured.
+    '
+    ' config (dict): values overriding those of DEFAULT_CONFIG
+    '''
+    app = flask.Flask(__name__, static_url_path='')
+    app.config.update(DEFAULT_CONFIG)
+    if config is not None:
+        app.config.update(config)
+
+    app.extensions['finndex_widgets'] = load_widget_assets(app.config['WIDGETS_DIRECTORY'])
+
+    pool = None
+    if app.config['COMPUTE_WORKERS'] > 0:
+        if app.config['COMPUTE_POOL'] == 'process':
+            pool = ProcessPoolExecutor(max_workers=app.config['COMPUTE_WORKERS'])
+        else:
+            pool = ThreadPoolExecutor(max_workers=app.config['COMPUTE_WORKERS'])
+    app.extensions['finndex_compute_pool'] = pool
+
+    refresh_scheduler = None
+    if app.config['REFRESH']:
+        refresh_scheduler = scheduler.build_scheduler(result_cache=RESULT_CACHE, compute=compute_batch)
+        refresh_scheduler.start()
+    app.extensions['finndex_scheduler'] = refresh_scheduler
+
+    app.register_blueprint(api)
+    return app
+
+def serve(config = None, host = DEFAULT_HOST, port = DEFAULT_PORT, workers = 1, threads = DEFAULT_THREADS):
+    '''
+    ' Serves the API until interrupted. With several workers, uses gunicorn to run one process per worker (each with its
+    ' own application); with one, uses waitress if installed, falling back to Flask's threaded server otherwise.
+    '
+    ' config (dict): values overriding those of DEFAULT_CONFIG
+    ' host (str): the address on which to listen
+    ' port (int): the port on which to listen
+    ' workers (int): the number of server processes
+    ' threads (int): the number of request-handling threads per process
+    '''
+    if workers > 1:
+        from gunicorn.app.base import BaseApplication
+
+        class FinndexApplication(BaseApplication):
+            def load_config(self):
+                self.cfg.set('bind', '{}:{}'.format(host, port))
+                self.cfg.set('workers', workers)
+                self.cfg.set('threads', threads)
+                self.cfg.set('worker_class', 'gthread')
+
+            def load(self):
+                return create_app(config) # called within each worker, so compute pools are never shared across a fork
+
+        FinndexApplication().run()
+        return
+
+    app = create_app(config)
+    try:
+        import waitress
+    except ImportError:
+        app.run(host=host, port=port, threaded=True)
+    else:
+        waitress.serve(app, host=host, port=port, threads=threads)
+
+def main():
+    parser = argparse.ArgumentParser(description='Serves the finndex API.')
+    parser.add_argument('--host', default=DEFAULT_HOST)
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--workers', type=int, default=1, help='the number of server processes (requires gunicorn if above 1)')
+    parser.add_argument('--threads', type=int, default=DEFAULT_THREADS, help='the number of request threads per process')
+    parser.add_argument('--compute-workers', type=int, default=0, help='the size of the pool computing results')
+    parser.add_argument('--compute-pool', choices=['thread', 'process'], default='thread')
+    parser.add_argument('--refresh', action='store_true',
+                        help='refresh upstream data and precompute the widget\'s results in the background')
+    parser.add_argument('--debug', action='store_true')
+    args = parser.parse_args()
+
+    config = {'DEBUG': args.debug, 'COMPUTE_WORKERS': args.compute_workers, 'COMPUTE_POOL': args.compute_pool,
+              'REFRESH': args.refresh}
+    serve(config, args.host, args.port, args.workers, args.threads)
+
+app = create_app()
 
-app.run(host='0.0.0.0', port='9200')
+if __name__ == '__main__':
+    main()
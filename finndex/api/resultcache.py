@@ -0,0 +1,155 @@
+'''
+Caches computed API results in memory with least-recently-used eviction, alongside the ETag and Cache-Control
+header values with which they are served.
+'''
+
+import datetime
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+import pandas as pd
+
+from finndex.util import instrumentation, poolutil
+
+__author__ = "Finn Frankis"
+__copyright__ = "Copyright 2020, Crypticko"
+
+DEFAULT_MAX_ENTRIES = 512
+CURRENT_TIME_TO_LIVE = 5 * 60 # seconds after which a result which includes the current day is recomputed
+HISTORICAL_TIME_TO_LIVE = 24 * 60 * 60 # seconds after which a result for past dates is recomputed
+
+# results for past dates change only when a new all-time maximum rescales the CoinMetrics metrics (at most daily), so
+# they may be held for a day and then revalidated with their ETag
+HISTORICAL_CACHE_CONTROL = "public, max-age={}".format(HISTORICAL_TIME_TO_LIVE)
+CURRENT_CACHE_CONTROL = "no-cache" # results which include the current day must be revalidated with their ETag
+
+class CachedResult:
+   '''
+   ' Represents a computed result along with the headers describing how long it may be cached.
+   '''
+   def __init__(self, result, etag, cache_control, expiry):
+      self.result = result
+      self.etag = etag
+      self.cache_control = cache_control
+      self.expiry = expiry # the time (in seconds since the epoch) after which the result is recomputed
+
+class ResultCache:
+   '''
+   ' A thread-safe, size-limited mapping from normalized request keys to computed results, evicting the least
+   ' recently used result once full.
+   '''
+   def __init__(self, max_entries = DEFAULT_MAX_ENTRIES, clock = time.time):
+      '''
+      ' Creates a new, empty cache.
+      '
+      ' max_entries (int): the maximum number of results held at once
+      ' clock (function): returns the current time in seconds since the epoch
+      '''
+      self.max_entries = max_entries
+      self.clock = clock
+
+      self._entries = OrderedDict() # least recently used first
+      self._flights = poolutil.SingleFlight("result") # computations in progress, keyed like the entries
+      self._lock = threading.Lock()
+
+   def get_or_compute(self, key, end_date, compute):
+      '''
+      ' Retrieves the cached result for a key, computing and storing it first if absent or expired. A result whose date
+      ' range ends before the current day is recomputed daily; any other result is recomputed after a short interval.
+      ' Concurrent callers missing the same key wait for a single computation rather than each computing the result.
+      '
+      ' key (tuple): the normalized, hashable description of the request
+      ' end_date (datetime): the end date of the request's date range
+      ' compute (function): computes the JSON-serializable result when called with no arguments
+      '''
+      entry = self._get_current(key)
+      instrumentation.record_cache("result", entry is not None)
+      if entry is not None:
+         return entry
+
+      def compute_entry():
+         # the result may have been stored by a computation which finished after it was found missing
+         entry = self._get_current(key)
+         return entry if entry is not None else self.put(key, end_date, compute())
+
+      return self._flights.do(key, compute_entry)
+
+   def _get_current(self, key):
+      with self._lock:
+         entry = self._entries.get(key)
+         if entry is not None and self.clock() < entry.expiry:
+            self._entries.move_to_end(key)
+            return entry
+      return None
+
+   def put(self, key, end_date, result):
+      '''
+      ' Stores a computed result for a key, replacing any result already held (ex.: to refresh it before it expires).
+      ' Returns the stored CachedResult.
+      '
+      ' key (tuple): the normalized, hashable description of the request
+      ' end_date (datetime): the end date of the request's date range
+      ' result (object): the JSON-serializable result
+      '''
+      etag = hashlib.sha1(json.dumps(result, sort_keys=True).encode("utf-8")).hexdigest()
+
+      if is_historical(end_date, self.clock()):
+         entry = CachedResult(result, etag, HISTORICAL_CACHE_CONTROL, self.clock() + HISTORICAL_TIME_TO_LIVE)
+      else:
+         entry = CachedResult(result, etag, CURRENT_CACHE_CONTROL, self.clock() + CURRENT_TIME_TO_LIVE)
+
+      with self._lock:
+         self._entries[key] = entry
+         self._entries.move_to_end(key)
+         while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+      return entry
+
+   def clear(self):
+      '''
+      ' Removes every cached result.
+      '''
+      with self._lock:
+         self._entries.clear()
+
+   def __len__(self):
+      return len(self._entries)
+
+def is_historical(end_date, now):
+   '''
+   ' Determines whether a date range ends before the start of the current day, such that its results can no longer change.
+   '
+   ' end_date (datetime): the end date of the range
+   ' now (float): the current time in seconds since the epoch
+   '''
+   today = pd.Timestamp(datetime.datetime.fromtimestamp(now).date())
+   return pd.Timestamp(end_date) <= today
+
+def normalize_key(kind, coins, metrics, weights, start_date, end_date):
+   '''
+   ' Builds a hashable key which is identical for any two requests with the same meaning, regardless of letter case,
+   ' the order in which coins and metrics are listed, whether a coin is listed more than once, or whether equal weights
+   ' are given explicitly.
+   '
+   ' kind (str): the kind of result requested (ex.: "sentiment")
+   ' coins (list<str>): the ticker symbols of the requested coins
+   ' metrics (list<str>): the names of the requested metrics
+   ' weights (list<float>): the weight of each metric, in the same order, or None for equal weighting
+   ' start_date (datetime): the start date of the request's date range
+   ' end_date (datetime): the end date of the request's date range
+   '''
+   metrics = [metric.upper() for metric in metrics]
+   if weights is None:
+      weights = [1.0 / len(metrics) for metric in metrics] if metrics else []
+   elif len(weights) != len(metrics):
+      raise ValueError("{} weights were given for {} metrics; expected one weight per metric.".format(len(weights), len(metrics)))
+
+   return (kind,
+           tuple(sorted(set(coin.upper() for coin in coins))),
+           tuple(sorted(zip(metrics, (float(weight) for weight in weights)))),
+           pd.Timestamp(start_date).isoformat(),
+           pd.Timestamp(end_date).isoformat())
@@ -0,0 +1,278 @@
+'''
+Refreshes the upstream sources in the background, so that requests find their data already downloaded rather than
+paying for the download themselves. Each source is refreshed on its own schedule: at the upstream's next update where
+it gives a hint (ex.: Fear and Greed's 'time_until_update'), and otherwise once its cache would consider the data stale.
+Every refresh is delayed by a random jitter, so that several server processes do not refresh at the same instant, and
+each source has a budget of refreshes per hour, so that a misleading hint or repeated failure cannot flood the upstream.
+After the sources, the results the widget requests by default are precomputed into the API's result cache.
+'''
+
+import collections
+import datetime
+import random
+import threading
+import time
+
+import pandas as pd
+
+from finndex.aggregate import queryplan
+from finndex.aggregate.historical import HistoricalMetricType
+from finndex.api import resultcache
+from finndex.fundamental import coinmetrics
+from finndex.sentiment import fearandgreed, trends, trendscache
+from finndex.util import instrumentation, poolutil
+from finndex.util.cryptocurrencies import Cryptocurrencies
+
+__author__ = "Finn Frankis"
+__copyright__ = "Copyright 2020, Crypticko"
+
+FEAR_AND_GREED_SOURCE = "fearandgreed"
+COIN_METRICS_SOURCE = "coinmetrics"
+TRENDS_SOURCE = "trends"
+PRECOMPUTE_SOURCE = "precompute"
+
+BUDGET_WINDOW = 60 * 60 # seconds over which each source's budget of refreshes applies
+RETRY_INTERVAL = 5 * 60 # seconds after which a failed refresh is retried, at most
+MIN_DELAY = 1 # seconds between refreshes of a source at minimum, whatever its hint
+
+DEFAULT_JITTERS = {FEAR_AND_GREED_SOURCE: 60, COIN_METRICS_SOURCE: 5 * 60, TRENDS_SOURCE: 5 * 60, PRECOMPUTE_SOURCE: 30}
+DEFAULT_BUDGETS = {FEAR_AND_GREED_SOURCE: 4, COIN_METRICS_SOURCE: 4, TRENDS_SOURCE: 4, PRECOMPUTE_SOURCE: 24}
+
+# the coins offered by the widget, and the metrics (equally weighted) and date range it initially selects
+DEFAULT_CURRENCIES = [Cryptocurrencies.BITCOIN, Cryptocurrencies.ETHEREUM, Cryptocurrencies.CHAINLINK,
+                      Cryptocurrencies.KYBER_NETWORK, Cryptocurrencies.BAT, Cryptocurrencies.TEZOS]
+DEFAULT_METRICS = [HistoricalMetricType.TRENDS, HistoricalMetricType.FEAR_AND_GREED,
+                   HistoricalMetricType.DAILY_ADDRESSES, HistoricalMetricType.TRANSACTION_CNT]
+DEFAULT_WINDOWS = [(375, 365)] # (days before today on which the range starts, days before today on which it ends)
+
+TRENDS_WINDOW = datetime.timedelta(weeks=4) # the range refreshed, matching HistoricalSentimentManager's default
+
+class RefreshSource:
+   '''
+   ' Represents a source refreshed by the scheduler, along with how often and how many times it may be refreshed.
+   '''
+   def __init__(self, name, refresh, interval, jitter = 0, budget = None):
+      '''
+      ' Creates a new source.
+      '
+      ' name (str): the name of the source (ex.: "fearandgreed")
+      ' refresh (function): refreshes the source when called with no arguments, returning the number of seconds until it
+      '                     should next be refreshed (ex.: as hinted by the upstream) or None to wait the interval
+      ' interval (float): the number of seconds between refreshes when refresh gives no hint
+      ' jitter (float): the maximum number of seconds by which each refresh is randomly delayed
+      ' budget (int): the maximum number of refreshes within any BUDGET_WINDOW, or None for no limit
+      '''
+      self.name = name
+      self.refresh = refresh
+      self.interval = interval
+      self.jitter = jitter
+      self.budget = budget
+
+class RefreshScheduler:
+   '''
+   ' Refreshes a list of sources, each whenever it is due, either on a background thread (see start) or whenever
+   ' run_pending is called. Every source is due as soon as the scheduler is created.
+   '''
+   def __init__(self, sources, clock = time.time, seed = None):
+      '''
+      ' Creates a new scheduler.
+      '
+      ' sources (list<RefreshSource>): the sources, refreshed in this order whenever several are due at once
+      ' clock (function): returns the current time in seconds since the epoch
+      ' seed (int): the seed of the random number generator drawing each jitter, for repeatable schedules
+      '''
+      self.sources = list(sources)
+      self.clock = clock
+      self.errors = {} # source name -> the exception raised by its latest refresh, if that refresh failed
+
+      self._random = random.Random(seed)
+      self._due = {source.name: clock() for source in self.sources} # source name -> time of its next refresh
+      self._runs = {source.name: collections.deque() for source in self.sources} # source name -> recent refresh times
+      self._lock = threading.Lock()
+      self._stopped = threading.Event()
+      self._thread = None
+
+   def run_pending(self):
+      '''
+      ' Refreshes every source which is due, returning the names of those refreshed. A source whose budget is spent is
+      ' postponed until its earliest refresh leaves the budget window; a source whose refresh fails is retried sooner
+      ' than usual, with the exception kept in 'errors'.
+      '''
+      refreshed = []
+      with self._lock:
+         for source in self.sources:
+            now = self.clock()
+            if now < self._due[source.name]:
+               continue
+
+            runs = self._runs[source.name]
+            while runs and runs[0] <= now - BUDGET_WINDOW:
+               runs.popleft()
+            if source.budget is not None and len(runs) >= source.budget:
+               self._due[source.name] = runs[0] + BUDGET_WINDOW
+               instrumentation.REGISTRY.increment(instrumentation.REFRESH_DEFERRED, source=source.name)
+               continue
+
+            runs.append(now)
+            self._due[source.name] = now + self._refresh(source)
+            refreshed += [source.name]
+      return refreshed
+
+   def get_next_due(self):
+      '''
+      ' Determines the time (in seconds since the epoch) at which the next source is due, or None if there are none.
+      '''
+      with self._lock:
+         return min(self._due.values()) if self._due else None
+
+   def start(self):
+      '''
+      ' Starts refreshing the sources on a background (daemon) thread, which sleeps until each is due.
+      '''
+      if self._thread is not None:
+         return
+      self._stopped.clear()
+      self._thread = threading.Thread(target=self._run, name="finndex-refresh", daemon=True)
+      self._thread.start()
+
+   def stop(self, timeout = None):
+      '''
+      ' Stops the background thread once its current refresh (if any) finishes.
+      '
+      ' timeout (float): the maximum number of seconds to wait for the thread, or None to wait indefinitely
+      '''
+      self._stopped.set()
+      if self._thread is not None:
+         self._thread.join(timeout)
+         self._thread = None
+
+   def _run(self):
+      while not self._stopped.is_set():
+         self.run_pending()
+         next_due = self.get_next_due()
+         self._stopped.wait(None if next_due is None else max(next_due - self.clock(), 0))
+
+   def _refresh(self, source):
+      # refreshes a source, returning the number of seconds until it is next due
+      start = time.perf_counter()
+      try:
+         hint = source.refresh()
+      except Exception as exception:
+         self.errors[source.name] = exception
+         result, delay = "failure", min(source.interval, RETRY_INTERVAL)
+      else:
+         self.errors.pop(source.name, None)
+         result, delay = "success", source.interval if hint is None else hint
+      instrumentation.REGISTRY.observe(instrumentation.REFRESH_SECONDS, time.perf_counter() - start,
+                                       source=source.name, result=result)
+
+      return max(delay, MIN_DELAY) + self._random.uniform(0, source.jitter)
+
+def get_fear_and_greed_source():
+   '''
+   ' Builds the source refreshing the Fear and Greed history, which is next refreshed at the update hinted by the API.
+   '''
+   def refresh():
+      store = fearandgreed.FEAR_AND_GREED_STORE
+      store.refresh()
+      return store.get_time_until_update()
+
+   return RefreshSource(FEAR_AND_GREED_SOURCE, refresh, fearandgreed.DEFAULT_TIME_UNTIL_UPDATE,
+                        DEFAULT_JITTERS[FEAR_AND_GREED_SOURCE], DEFAULT_BUDGETS[FEAR_AND_GREED_SOURCE])
+
+def get_coinmetrics_source(currencies_list, metrics_list):
+   '''
+   ' Builds the source refreshing the cached CoinMetrics series of every metric (and the price) of several currencies,
+   ' with all of a currency's metrics downloaded in one call. The series are refreshed once the cache considers them stale.
+   '
+   ' currencies_list (list<Cryptocurrencies>): the currencies whose series are refreshed
+   ' metrics_list (list<HistoricalMetricType>): the metrics whose series are refreshed; those not read from CoinMetrics
+   '                                            are ignored
+   '''
+   codes = [code for metric in metrics_list for code in (queryplan.get_coinmetrics_codes(metric.value) or [])]
+   codes = list(dict.fromkeys(codes + [coinmetrics.CoinMetricsData.PRICE_USD.value]))
+
+   def refresh():
+      # each currency is refreshed concurrently, bounded by the CoinMetrics upstream limit
+      poolutil.map_concurrent(
+         lambda currency: coinmetrics.COIN_METRICS_CACHE.get_series(currency.value.ticker.lower(), codes), currencies_list)
+
+   return RefreshSource(COIN_METRICS_SOURCE, refresh, coinmetrics.COIN_METRICS_CACHE.refresh_interval.total_seconds(),
+                        DEFAULT_JITTERS[COIN_METRICS_SOURCE], DEFAULT_BUDGETS[COIN_METRICS_SOURCE])
+
+def get_trends_source(currencies_list, clock = time.time):
+   '''
+   ' Builds the source refreshing the recent hourly Trends values of several currencies, which is refreshed once the
+   ' latest chunk would be refetched.
+   '
+   ' currencies_list (list<Cryptocurrencies>): the currencies whose values are refreshed
+   ' clock (function): returns the current time in seconds since the epoch
+   '''
+   def refresh():
+      end_date = datetime.datetime.fromtimestamp(clock(), datetime.timezone.utc).replace(tzinfo=None)
+      poolutil.map_concurrent(
+         lambda currency: trends.TRENDS_CACHE.get_hourly(currency.value.name, end_date - TRENDS_WINDOW, end_date),
+         currencies_list)
+
+   return RefreshSource(TRENDS_SOURCE, refresh, trendscache.PARTIAL_REFRESH_INTERVAL.total_seconds(),
+                        DEFAULT_JITTERS[TRENDS_SOURCE], DEFAULT_BUDGETS[TRENDS_SOURCE])
+
+def get_precompute_source(currencies_list, metrics_list, weights, windows, result_cache, compute):
+   '''
+   ' Builds the source precomputing the batch result of each currency over each date range, stored under the same key
+   ' as the equivalent API request. A result for past dates is recomputed only once it has expired; one which includes
+   ' the current day is recomputed on every refresh, before it expires.
+   '
+   ' currencies_list (list<Cryptocurrencies>): the currencies whose results are precomputed, each alone
+   ' metrics_list (list<HistoricalMetricType>): the metrics of every result
+   ' weights (list<float>): the weight of each metric, or None for equal weighting
+   ' windows (list<tuple>): the date ranges, each as the days before the current day on which it starts and ends
+   ' result_cache (ResultCache): the cache in which the results are stored
+   ' compute (function): computes a batch result, called as compute(coins, metrics, weights, start_date, end_date)
+   '''
+   metrics_strlist = [metric.name for metric in metrics_list]
+
+   def refresh():
+      now = result_cache.clock()
+      today = datetime.date.fromtimestamp(now)
+      for currency in currencies_list:
+         coins_strlist = [currency.value.ticker]
+         for start_days, end_days in windows:
+            start_date = pd.Timestamp(today - datetime.timedelta(days=start_days))
+            end_date = pd.Timestamp(today - datetime.timedelta(days=end_days))
+
+            key = resultcache.normalize_key('batch', coins_strlist, metrics_strlist, weights, start_date, end_date)
+            compute_result = lambda: compute(coins_strlist, metrics_strlist, weights, start_date, end_date)
+            if resultcache.is_historical(end_date, now):
+               result_cache.get_or_compute(key, end_date, compute_result)
+            else:
+               result_cache.put(key, end_date, compute_result())
+
+   return RefreshSource(PRECOMPUTE_SOURCE, refresh, resultcache.CURRENT_TIME_TO_LIVE / 2,
+                        DEFAULT_JITTERS[PRECOMPUTE_SOURCE], DEFAULT_BUDGETS[PRECOMPUTE_SOURCE])
+
+def build_scheduler(currencies_list = DEFAULT_CURRENCIES, metrics_list = DEFAULT_METRICS, weights = None,
+                    windows = DEFAULT_WINDOWS, result_cache = None, compute = None, clock = time.time, seed = None):
+   '''
+   ' Builds a scheduler refreshing each source read by a set of metrics for a set of currencies and, if a result cache is
+   ' given, then precomputing their batch results.
+   '
+   ' currencies_list (list<Cryptocurrencies>): the currencies whose data is refreshed
+   ' metrics_list (list<HistoricalMetricType>): the metrics whose sources are refreshed
+   ' weights (list<float>): the weight of each metric in the precomputed results, or None for equal weighting
+   ' windows (list<tuple>): the date ranges of the precomputed results (see get_precompute_source)
+   ' result_cache (ResultCache): the cache in which results are precomputed, or None to precompute nothing
+   ' compute (function): computes a batch result (see get_precompute_source)
+   ' clock (function): returns the current time in seconds since the epoch
+   ' seed (int): the seed of the random number generator drawing each jitter, for repeatable schedules
+   '''
+   sources = []
+   if HistoricalMetricType.FEAR_AND_GREED in metrics_list:
+      sources += [get_fear_and_greed_source()]
+   sources += [get_coinmetrics_source(currencies_list, metrics_list)]
+   if HistoricalMetricType.TRENDS in metrics_list:
+      sources += [get_trends_source(currencies_list, clock)]
+   if result_cache is not None:
+      sources += [get_precompute_source(currencies_list, metrics_list, weights, windows, result_cache, compute)]
+
+   return RefreshScheduler(sources, clock, seed)
@@ -6,7 +6,9 @@ import datetime
 import json
 from enum import Enum
 
-from finndex.util import cryptocurrencies, dateutil, mathutil, webutil
+from finndex.fundamental import coinmetricscache
+from finndex.util import cryptocurrencies, dateutil, instrumentation, mathutil, poolutil, webutil
+import numpy as np
 import pandas as pd
 
 __author__ = "Finn Frankis"
@@ -14,9 +16,12 @@ __copyright__ = "Copyright 2019, Crypticko"
 
 COIN_METRICS_API_PREFIX = "https://community-api.coinmetrics.io/v2/"
 NETWORK_METRIC_SUFFIX = "assets/{}/metricdata?metrics="
+START_DATE_SUFFIX = "&start={}"
 
 COIN_METRICS_TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%S.%fZ"
 
+COIN_METRICS_FLIGHTS = poolutil.SingleFlight("coinmetrics") # downloads in progress, keyed by asset, codes, and start
+
 # Represents an enum containing several possible keywords which can be used with the CoinMetrics API.
 class CoinMetricsData(Enum):
     BLOCK_COUNT = "BlkCnt"
@@ -34,7 +39,119 @@ def normalize_col(col):
    '''
    return col / (col.loc[col.idxmax()])
    
-def get_coinmetrics_dates(metrics_list, start_date, end_date, currencies_list, normalize = True, normalize_all_time = True):
+def fetch_metrics_frame(asset, metric_codes, start_date = None):
+   '''
+   ' Downloads a set of metrics for a single asset from the CoinMetrics API. Returns a data frame indexed by date
+   ' (floored to the day) with one float column per retrieved metric.
+   '
+   ' asset (str): the lowercase CoinMetrics asset identifier (ex.: btc)
+   ' metric_codes (list<str>): the CoinMetrics codes of the metrics to be retrieved (ex.: PriceUSD)
+   ' start_date (datetime): the first date to be retrieved, or None to retrieve the full history
+   '
+   ' Concurrent calls for the same request share a single download, so the returned frame must not be modified.
+   '''
+   desired_metrics = COIN_METRICS_API_PREFIX + NETWORK_METRIC_SUFFIX.format(asset) + ",".join(metric_codes)
+   if start_date is not None:
+      desired_metrics += START_DATE_SUFFIX.format(start_date.strftime(dateutil.DESIRED_DATE_FORMAT))
+
+   def fetch():
+      with poolutil.limit_upstream(poolutil.COIN_METRICS_UPSTREAM):
+         page_content = webutil.getPageContent(desired_metrics)
+
+      with instrumentation.time_block(instrumentation.PARSE_SECONDS, source="coinmetrics"):
+         return decode_metric_data(json.loads(page_content)['metricData'])
+
+   # concurrent requests for the same metrics (in any order) share one download; callers select columns by code
+   start_day = None if start_date is None else start_date.strftime(dateutil.DESIRED_DATE_FORMAT)
+   return COIN_METRICS_FLIGHTS.do((asset, tuple(sorted(set(metric_codes))), start_day), fetch)
+
+def decode_metric_data(metric_data):
+   '''
+   ' Decodes the 'metricData' portion of a CoinMetrics API response into a data frame indexed by date (floored to the day)
+   ' with one float column per retrieved metric. The 'series' list is converted directly into typed NumPy arrays in
+   ' a single pass; missing (None) values become NaN.
+   '
+   ' metric_data (dict): a dictionary containing a key 'metrics' pointing to the list of retrieved metric codes and a key
+   '                     'series' pointing to a list of dictionaries, each with a timestamp ('time') and a list of
+   '                     string values ('values') ordered in the same fashion as 'metrics'
+   '''
+   metrics_list_retrieved = metric_data['metrics']
+   series = metric_data['series']
+
+   if series:
+      times, values = zip(*[(entry['time'][:10], entry['values']) for entry in series]) # trim timestamps to the day
+   else:
+      times, values = (), ()
+
+   dates = np.array(times, dtype='datetime64[D]').astype('datetime64[ns]')
+   values = np.array(values, dtype='float').reshape(len(series), len(metrics_list_retrieved))
+
+   return pd.DataFrame(values, index = pd.DatetimeIndex(dates, name = 'date'), columns = metrics_list_retrieved)
+
+COIN_METRICS_CACHE = coinmetricscache.CoinMetricsCache(fetch_metrics_frame)
+
+def get_interpolation_bounds(series, start_date, end_date):
+   '''
+   ' Determines the range of dates a series must span for linear interpolation within a window to give the same values
+   ' as interpolation over the whole series: from the last value before the window (if any) to the first value at or
+   ' after its end (if any). Returns a tuple of the first and last dates of that range.
+   '
+   ' series (Series): the series, indexed by date in ascending order
+   ' start_date (datetime): the first date of the window
+   ' end_date (datetime): the date before which the window ends
+   '''
+   values = series.to_numpy()
+   before = series.index.searchsorted(pd.Timestamp(start_date), side='left') - 1
+   after = series.index.searchsorted(pd.Timestamp(end_date), side='left')
+
+   # gaps are short, so stepping over missing values one at a time costs far less than scanning the whole series
+   while before >= 0 and np.isnan(values[before]):
+      before -= 1
+   while after < len(values) and np.isnan(values[after]):
+      after += 1
+
+   first = series.index[before] if before >= 0 else pd.Timestamp(start_date)
+   last = series.index[after] if after < len(values) else pd.Timestamp(end_date)
+   return min(first, pd.Timestamp(start_date)), max(last, pd.Timestamp(end_date))
+
+def get_cached_window(currencies_list, metric_codes, start_date, end_date):
+   '''
+   ' Retrieves a multi-layered data frame of cached values (as get_coinmetrics_dates does, but unnormalized and
+   ' uninterpolated), trimmed to the dates needed to interpolate within a window exactly as over the full history, along
+   ' with the all-time maximum of each column. Returns a tuple of the frame and an array of the maxima.
+   '
+   ' currencies_list (list<Cryptocurrencies>): the list of cryptocurrencies to be retrieved
+   ' metric_codes (list<str>): the CoinMetrics codes of the metrics to be retrieved (ex.: PriceUSD)
+   ' start_date (datetime): the first date of the window
+   ' end_date (datetime): the date before which the window ends
+   '''
+   # currencies are retrieved concurrently, bounded by the CoinMetrics upstream limit
+   retrieved = poolutil.map_concurrent(
+                  lambda currency: COIN_METRICS_CACHE.get_series(currency.value.ticker.lower(), metric_codes), currencies_list)
+   columns = [(series[code], statistics[code]) for series, statistics in retrieved for code in metric_codes]
+
+   # every column is trimmed to the same range, so that the combined frame holds exactly the dates the full one would
+   bounds = [get_interpolation_bounds(column_series, start_date, end_date) for column_series, statistics in columns]
+   first, last = min(bound[0] for bound in bounds), max(bound[1] for bound in bounds)
+
+   trimmed = []
+   for column_series, statistics in columns:
+      start = column_series.index.searchsorted(first, side='left')
+      stop = column_series.index.searchsorted(last, side='right')
+      trimmed += [(column_series.index.to_numpy()[start:stop], column_series.to_numpy()[start:stop])]
+
+   dates = np.unique(np.concatenate([column_dates for column_dates, column_values in trimmed]))
+   values = np.full((len(dates), len(trimmed)), np.nan)
+   for position, (column_dates, column_values) in enumerate(trimmed):
+      values[np.searchsorted(dates, column_dates), position] = column_values
+
+   frame = pd.DataFrame(values, index = pd.DatetimeIndex(dates, name = 'date'),
+                        columns = pd.MultiIndex.from_product([currencies_list, metric_codes]))
+   return frame, np.array([statistics.maximum for column_series, statistics in columns])
+
+@instrumentation.timed(instrumentation.SOURCE_SECONDS, source="coinmetrics")
+def get_coinmetrics_dates(metrics_list, start_date, end_date, currencies_list, normalize = True, normalize_all_time = True,
+                          use_cache = True):
    '''
    ' Retrieves a multi-layered data frame containing a list of metrics corresponding to a list of cryptocurrencies.
    ' The outer columns of the frame represent the cryptocurrencies, and the inner columns represent the retrieved metrics.
@@ -43,38 +160,29 @@ def get_coinmetrics_dates(metrics_list, start_date, end_date, currencies_list, n
    ' start_date (datetime) - the start date, with month, day, and year provided
    ' end_date (datetime) - the end date, with month, day, and year provided
    ' currencies_list (list<Cryptocurrencies>): the list of cryptocurrencies to be retrieved
+   ' use_cache (bool): whether to read from the on-disk cache (downloading only the days not yet cached) rather than
+   '                   downloading the full history; with the cache, only the requested window (plus the values
+   '                   needed to interpolate at its edges) is processed, and all-time maxima come from the cache
    '''
-   col_index = pd.MultiIndex.from_product([currencies_list, [metric.value for metric in metrics_list]])
-   return_frame = pd.DataFrame(columns = col_index)
-   
-   for currency in currencies_list:
-     desired_metrics = COIN_METRICS_API_PREFIX + NETWORK_METRIC_SUFFIX.format(currency.value.ticker.lower())
-     for keyword in metrics_list:
-         desired_metrics += keyword.value + ","
-     desired_metrics = desired_metrics[:-1] # remove final comma
-      
-     page_content = json.loads(webutil.getPageContent(desired_metrics))['metricData']
-     metrics_list_retrieved = page_content['metrics']
-   
-     metrics_frame = pd.DataFrame(page_content['series'])
-     # retrieved API data contains "values" column with list of values, so explode into individual columns
-     metrics_frame = pd.concat([metrics_frame.drop('values',axis=1), metrics_frame['values'].apply(pd.Series)],axis=1)
-     # individual exploded columns are named with sequential natural numbers, so rename with corresponding metric
-     metrics_frame = metrics_frame.rename({i:metric for (i, metric) in enumerate(metrics_list_retrieved)}, axis=1)
-     metrics_frame = metrics_frame.rename({'time':'date'}, axis=1)
-     metrics_frame.index = pd.to_datetime(metrics_frame['date'])
-     metrics_frame.index = metrics_frame.index.tz_localize(None)
-     metrics_frame.index = metrics_frame.index.floor('d')
-   
-     for metric in metrics_list_retrieved:
-        metrics_frame[metric] = metrics_frame.apply(lambda row: float(row[metric]) if row[metric] != None else None, axis=1)
-        return_frame[currency, metric] = metrics_frame[metric]
+   metric_codes = [metric.value for metric in metrics_list]
+   col_index = pd.MultiIndex.from_product([currencies_list, metric_codes])
+
+   if use_cache:
+      return_frame, maxima = get_cached_window(currencies_list, metric_codes, start_date, end_date)
+   else:
+      # currencies are retrieved concurrently, bounded by the CoinMetrics upstream limit
+      currency_frames = poolutil.map_concurrent(
+                           lambda currency: fetch_metrics_frame(currency.value.ticker.lower(), metric_codes), currencies_list)
+      return_frame = pd.concat(currency_frames, axis=1, keys=currencies_list).reindex(columns = col_index)
 
    return_frame = return_frame.astype('float')
 
-   # linearly normalize data between 0-1 based on maximum in non-date-filtered frame
+   # linearly normalize data between 0-1 based on maximum in non-date-filtered frame (which the cache stores)
    if normalize and normalize_all_time:
-      return_frame = return_frame.apply(normalize_col)
+      if use_cache:
+         return_frame = return_frame / maxima
+      else:
+         return_frame = return_frame.apply(normalize_col)
 
    # fill in missing entries, filter by date
    return_frame = return_frame.interpolate().loc[(return_frame.index >= start_date) & (return_frame.index < end_date)]
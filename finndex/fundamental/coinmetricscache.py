@@ -0,0 +1,205 @@
+'''
+Maintains a persistent, incrementally-updated on-disk cache of CoinMetrics series. Each (asset, metric) series is stored
+in its own file; on a refresh, only the days after the last cached timestamp are requested from the API and merged in.
+The all-time maximum of each series is stored alongside it and updated with each refresh, so that values can be
+normalized against the whole history without reading it.
+'''
+
+import contextlib
+import datetime
+import io
+import json
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+from finndex.util import cacheutil, instrumentation
+
+__author__ = "Finn Frankis"
+__copyright__ = "Copyright 2020, Crypticko"
+
+CACHE_SUBDIRECTORY = "coinmetrics"
+DEFAULT_REFRESH_INTERVAL = datetime.timedelta(hours=1) # CoinMetrics publishes daily data, so refresh at most hourly
+
+class SeriesStatistics:
+   '''
+   ' The all-time maximum of a series, which is NaN if the series has no values.
+   '''
+   def __init__(self, maximum):
+      self.maximum = maximum
+
+   @classmethod
+   def from_series(cls, series):
+      '''
+      ' Computes the statistics of a series.
+      '
+      ' series (Series): the series whose maximum is found
+      '''
+      return cls(float(series.max()))
+
+   def combine(self, other):
+      '''
+      ' Computes the statistics of the union of the series described by this object and another.
+      '
+      ' other (SeriesStatistics): the statistics of the other series
+      '''
+      return SeriesStatistics(float(np.fmax(self.maximum, other.maximum)))
+
+   def to_dict(self):
+      return {'maximum': None if np.isnan(self.maximum) else self.maximum}
+
+   @classmethod
+   def from_dict(cls, statistics):
+      return cls(np.nan if statistics['maximum'] is None else float(statistics['maximum']))
+
+class CoinMetricsCache:
+   '''
+   ' Stores daily CoinMetrics series on disk, one file per (asset, metric), and keeps the most recently read series
+   ' in memory so that repeated lookups of an unchanged series require neither a download nor a re-parse.
+   '''
+   def __init__(self, fetch, directory = None, refresh_interval = DEFAULT_REFRESH_INTERVAL):
+      '''
+      ' Creates a new cache.
+      '
+      ' fetch (function): retrieves a data frame indexed by date with one float column per metric; called as
+      '                   fetch(asset, metric_codes, start_date), where start_date is None for the full history
+      ' directory (str): the directory in which series are stored; defaults to the "coinmetrics" cache directory
+      ' refresh_interval (timedelta): the age after which a stored series is checked for new days
+      '''
+      self.fetch = fetch
+      self.directory = directory
+      self.refresh_interval = refresh_interval
+
+      self._memory = {} # (asset, metric) -> (modification time, series, statistics)
+      self._series_locks = {} # each series is updated by at most one thread at a time; distinct series proceed in parallel
+      self._lock = threading.Lock()
+
+   def get_metrics(self, asset, metric_codes):
+      '''
+      ' Retrieves a data frame indexed by date with one float column per metric for a given asset, first downloading
+      ' any days not yet in the cache.
+      '
+      ' asset (str): the lowercase CoinMetrics asset identifier (ex.: btc)
+      ' metric_codes (list<str>): the CoinMetrics codes of the metrics to be retrieved (ex.: PriceUSD)
+      '''
+      series, statistics = self.get_series(asset, metric_codes)
+
+      frame = pd.concat([series[code].rename(code) for code in metric_codes], axis=1)
+      frame.index.name = 'date'
+      return frame
+
+   def get_series(self, asset, metric_codes):
+      '''
+      ' Retrieves the full series of each metric of a given asset along with its all-time statistics, first downloading
+      ' any days not yet in the cache. Returns a tuple of two dictionaries keyed by metric code: one of series (indexed
+      ' by date) and one of SeriesStatistics. The series are shared with the cache and must not be modified.
+      '
+      ' asset (str): the lowercase CoinMetrics asset identifier (ex.: btc)
+      ' metric_codes (list<str>): the CoinMetrics codes of the metrics to be retrieved (ex.: PriceUSD)
+      '''
+      with contextlib.ExitStack() as stack:
+         # locks are always acquired in sorted order so that overlapping requests cannot deadlock
+         for code in sorted(set(metric_codes)):
+            stack.enter_context(self._get_series_lock(asset, code))
+
+         loaded = {code: self._load(asset, code) for code in metric_codes}
+         series = {code: loaded[code][0] for code in metric_codes}
+         statistics = {code: loaded[code][1] for code in metric_codes}
+
+         stale_codes = [code for code in metric_codes if self._is_stale(asset, code)]
+         instrumentation.record_cache("coinmetrics", True, len(metric_codes) - len(stale_codes))
+         instrumentation.record_cache("coinmetrics", False, len(stale_codes))
+         if stale_codes:
+            self._update(asset, stale_codes, series, statistics)
+
+      return series, statistics
+
+   def clear(self):
+      '''
+      ' Removes all series held in memory; the files on disk are left in place.
+      '''
+      with self._lock:
+         self._memory.clear()
+
+   def _get_series_lock(self, asset, code):
+      with self._lock:
+         if (asset, code) not in self._series_locks:
+            self._series_locks[(asset, code)] = threading.Lock()
+         return self._series_locks[(asset, code)]
+
+   def _update(self, asset, stale_codes, series, statistics):
+      # resume from the earliest last-cached day (inclusive, since the final day may have been revised);
+      # a series which has never been stored requires the full history
+      last_dates = [series[code].index.max() for code in stale_codes]
+      if any(series[code].empty for code in stale_codes):
+         start_date = None
+      else:
+         start_date = min(last_dates)
+
+      fresh = self.fetch(asset, stale_codes, start_date)
+
+      for code in stale_codes:
+         if code in fresh.columns and not fresh.empty:
+            fresh_series = fresh[code].astype('float')
+            retained = series[code].loc[series[code].index < fresh_series.index.min()]
+            replaced = series[code].loc[series[code].index >= fresh_series.index.min()]
+
+            # the retained days keep the stored maximum unless it lay among the replaced (re-downloaded) days
+            retained_statistics = statistics[code]
+            if replaced.max() >= retained_statistics.maximum:
+               retained_statistics = SeriesStatistics.from_series(retained)
+
+            series[code] = pd.concat([retained, fresh_series]).sort_index()
+            statistics[code] = retained_statistics.combine(SeriesStatistics.from_series(fresh_series))
+         self._save(asset, code, series[code], statistics[code])
+
+   def _get_path(self, asset, code, extension = "csv"):
+      directory = self.directory
+      if directory is None:
+         directory = cacheutil.get_cache_directory(CACHE_SUBDIRECTORY, asset)
+      else:
+         directory = os.path.join(directory, asset)
+         os.makedirs(directory, exist_ok=True)
+      return os.path.join(directory, "{}.{}".format(code, extension))
+
+   def _is_stale(self, asset, code):
+      path = self._get_path(asset, code)
+      if not os.path.exists(path):
+         return True
+      modified = datetime.datetime.fromtimestamp(os.path.getmtime(path))
+      return datetime.datetime.now() - modified >= self.refresh_interval
+
+   def _load(self, asset, code):
+      path = self._get_path(asset, code)
+      if not os.path.exists(path):
+         return pd.Series(dtype='float', index=pd.DatetimeIndex([], name='date')), SeriesStatistics(np.nan)
+
+      modified = os.path.getmtime(path)
+      cached = self._memory.get((asset, code))
+      if cached is not None and cached[0] == modified:
+         return cached[1], cached[2]
+
+      series = pd.read_csv(path, index_col='date', parse_dates=['date'])['value'].astype('float')
+
+      # the statistics are written after the series, so they describe it only if they are at least as new
+      statistics_path = self._get_path(asset, code, "json")
+      if os.path.exists(statistics_path) and os.path.getmtime(statistics_path) >= modified:
+         with open(statistics_path) as statistics_file:
+            statistics = SeriesStatistics.from_dict(json.load(statistics_file))
+      else:
+         statistics = SeriesStatistics.from_series(series)
+
+      self._memory[(asset, code)] = (modified, series, statistics)
+      return series, statistics
+
+   def _save(self, asset, code, series, statistics):
+      path = self._get_path(asset, code)
+
+      buffer = io.StringIO()
+      series.rename('value').to_frame().to_csv(buffer, index_label='date', date_format='%Y-%m-%d')
+      cacheutil.atomic_write(path, buffer.getvalue())
+      cacheutil.atomic_write(self._get_path(asset, code, "json"), json.dumps(statistics.to_dict()))
+
+      self._memory[(asset, code)] = (os.path.getmtime(path), series, statistics)
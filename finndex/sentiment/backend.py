@@ -0,0 +1,34 @@
+'''
+Defines the interface shared by every sentiment backend (ex.: the Stanford NLP server or the built-in lexicon scorer), each
+of which scores texts in a range from 0 (Extremely Negative) to 4 (Extremely Positive).
+'''
+
+import numpy as np
+
+__author__ = "Finn Frankis"
+__copyright__ = "Copyright 2020, Crypticko"
+
+MIN_SENTIMENT = 0
+MAX_SENTIMENT = 4
+NEUTRAL_SENTIMENT = 2
+
+class SentimentBackend:
+   '''
+   ' A means of scoring the sentiment of texts. Subclasses implement score_sentences; score_texts averages its result.
+   '''
+   def score_sentences(self, texts):
+      '''
+      ' Determines the sentiment of each sentence of each text. Returns a list containing, for each text, the list of
+      ' its sentence sentiments, each from 0 (Extremely Negative) to 4 (Extremely Positive).
+      '
+      ' texts (list<str>): the texts to be analyzed
+      '''
+      raise NotImplementedError
+
+   def score_texts(self, texts):
+      '''
+      ' Determines the average (sentence-wise) sentiment of each text. A text without any sentences scores NaN.
+      '
+      ' texts (list<str>): the texts to be analyzed
+      '''
+      return [np.average(sentiments) if len(sentiments) > 0 else np.nan for sentiments in self.score_sentences(texts)]
@@ -4,9 +4,13 @@ Extracts data from the Fear and Greed API and displays it instantaneously and pr
 
 import datetime
 import json
+import threading
+import time
+
+import numpy as np
 import pandas as pd
 
-from finndex.util import cryptocurrencies, dateutil, mathutil, webutil
+from finndex.util import cryptocurrencies, dateutil, instrumentation, mathutil, poolutil, webutil
 
 __author__ = "Finn Frankis"
 __copyright__ = "Copyright 2019, Crypticko"
@@ -16,43 +20,163 @@ FEAR_AND_GREED_ADDRESS = "https://api.alternative.me/fng/?limit=0&date_format=us
 MIN_FEAR_AND_GREED = 0
 MAX_FEAR_AND_GREED = 100
 
+FEAR_AND_GREED_TIMESTAMP_FORMAT = "%m-%d-%Y"
+DEFAULT_TIME_UNTIL_UPDATE = 60 * 60 # seconds to retain the series when the API provides no 'time_until_update' hint
+MIN_TIME_UNTIL_UPDATE = 60 # seconds to retain the series at minimum, even if an update is already due
+
+FEAR_AND_GREED_FLIGHTS = poolutil.SingleFlight("fearandgreed") # downloads in progress, keyed by address
+
+def download_fg_data():
+    '''
+    ' Downloads and decodes the entire Fear and Greed history (see decode_fg_data).
+    '''
+    with poolutil.limit_upstream(poolutil.FEAR_AND_GREED_UPSTREAM):
+        page_content = webutil.getPageContent(FEAR_AND_GREED_ADDRESS)
+
+    with instrumentation.time_block(instrumentation.PARSE_SECONDS, source="fearandgreed"):
+        return decode_fg_data(json.loads(page_content)["data"])
+
+def decode_fg_data(data):
+    '''
+    ' Decodes a list of readings in the Fear and Greed API's format. Returns a tuple of the dates (as datetime64[ns],
+    ' ascending), the corresponding values mapped into a range from 0-1, and the number of seconds until the API's next
+    ' scheduled update.
+    '
+    ' data (list<dict>): the readings, each with a 'timestamp' (formatted as month-day-year), a 'value' from 0-100,
+    '                    and optionally a 'time_until_update' in seconds
+    '''
+    dates = np.array([datetime.datetime.strptime(reading["timestamp"], FEAR_AND_GREED_TIMESTAMP_FORMAT) 
+                        for reading in data], dtype='datetime64[ns]')
+    values = mathutil.map(np.array([int(reading["value"]) for reading in data], dtype='float'), 
+                          MIN_FEAR_AND_GREED, MAX_FEAR_AND_GREED, 0, 1)
+
+    order = np.argsort(dates, kind='stable')
+    dates, values = dates[order], values[order]
+
+    time_until_update = DEFAULT_TIME_UNTIL_UPDATE
+    hints = [reading["time_until_update"] for reading in data if reading.get("time_until_update") is not None]
+    if hints:
+        time_until_update = max(int(hints[0]), MIN_TIME_UNTIL_UPDATE)
+
+    return dates, values, time_until_update
+
+class FearAndGreedStore:
+    '''
+    ' Holds the entire Fear and Greed history in memory as a sorted, date-indexed array, answering point and range
+    ' lookups by binary search. The history is downloaded once and retained until the API's next scheduled update, as
+    ' given by the 'time_until_update' field of the latest reading.
+    '''
+    def __init__(self, clock = time.time):
+        '''
+        ' Creates a new, empty store.
+        '
+        ' clock (function): returns the current time in seconds since the epoch
+        '''
+        self.clock = clock
+
+        self._series = None # (dates, values), both ascending by date
+        self._expiry = None
+        self._lock = threading.Lock()
+
+    def get_series(self):
+        '''
+        ' Retrieves a pair of arrays containing every available date (as datetime64[ns], ascending) and the corresponding
+        ' Fear and Greed values mapped into a range from 0-1, first downloading the history if it has expired.
+        '''
+        series = self._series
+        if series is not None and self.clock() < self._expiry:
+            instrumentation.record_cache("fearandgreed", True)
+            return series
+
+        with self._lock:
+            refreshed = self._series is None or self.clock() >= self._expiry
+            if refreshed:
+                self.refresh()
+            instrumentation.record_cache("fearandgreed", not refreshed)
+            return self._series
+
+    def refresh(self):
+        '''
+        ' Downloads the entire Fear and Greed history, replacing any values already held. A download already in progress
+        ' (ex.: by another store) is shared rather than repeated.
+        '''
+        self.hold(*FEAR_AND_GREED_FLIGHTS.do(FEAR_AND_GREED_ADDRESS, download_fg_data))
+
+    def get_time_until_update(self):
+        '''
+        ' Determines the number of seconds until the values held expire at the API's next scheduled update, or None if
+        ' nothing has been downloaded.
+        '''
+        if self._expiry is None:
+            return None
+        return max(self._expiry - self.clock(), 0)
+
+    def load(self, data):
+        '''
+        ' Replaces the values held with those of a list of readings in the Fear and Greed API's format.
+        '
+        ' data (list<dict>): the readings, each with a 'timestamp' (formatted as month-day-year), a 'value' from 0-100,
+        '                    and optionally a 'time_until_update' in seconds
+        '''
+        self.hold(*decode_fg_data(data))
+
+    def hold(self, dates, values, time_until_update):
+        '''
+        ' Replaces the values held with decoded ones (see decode_fg_data), retaining them for a given number of seconds.
+        '''
+        self._expiry = self.clock() + time_until_update
+        self._series = (dates, values)
+
+    def get_value(self, date):
+        '''
+        ' Retrieves the Fear and Greed value (from 0-1) on a given date, raising a KeyError if none is available.
+        '
+        ' date (datetime or date): the date of the desired value; any time component is ignored
+        '''
+        dates, values = self.get_series()
+        target = np.datetime64(datetime.date(date.year, date.month, date.day), 'ns')
+
+        position = np.searchsorted(dates, target)
+        if position == len(dates) or dates[position] != target:
+            raise KeyError(date)
+        return values[position]
+
+    def get_range(self, start_date, end_date):
+        '''
+        ' Retrieves the dates and Fear and Greed values (from 0-1) between two dates, including the start date and
+        ' excluding the end date.
+        '
+        ' start_date (datetime) - the start date, with month, day, and year provided
+        ' end_date (datetime) - the end date, with month, day, and year provided
+        '''
+        dates, values = self.get_series()
+        start = np.searchsorted(dates, np.datetime64(pd.Timestamp(start_date).to_datetime64(), 'ns'), side='left')
+        end = np.searchsorted(dates, np.datetime64(pd.Timestamp(end_date).to_datetime64(), 'ns'), side='left')
+        return dates[start:end], values[start:end]
+
+FEAR_AND_GREED_STORE = FearAndGreedStore()
+
 # Uses the Fear and Greed API to extract the Fear and Greed value from any given date.
 def getFearAndGreed(date):
-    timestampFormatted = date.strftime(dateutil.DESIRED_DATE_FORMAT) 
-    
-    return getAllFearAndGreed()[timestampFormatted]
+    return FEAR_AND_GREED_STORE.get_value(date)
    
 '''
 Uses the Fear and Greed API to extract all Fear and Greed values available as a range from 0-1. Returns a dictionary with key as date
 and value the Fear and Greed value on that date.
 '''
 def getAllFearAndGreed():
-    fearAndGreedVals = webutil.getPageContent(FEAR_AND_GREED_ADDRESS)
-    jsonUnpacked = json.loads(fearAndGreedVals)
-    dataArr = jsonUnpacked['data']
-    dataDict = {}
-    for singleDay in dataArr:
-        timestampFormatted = dateutil.convertTimestamp(singleDay['timestamp'], '%m-%d-%Y', dateutil.DESIRED_DATE_FORMAT)
-        dataDict[timestampFormatted] = mathutil.map(int(singleDay['value']), MIN_FEAR_AND_GREED, MAX_FEAR_AND_GREED, 0, 1)
-        
-    return dataDict
+    dates, values = FEAR_AND_GREED_STORE.get_series()
+    return dict(zip(pd.DatetimeIndex(dates).strftime(dateutil.DESIRED_DATE_FORMAT), values))
 
 def get_all_fg():
     '''
     ' Retrieves all Fear and Greed values available; maps the values into a range from 0-1. Returns a pandas 
     ' DataFrame object containing each daily Fear and Greed value associated with its corresponding timestamp.
     '''
-    
-    fg_values = json.loads(webutil.getPageContent(FEAR_AND_GREED_ADDRESS))
-    
-    fg_data_frame = pd.DataFrame(fg_values["data"]).drop(["time_until_update", "value_classification"],axis=1)
-    fg_data_frame["timestamp"] = pd.to_datetime(fg_data_frame["timestamp"])
-    fg_data_frame["value"] = fg_data_frame.apply(lambda row: mathutil.map(int(row['value']), MIN_FEAR_AND_GREED, MAX_FEAR_AND_GREED, 0, 1),axis=1)
-    fg_data_frame.index = fg_data_frame["timestamp"]
-    fg_data_frame.index = fg_data_frame.index.rename("date")
-      
-    return fg_data_frame.drop("timestamp",axis=1)
+    dates, values = FEAR_AND_GREED_STORE.get_series()
+    return pd.DataFrame({"value": values}, index = pd.DatetimeIndex(dates, name = "date"))
 
+@instrumentation.timed(instrumentation.SOURCE_SECONDS, source="fearandgreed")
 def get_fg_dates(start_date, end_date, currencies_list=[cryptocurrencies.Cryptocurrencies.BITCOIN]):
     '''
     ' Retrieves the Fear and Greed values (mapped into a range between 0 and 1) between two dates,
@@ -67,13 +191,9 @@ def get_fg_dates(start_date, end_date, currencies_list=[cryptocurrencies.Cryptoc
     ' end_date (datetime) - the end date, with month, day, and year provided
     ' currencies_list (list) - the list of currencies to associate with the given fear and greed values
     '''
-    fg_data_frame = get_all_fg()
-    fg_date_filtered = fg_data_frame.loc[(fg_data_frame.index >= start_date) & 
-                                     (fg_data_frame.index < end_date)].copy() 
-    
-    for currency in currencies_list:
-        fg_date_filtered[currency.value] = fg_date_filtered["value"]
-    fg_date_filtered = fg_date_filtered.drop("value",axis=1)
-    fg_date_filtered.columns = pd.MultiIndex.from_product([currencies_list, ["FearGreed"]])
+    dates, values = FEAR_AND_GREED_STORE.get_range(start_date, end_date)
 
-    return fg_date_filtered
\ No newline at end of file
+    # replicate the single column of values under every currency
+    return pd.DataFrame(np.repeat(values[:, np.newaxis], len(currencies_list), axis=1), 
+                        index = pd.DatetimeIndex(dates, name = "date"),
+                        columns = pd.MultiIndex.from_product([currencies_list, ["FearGreed"]]))
\ No newline at end of file
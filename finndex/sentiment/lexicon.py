@@ -0,0 +1,180 @@
+'''
+Scores the sentiment of texts in-process using a word lexicon and a few rules (negation, intensifiers), without the
+Stanford NLP server. All the texts in a batch are tokenized together and scored with vectorized lookups, and the result
+is mapped onto the same 0-4 scale as the Stanford NLP server's.
+'''
+
+import itertools
+import re
+import threading
+
+import numpy as np
+import pandas as pd
+
+from finndex.sentiment import backend
+
+__author__ = "Finn Frankis"
+__copyright__ = "Copyright 2020, Crypticko"
+
+# the valence of each word, from -4 (Extremely Negative) to 4 (Extremely Positive)
+VALENCES = {
+    4: "excellent outstanding superb soar soars soared soaring skyrocket skyrockets skyrocketed skyrocketing euphoria "
+       "euphoric thrilled fantastic phenomenal breakthrough",
+    3: "surge surges surged surging boom booming rally rallies rallied rallying gain gains gained great strong "
+       "stronger strongest bullish profit profits profitable record success successful optimistic optimism "
+       "impressive wonderful win wins winning jump jumps jumped",
+    2: "rise rises rose rising grow grows grew growing growth good better best positive recover recovers recovered "
+       "recovery rebound rebounds rebounded upside beat beats opportunity opportunities confident confidence "
+       "support supports supported adoption innovative innovation secure benefit benefits approve approves approved "
+       "approval upgrade upgraded climb climbs climbed climbing boost boosts boosted",
+    1: "up higher increase increases increased steady stable stabilize stabilized hope hopes hopeful interest "
+       "interested like likes legitimate safe trust trusted partnership launch launches launched",
+    -1: "down lower decrease decreases decreased uncertain uncertainty concern concerns concerned question questions "
+        "volatile volatility risk risks doubt doubts warning warn warns slow slows slowed slowing",
+    -2: "fall falls fell falling drop drops dropped dropping decline declines declined declining loss losses lose "
+        "loses losing lost weak weaker weakness negative bearish sell selloff sold fear fears worried worry worries "
+        "downturn downside fined lawsuit ban bans banned risky problem problems fail fails failed failure "
+        "delay delays delayed pessimistic",
+    -3: "plunge plunges plunged plunging slump slumps slumped tumble tumbles tumbled sink sinks sank tank tanks "
+        "tanked bad worse worst fraud scam scams hack hacks hacked hacker theft stolen panic bubble manipulation "
+        "illegal collapse collapses collapsed",
+    -4: "crash crashes crashed crashing disaster disastrous catastrophe catastrophic bankrupt bankruptcy "
+        "devastating terrible horrible wipeout ponzi",
+}
+
+NEGATORS = ("not no never nor none nobody nothing neither without cannot can't don't doesn't didn't isn't wasn't "
+            "aren't weren't won't wouldn't couldn't shouldn't hasn't haven't hadn't").split()
+
+# the factor by which a word's valence is multiplied when it directly follows each modifier
+MODIFIERS = {1.5: "very extremely incredibly highly hugely massively sharply significantly substantially deeply "
+                  "strongly remarkably",
+             0.5: "slightly somewhat marginally barely mildly modestly partly"}
+
+NEGATION_WINDOW = 3 # the number of preceding words within which a negator reverses a word's valence
+NEGATION_FACTOR = -0.75 # negation weakens as well as reverses ("not great" is less negative than "bad")
+NORMALIZATION_ALPHA = 15 # controls how quickly a sentence's total valence approaches the ends of the scale
+
+SENTENCE_END = "."
+TOKEN_PATTERN = re.compile(r"[a-z]+(?:'[a-z]+)?|\.")
+SENTENCE_END_PATTERN = re.compile(r"[.!?]+|\n\s*\n")
+
+def tokenize(text):
+   '''
+   ' Splits a text into lowercase words, with a SENTENCE_END token at the end of each sentence (a run of periods,
+   ' exclamation points, or question marks, or a blank line).
+   '
+   ' text (str): the text to be split
+   '''
+   return TOKEN_PATTERN.findall(SENTENCE_END_PATTERN.sub(" . ", text.lower().replace("’", "'")))
+
+def normalize_valence(valence):
+   '''
+   ' Maps the total valence of each sentence (unbounded) onto the scale from 0 (Extremely Negative) to 4 (Extremely
+   ' Positive), with a total of 0 mapping onto 2 (Neutral).
+   '
+   ' valence (np.ndarray): the total valence of each sentence
+   '''
+   half_range = (backend.MAX_SENTIMENT - backend.MIN_SENTIMENT) / 2
+   return backend.NEUTRAL_SENTIMENT + half_range * valence / np.sqrt(valence * valence + NORMALIZATION_ALPHA)
+
+class LexiconScorer(backend.SentimentBackend):
+   '''
+   ' Scores texts in-process with a word lexicon, returning values in a range from 0 (Extremely Negative) to 4
+   ' (Extremely Positive). A sentence's score grows with the total valence of its words; each word's valence is reversed
+   ' and weakened if a negator closely precedes it, and scaled if a modifier (ex.: "very") directly precedes it.
+   '''
+   def __init__(self, valences = VALENCES, negators = NEGATORS, modifiers = MODIFIERS):
+      '''
+      ' Creates a new scorer.
+      '
+      ' valences (dict): the words (in a space-separated string) with each valence from -4 to 4
+      ' negators (list<str>): the words which reverse the valence of the words closely following them
+      ' modifiers (dict): the words (in a space-separated string) which scale the valence of the word following them
+      '                   by each factor
+      '''
+      self.valences = valences
+      self.negators = negators
+      self.modifiers = modifiers
+
+      self._tables = None
+      self._tables_lock = threading.Lock()
+
+   def _get_tables(self):
+      # built on first use, so that constructing a scorer costs nothing
+      if self._tables is None:
+         with self._tables_lock:
+            if self._tables is None:
+               entries = {}
+               for valence, words in self.valences.items():
+                  for word in words.split():
+                     entries.setdefault(word, [0.0, False, 1.0])[0] = float(valence)
+               for word in self.negators:
+                  entries.setdefault(word, [0.0, False, 1.0])[1] = True
+               for factor, words in self.modifiers.items():
+                  for word in words.split():
+                     entries.setdefault(word, [0.0, False, 1.0])[2] = factor
+
+               # the final row, selected by the index -1 of a word outside the vocabulary, is neutral
+               vocabulary = pd.Index(list(entries) + [SENTENCE_END])
+               values = np.array(list(entries.values()) + [[0.0, False, 1.0], [0.0, False, 1.0]], dtype=float)
+               self._tables = (vocabulary, values[:, 0], values[:, 1].astype(bool), values[:, 2])
+      return self._tables
+
+   def score_sentences(self, texts):
+      '''
+      ' Determines the sentiment of each sentence of each text. Returns a list containing, for each text, the list of
+      ' its sentence sentiments.
+      '
+      ' texts (list<str>): the texts to be analyzed
+      '''
+      if len(texts) == 0:
+         return []
+
+      sentiments, text_ids = self._score(texts)
+      boundaries = np.searchsorted(text_ids, np.arange(1, len(texts)))
+      return [text_sentiments.tolist() for text_sentiments in np.split(sentiments, boundaries)]
+
+   def score_texts(self, texts):
+      '''
+      ' Determines the average (sentence-wise) sentiment of each text. A text without any sentences scores NaN.
+      '
+      ' texts (list<str>): the texts to be analyzed
+      '''
+      sentiments, text_ids = self._score(texts)
+      counts = np.bincount(text_ids, minlength=len(texts))
+      totals = np.bincount(text_ids, weights=sentiments, minlength=len(texts))
+      return np.where(counts > 0, totals / np.maximum(counts, 1), np.nan).tolist()
+
+   def _score(self, texts):
+      '''
+      ' Scores every sentence of every text, returning the score of each sentence and the index of the text to which
+      ' each sentence belongs (in ascending order).
+      '''
+      vocabulary, valences, negators, modifiers = self._get_tables()
+
+      # every text ends a sentence, so that no sentence spans two texts
+      token_lists = [tokenize(text) + [SENTENCE_END] for text in texts]
+      lengths = np.array([len(tokens) for tokens in token_lists], dtype=int)
+      tokens = np.fromiter(itertools.chain.from_iterable(token_lists), dtype=object, count=lengths.sum())
+      codes = vocabulary.get_indexer(tokens)
+
+      is_end = codes == vocabulary.get_loc(SENTENCE_END)
+      sentence_ids = np.concatenate([[0], np.cumsum(is_end)[:-1]]) if len(tokens) else np.array([], dtype=int)
+      token_text_ids = np.repeat(np.arange(len(texts)), lengths)
+
+      valence = valences[codes]
+      for offset in range(1, NEGATION_WINDOW + 1):
+         negated = np.zeros(len(tokens), dtype=bool)
+         negated[offset:] = negators[codes[:-offset]] & (sentence_ids[offset:] == sentence_ids[:-offset])
+         valence = np.where(negated, valence * NEGATION_FACTOR, valence)
+      modified = np.ones(len(tokens))
+      modified[1:] = np.where(sentence_ids[1:] == sentence_ids[:-1], modifiers[codes[:-1]], 1.0)
+      valence = valence * modified
+
+      # sentences without any words (ex.: from repeated blank lines) are not sentences
+      words = np.bincount(sentence_ids[~is_end], minlength=is_end.sum())
+      totals = np.bincount(sentence_ids, weights=valence, minlength=is_end.sum())
+      sentence_text_ids = token_text_ids[is_end]
+
+      has_words = words > 0
+      return normalize_valence(totals[has_words]), sentence_text_ids[has_words]
@@ -1,12 +1,19 @@
 '''
-Uses Stanford's NLP library to analyze and the sentiment of a block of text and provides functions to stop and start the
-server.
+Analyzes the sentiment of blocks of text using a pluggable backend: Stanford's NLP library (the default), for which
+functions to stop and start the server are provided, or the built-in, in-process lexicon scorer.
 '''
 
 import os
+import socket
+import threading
+import time
+from contextlib import closing
 
 import numpy
-from pycorenlp import StanfordCoreNLP
+import pandas as pd
+
+from finndex.sentiment import backend, lexicon, pipeline
+from finndex.util import webutil
 
 
 __author__ = "Finn Frankis"
@@ -16,9 +23,14 @@ STANFORD_NLP_LOCATION = '~/stanford-corenlp-4.1.0' # the location of the Stanfor
                                                               # (download at https://stanfordnlp.github.io/CoreNLP)
 STANFORD_NLP_TIMEOUT = 100000 # the time after which a given NLP request will be killed if not yet complete
 STANFORD_NLP_PORT = 9002
+STANFORD_NLP_STARTUP_WAIT = 120 # the time (in seconds) to wait for a newly started server to accept connections
+STANFORD_NLP_SERVER_LOCATION = 'http://localhost:{}'.format(STANFORD_NLP_PORT)
+
+NEWS_API_KEY_VARIABLE = "NEWS_API_KEY" # the environment variable containing the NewsAPI key
+SENTIMENT_BACKEND_VARIABLE = "FINNDEX_SENTIMENT_BACKEND" # the environment variable naming the default sentiment backend
 
-MIN_SENTIMENT = 0
-MAX_SENTIMENT = 4
+MIN_SENTIMENT = backend.MIN_SENTIMENT
+MAX_SENTIMENT = backend.MAX_SENTIMENT
 
 DESIRED_ARTICLES = 10
 
@@ -27,24 +39,99 @@ def startServer(timeout, port):
    os.popen('cd {}; java -mx5g -cp "*" edu.stanford.nlp.pipeline.StanfordCoreNLPServer -timeout {} -port {} &>/dev/null'.format(
          STANFORD_NLP_LOCATION, timeout, port)) 
 
+_server_ready = False
+_server_lock = threading.Lock()
+
+def is_server_running(port):
+   '''
+   ' Determines whether a server is accepting connections on a given local port.
+   '
+   ' port (int): the port to be checked
+   '''
+   with closing(socket.socket(socket.AF_INET, socket.SOCK_STREAM)) as connection:
+      connection.settimeout(1)
+      return connection.connect_ex(('localhost', port)) == 0
+
+def ensure_server(timeout = STANFORD_NLP_TIMEOUT, port = STANFORD_NLP_PORT):
+   '''
+   ' Starts the Stanford NLP server, unless one is already accepting connections, and waits until it is ready. Called
+   ' automatically before the first sentiment request, so the server is only launched by callers who need it.
+   '
+   ' timeout (int): the time after which a given NLP request will be killed if not yet complete
+   ' port (int): the port on which the server listens
+   '''
+   global _server_ready
+
+   if _server_ready:
+      return
+
+   with _server_lock:
+      if _server_ready:
+         return
+
+      if not is_server_running(port):
+         startServer(timeout, port)
+
+         deadline = time.time() + STANFORD_NLP_STARTUP_WAIT
+         while not is_server_running(port):
+            if time.time() > deadline:
+               raise RuntimeError("The Stanford NLP server did not start on port {}.".format(port))
+            time.sleep(0.5)
+
+      _server_ready = True
+
+SENTIMENT_PIPELINE = pipeline.CoreNLPPipeline(STANFORD_NLP_SERVER_LOCATION, STANFORD_NLP_TIMEOUT, prepare_server = ensure_server)
+LEXICON_SCORER = lexicon.LexiconScorer()
+
+CORENLP_BACKEND = "corenlp"
+LEXICON_BACKEND = "lexicon"
+SENTIMENT_BACKENDS = {CORENLP_BACKEND: SENTIMENT_PIPELINE,
+                      LEXICON_BACKEND: LEXICON_SCORER}
+
+_sentiment_backend = None
+
+def set_sentiment_backend(sentiment_backend):
+   '''
+   ' Sets the backend used by find_sentiment and find_sentiments.
+   '
+   ' sentiment_backend (str or SentimentBackend): the name of a backend in SENTIMENT_BACKENDS (ex.: "lexicon"), or a
+   '                                           backend object
+   '''
+   global _sentiment_backend
+
+   if not isinstance(sentiment_backend, backend.SentimentBackend):
+      if sentiment_backend not in SENTIMENT_BACKENDS:
+         raise ValueError("Unknown sentiment backend '{}'; expected one of {}.".format(sentiment_backend,
+                          ", ".join(SENTIMENT_BACKENDS)))
+      sentiment_backend = SENTIMENT_BACKENDS[sentiment_backend]
+   _sentiment_backend = sentiment_backend
+
+def get_sentiment_backend():
+   '''
+   ' Retrieves the backend used by find_sentiment and find_sentiments. Unless one has been set, this is the backend named
+   ' by the FINNDEX_SENTIMENT_BACKEND environment variable, or the Stanford NLP server if the variable is not set.
+   '''
+   if _sentiment_backend is None:
+      set_sentiment_backend(os.environ.get(SENTIMENT_BACKEND_VARIABLE, CORENLP_BACKEND))
+   return _sentiment_backend
+
 def find_sentiment(text):
    '''
-   ' Uses the Stanford NLP library to determine the average sentiment (sentence-wise) of a given block of text in a range from
-   ' 0 (Extremely Negative) to 4 (Extremely Positive). 
+   ' Determines the average sentiment (sentence-wise) of a given block of text in a range from 0 (Extremely Negative) to
+   ' 4 (Extremely Positive), using the current sentiment backend.
    '
    ' text (str): the block of text to be analyzed
    '''
-   NLP_SERVER_LOCATION = 'http://localhost:{}'.format(STANFORD_NLP_PORT)
-   PROPERTIES_DICTIONARY = {'annotators': 'sentiment', 'outputFormat': 'json', 'timeout': STANFORD_NLP_TIMEOUT}
-   
-   nlp = StanfordCoreNLP(NLP_SERVER_LOCATION)
-   result = nlp.annotate(text, properties = PROPERTIES_DICTIONARY)
-
-   sentiments = []
-   for sentenceAnalysis in result['sentences']:
-      sentimentValue = float(sentenceAnalysis['sentimentValue'])
-      sentiments += [sentimentValue]
-   return numpy.average(sentiments)
+   return get_sentiment_backend().score_texts([text])[0]
+
+def find_sentiments(texts):
+   '''
+   ' Determines the average sentiment (sentence-wise) of each of a list of texts in a range from 0 (Extremely Negative)
+   ' to 4 (Extremely Positive), using the current sentiment backend. The texts are scored together as a batch.
+   '
+   ' texts (list<str>): the blocks of text to be analyzed
+   '''
+   return get_sentiment_backend().score_texts(texts)
 
 # Displays a sentiment value (0-4) in a convenient gauge format.
 def displaySentimentNum(sentimentVal):
@@ -69,6 +156,9 @@ def get_nlp_date_range(start_date, end_date, currencies_list):
    ' end_date (datetime) - the end date, with month, day, and year provided
    ' currencies_list (list) - the list of currencies to associate with the given fear and greed values
    '''
+   from newsapi import NewsApiClient # deferred, since only news sentiment requires NewsAPI
+   newsapi = NewsApiClient(api_key=os.environ[NEWS_API_KEY_VARIABLE])
+
    currency_frame = pd.DataFrame()
 
    for currency in currencies_list:
@@ -81,19 +171,9 @@ def get_nlp_date_range(start_date, end_date, currencies_list):
                                          sort_by='popularity',
                                          page_size = DESIRED_ARTICLES)['articles']
       
-      article_content = []
-      for article in articles:
-         source = article['source']['id'] if article['source']['id'] != None else article['source']['name']
-         url = article['url']
-         source_calls = {'business-insider': webutil.get_business_insider_text, 
-                    'cnn': webutil.get_cnn_text,
-                    'CoinDesk': webutil.get_coin_desk_text
-                   }
-      
-         article_content += [source_calls[source](url)]
-         
-      article_frame = pd.DataFrame(article_content)
-      sentiment_frame = article_frame.apply(lambda row: nlp.findSentiment(row[0]), axis=1)
-      
-      currency_frame[currency.value] = [sentiment_frame.mean()]
+      sources = [article['source']['id'] if article['source']['id'] != None else article['source']['name']
+                 for article in articles]
+      article_content = webutil.get_article_texts([(source, article['url']) for source, article in zip(sources, articles)])
+
+      currency_frame[currency.value] = [numpy.nanmean(find_sentiments(article_content))]
    return currency_frame
@@ -0,0 +1,158 @@
+'''
+Scores the sentiment of many texts using the Stanford NLP server. Texts are packed into a few large annotate requests,
+several requests run concurrently under a bounded limit, and results are cached by content hash so that the same text is
+never scored twice.
+'''
+
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from finndex.sentiment import backend
+from finndex.util import poolutil, webutil
+
+__author__ = "Finn Frankis"
+__copyright__ = "Copyright 2020, Crypticko"
+
+BATCH_CHARACTERS = 100000 # the approximate maximum length of the text sent in a single annotate request
+TEXT_SEPARATOR = "\n\n" # placed between texts in a batch; with the properties below, always ends a sentence
+ANNOTATE_PROPERTIES = {'annotators': 'sentiment', 'outputFormat': 'json', 'ssplit.newlineIsSentenceBreak': 'two'}
+
+MAX_CACHED_TEXTS = 10000
+
+def get_text_hash(text):
+   '''
+   ' Computes the key under which the sentence sentiments of a text are cached.
+   '
+   ' text (str): the text to be hashed
+   '''
+   return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+def get_java_length(text):
+   '''
+   ' Determines the length of a text as counted by the (Java-based) Stanford NLP server, which counts UTF-16 code units;
+   ' characters outside the Basic Multilingual Plane therefore count twice.
+   '
+   ' text (str): the text to be measured
+   '''
+   return len(text.encode("utf-16-le")) // 2
+
+class SentimentCache:
+   '''
+   ' A thread-safe, size-limited mapping from text hashes to the sentiment of each sentence in the text, evicting the
+   ' least recently used text once full.
+   '''
+   def __init__(self, max_entries = MAX_CACHED_TEXTS):
+      self.max_entries = max_entries
+
+      self._entries = OrderedDict() # least recently used first
+      self._lock = threading.Lock()
+
+   def get(self, text_hash):
+      with self._lock:
+         sentiments = self._entries.get(text_hash)
+         if sentiments is not None:
+            self._entries.move_to_end(text_hash)
+         return sentiments
+
+   def put(self, text_hash, sentiments):
+      with self._lock:
+         self._entries[text_hash] = sentiments
+         self._entries.move_to_end(text_hash)
+         while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+   def __len__(self):
+      return len(self._entries)
+
+class CoreNLPPipeline(backend.SentimentBackend):
+   '''
+   ' Scores batches of texts using a Stanford NLP server, returning values in a range from 0 (Extremely Negative)
+   ' to 4 (Extremely Positive).
+   '''
+   def __init__(self, server_url, timeout, batch_characters = BATCH_CHARACTERS, cache = None, prepare_server = None):
+      '''
+      ' Creates a new pipeline.
+      '
+      ' server_url (str): the address of the Stanford NLP server (ex.: http://localhost:9002)
+      ' timeout (int): the time (in milliseconds) after which a given NLP request will be killed if not yet complete
+      ' batch_characters (int): the approximate maximum length of the text sent in a single annotate request
+      ' cache (SentimentCache): the cache of previously scored texts; by default, a new cache is created
+      ' prepare_server (function): called with no arguments before the first request (ex.: to start the server)
+      '''
+      self.server_url = server_url
+      self.timeout = timeout
+      self.batch_characters = batch_characters
+      self.cache = cache if cache is not None else SentimentCache()
+      self.prepare_server = prepare_server
+
+   def score_sentences(self, texts):
+      '''
+      ' Determines the sentiment of each sentence of each text. Returns a list containing, for each text, the list of
+      ' its sentence sentiments.
+      '
+      ' texts (list<str>): the texts to be analyzed
+      '''
+      hashes = [get_text_hash(text) for text in texts]
+
+      # identical texts are scored once, and texts which have been scored before are not scored again
+      scored = {}
+      pending = OrderedDict()
+      for text, text_hash in zip(texts, hashes):
+         if text_hash in scored or text_hash in pending:
+            continue
+         cached = self.cache.get(text_hash)
+         if cached is not None:
+            scored[text_hash] = cached
+         else:
+            pending[text_hash] = text
+
+      if pending:
+         if self.prepare_server is not None:
+            self.prepare_server()
+
+         batches = self._build_batches(list(pending.items()))
+         for batch_results in poolutil.map_concurrent(self._annotate_batch, batches):
+            for text_hash, sentiments in batch_results:
+               self.cache.put(text_hash, sentiments)
+               scored[text_hash] = sentiments
+
+      return [scored[text_hash] for text_hash in hashes]
+
+   def _build_batches(self, items):
+      batches = []
+      batch, batch_length = [], 0
+      for text_hash, text in items:
+         if batch and batch_length + len(text) > self.batch_characters:
+            batches += [batch]
+            batch, batch_length = [], 0
+         batch += [(text_hash, text)]
+         batch_length += len(text) + len(TEXT_SEPARATOR)
+      if batch:
+         batches += [batch]
+      return batches
+
+   def _annotate_batch(self, batch):
+      document = TEXT_SEPARATOR.join(text for text_hash, text in batch)
+
+      # the offset at which each text begins within the document, in the server's character units
+      lengths = [get_java_length(text) + get_java_length(TEXT_SEPARATOR) for text_hash, text in batch]
+      starts = np.cumsum([0] + lengths[:-1])
+
+      properties = dict(ANNOTATE_PROPERTIES, timeout=self.timeout)
+      with poolutil.limit_upstream(poolutil.CORENLP_UPSTREAM):
+         response = webutil.SESSION.post(self.server_url, params={'properties': json.dumps(properties)},
+                                         data=document.encode("utf-8"), timeout=(webutil.TIMEOUT[0], self.timeout / 1000))
+      response.raise_for_status()
+
+      sentiments = [[] for item in batch]
+      for sentence in json.loads(response.content.decode("utf-8"))['sentences']:
+         if not sentence.get('tokens'):
+            continue
+         text_index = np.searchsorted(starts, sentence['tokens'][0]['characterOffsetBegin'], side='right') - 1
+         sentiments[text_index] += [float(sentence['sentimentValue'])]
+
+      return [(text_hash, text_sentiments) for (text_hash, text), text_sentiments in zip(batch, sentiments)]
@@ -1,14 +1,16 @@
 import datetime
 
 import numpy
-from finndex.util import cryptocurrencies, dateutil, mathutil
-from pytrends.request import TrendReq
+from finndex.sentiment import trendscache
+from finndex.util import cryptocurrencies, dateutil, instrumentation, mathutil, poolutil
 import pandas as pd
 
 MIN_TRENDS_VAL = 0
 MAX_TRENDS_VAL = 100
 
 def getTrendsDataRaw(keyword, startDate, endDate):
+   from pytrends.request import TrendReq
+   
    trends = TrendReq(hl='en-US', tz=0) # tz is timezone offset from UTC in minutes
    trend = trends.get_historical_interest([keyword], 
                                              year_start=startDate.year, month_start=startDate.month, 
@@ -18,6 +20,33 @@ def getTrendsDataRaw(keyword, startDate, endDate):
                                              cat=0, geo='', gprop='', sleep=0)[keyword]
 
    return trend
+
+def fetch_hourly_interest(keyword, start_date, end_date):
+    '''
+    ' Downloads the hourly Google Trends values of a keyword between two times, returning a series indexed by time.
+    '
+    ' keyword (str): the search term (ex.: Bitcoin)
+    ' start_date (datetime) - the start time (in UTC)
+    ' end_date (datetime) - the end time (in UTC)
+    '''
+    from pytrends.request import TrendReq # deferred, since pytrends is slow to import and needed only for downloads
+
+    with poolutil.limit_upstream(poolutil.TRENDS_UPSTREAM):
+        # the client requests a Google cookie when built, so it is built within the limit; one client per call
+        trends = TrendReq(hl='en-US', tz=0) # tz is timezone offset from UTC in minutes
+        trend = trends.get_historical_interest([keyword], 
+                                         year_start=start_date.year, month_start=start_date.month, 
+                                         day_start=start_date.day, hour_start=start_date.hour, 
+                                         year_end=end_date.year, month_end=end_date.month, 
+                                         day_end=end_date.day, hour_end=end_date.hour, 
+                                         cat=0, geo='', gprop='', sleep=0)
+
+    if trend.empty:
+        return pd.Series(dtype='float', index=pd.DatetimeIndex([], name='date'))
+    return trend[keyword]
+
+TRENDS_CACHE = trendscache.TrendsCache(fetch_hourly_interest)
+
 '''
 From trends.google.com: 
 
@@ -26,6 +55,7 @@ A value of 100 is the peak popularity for the term.
 A value of 50 means that the term is half as popular. 
 A score of 0 means there was not enough data for this term.
 '''
+@instrumentation.timed(instrumentation.SOURCE_SECONDS, source="trends")
 def get_trends_dates(start_date, end_date, currencies_list):
     '''
     ' Retrieves the Google Trends values (mapped into a range between 0 and 1) between two dates,
@@ -37,21 +67,15 @@ def get_trends_dates(start_date, end_date, currencies_list):
     ' end_date (datetime) - the end date, with month, day, and year provided
     ' currencies_list (list) - the list of currencies to associate with the given fear and greed values
     '''
-    trends = TrendReq(hl='en-US', tz=0) # tz is timezone offset from UTC in minutes
-    
-    trends_data_frame = pd.DataFrame()
-    for currency in currencies_list:
-        trend = trends.get_historical_interest([currency.value.name], 
-                                         year_start=start_date.year, month_start=start_date.month, 
-                                         day_start=start_date.day, hour_start=start_date.hour, 
-                                         year_end=end_date.year, month_end=end_date.month, 
-                                         day_end=end_date.day, hour_end=end_date.hour, 
-                                         cat=0, geo='', gprop='', sleep=0)
+    def get_currency_trend(currency):
+        trend = TRENDS_CACHE.get_hourly(currency.value.name, start_date, end_date).to_frame()
         trend.index = trend.index.floor('d')
-        trend = trend.drop('isPartial', axis=1)
         trend.columns = pd.MultiIndex.from_product([[currency], ["Trends"]])
-        trend = trend.groupby("date").mean()
-        trends_data_frame = pd.concat([trend, trends_data_frame], axis=1)
+        return trend.groupby("date").mean()
+
+    # currencies are retrieved concurrently, bounded by the Trends upstream limit
+    trend_frames = poolutil.map_concurrent(get_currency_trend, currencies_list)
+    trends_data_frame = pd.concat(trend_frames, axis=1)
 
 
     
@@ -63,7 +87,30 @@ def get_trends_dates(start_date, end_date, currencies_list):
 
     return trends_data_frame
 
+def get_trends_first_hours(start_date, end_date, currencies_list):
+    '''
+    ' Retrieves the Google Trends value (mapped into a range between 0 and 1) of the first hour of each day between two
+    ' dates, inclusive. This is the value get_trends_dates gives for the final day of a range ending at midnight, of
+    ' which only the first hour falls within the range. The outer column of the returned data frame represents the
+    ' retrieved cryptocurrencies while the inner columns represents the retrieved metric (only "Trends", in this case).
+    '
+    ' start_date (datetime) - the start date, with month, day, and year provided
+    ' end_date (datetime) - the end date, with month, day, and year provided
+    ' currencies_list (list) - the list of currencies whose values are retrieved
+    '''
+    def get_currency_first_hours(currency):
+        trend = TRENDS_CACHE.get_hourly(currency.value.name, start_date, end_date)
+        trend = trend.loc[trend.index == trend.index.floor('d')].to_frame()
+        trend.columns = pd.MultiIndex.from_product([[currency], ["Trends"]])
+        return trend
+
+    # currencies are retrieved concurrently, bounded by the Trends upstream limit
+    first_hours = pd.concat(poolutil.map_concurrent(get_currency_first_hours, currencies_list), axis=1)
+    return first_hours.apply(lambda val: mathutil.map(val, MIN_TRENDS_VAL, MAX_TRENDS_VAL, 0, 1))
+
 def getTrendsDataRaw(keyword, startDate, endDate):
+   from pytrends.request import TrendReq
+   
    trends = TrendReq(hl='en-US', tz=0) # tz is timezone offset from UTC in minutes
    trend = trends.get_historical_interest([keyword], 
                                              year_start=startDate.year, month_start=startDate.month, 
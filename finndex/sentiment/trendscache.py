@@ -0,0 +1,158 @@
+'''
+Caches raw hourly Google Trends data in fixed, week-long chunks keyed by (keyword, chunk). A request for any window
+downloads only the chunks not yet held and stitches the result together locally, so overlapping windows (such as a
+sliding four-week view) reuse almost all of their data.
+
+Each chunk is downloaded as a single Trends window, which Google scales to its own peak. Stitched values are therefore
+on each chunk's scale, and can differ from those of a single request over the whole window, which pytrends splits into
+week-long windows starting from the requested start rather than from the chunk boundaries.
+'''
+
+import datetime
+import io
+import os
+import threading
+import time
+
+import pandas as pd
+
+from finndex.util import cacheutil, instrumentation, poolutil
+
+__author__ = "Finn Frankis"
+__copyright__ = "Copyright 2020, Crypticko"
+
+CACHE_SUBDIRECTORY = "trends"
+CHUNK_LENGTH = datetime.timedelta(days=7) # the longest window for which Trends reports hourly data
+CHUNK_EPOCH = datetime.datetime(1970, 1, 1) # chunks are aligned to whole weeks after this instant (in UTC)
+
+HOUR = datetime.timedelta(hours=1)
+COMPLETE_AFTER = datetime.timedelta(days=1) # the age after which a chunk's hourly values are considered final
+PARTIAL_REFRESH_INTERVAL = datetime.timedelta(hours=1) # the age after which a chunk which is not yet final is refetched
+
+class TrendsCache:
+   '''
+   ' Stores hourly Trends series in week-long chunks. Chunks whose values are final are kept both in memory and on disk;
+   ' chunks which still include recent hours are kept only in memory and refetched once they grow stale.
+   '''
+   def __init__(self, fetch, directory = None, clock = time.time):
+      '''
+      ' Creates a new cache.
+      '
+      ' fetch (function): retrieves a series of hourly values indexed by time; called as fetch(keyword, start, end)
+      ' directory (str): the directory in which final chunks are stored; defaults to the "trends" cache directory
+      ' clock (function): returns the current time in seconds since the epoch
+      '''
+      self.fetch = fetch
+      self.directory = directory
+      self.clock = clock
+
+      self._chunks = {} # (keyword, chunk start) -> (retrieval time, series)
+      self._flights = poolutil.SingleFlight("trends") # chunk retrievals in progress, keyed by (keyword, chunk start)
+      self._lock = threading.Lock()
+
+   def get_hourly(self, keyword, start_date, end_date):
+      '''
+      ' Retrieves the hourly Trends values of a keyword between two times, inclusive, downloading only the chunks of the
+      ' window which are not already held.
+      '
+      ' keyword (str): the search term (ex.: Bitcoin)
+      ' start_date (datetime) - the start time (in UTC)
+      ' end_date (datetime) - the end time (in UTC)
+      '''
+      chunk_starts = get_chunk_starts(start_date, end_date)
+
+      with self._lock:
+         held = {chunk_start: self._get_held(keyword, chunk_start) for chunk_start in chunk_starts}
+      missing = [chunk_start for chunk_start, series in held.items() if series is None]
+      instrumentation.record_cache("trends", True, len(chunk_starts) - len(missing))
+      instrumentation.record_cache("trends", False, len(missing))
+
+      # missing chunks are retrieved concurrently, bounded by the Trends upstream limit; a chunk another caller is
+      # already retrieving is awaited rather than requested again
+      retrieve = lambda chunk_start: self._flights.do((keyword, chunk_start),
+                                                      lambda: self._retrieve_chunk(keyword, chunk_start))
+      for chunk_start, series in zip(missing, poolutil.map_concurrent(retrieve, missing)):
+         held[chunk_start] = series
+
+      stitched = pd.concat([held[chunk_start] for chunk_start in chunk_starts])
+      return stitched.loc[(stitched.index >= start_date) & (stitched.index <= end_date)]
+
+   def clear(self):
+      '''
+      ' Removes all chunks held in memory; the files on disk are left in place.
+      '''
+      with self._lock:
+         self._chunks.clear()
+
+   def _now(self):
+      return datetime.datetime.fromtimestamp(self.clock(), datetime.timezone.utc).replace(tzinfo=None)
+
+   def _is_complete(self, chunk_start):
+      return chunk_start + CHUNK_LENGTH + COMPLETE_AFTER <= self._now()
+
+   def _get_held(self, keyword, chunk_start):
+      held = self._chunks.get((keyword, chunk_start))
+      if held is not None:
+         retrieved, series = held
+         if self._is_complete(chunk_start) or self._now() - retrieved < PARTIAL_REFRESH_INTERVAL:
+            return series
+         return None
+
+      path = self._get_path(keyword, chunk_start)
+      if os.path.exists(path):
+         series = pd.read_csv(path, index_col='date', parse_dates=['date'])['value'].astype('float')
+         self._chunks[(keyword, chunk_start)] = (self._now(), series)
+         return series
+
+      return None
+
+   def _retrieve_chunk(self, keyword, chunk_start):
+      # the chunk may have been stored by a retrieval which finished after it was found missing
+      with self._lock:
+         series = self._get_held(keyword, chunk_start)
+      return series if series is not None else self._fetch_chunk(keyword, chunk_start)
+
+   def _fetch_chunk(self, keyword, chunk_start):
+      # the request ends an hour before the next chunk starts, since a request spanning a whole week makes pytrends
+      # follow it with an empty one; the current chunk ends at the current hour rather than in the future
+      chunk_end = min(chunk_start + CHUNK_LENGTH - HOUR, pd.Timestamp(self._now()).floor('h').to_pydatetime())
+      if chunk_end < chunk_start:
+         series = pd.Series(dtype='float', index=pd.DatetimeIndex([]))
+      else:
+         series = self.fetch(keyword, chunk_start, chunk_end).astype('float')
+      series = series.loc[(series.index >= chunk_start) & (series.index <= chunk_end)] # trim anything outside the request
+      series.index.name = 'date'
+
+      with self._lock:
+         self._chunks[(keyword, chunk_start)] = (self._now(), series)
+         if self._is_complete(chunk_start):
+            buffer = io.StringIO()
+            series.rename('value').to_frame().to_csv(buffer, index_label='date')
+            cacheutil.atomic_write(self._get_path(keyword, chunk_start), buffer.getvalue())
+
+      return series
+
+   def _get_path(self, keyword, chunk_start):
+      directory = self.directory
+      if directory is None:
+         directory = cacheutil.get_cache_directory(CACHE_SUBDIRECTORY, keyword)
+      else:
+         directory = os.path.join(directory, keyword)
+         os.makedirs(directory, exist_ok=True)
+      return os.path.join(directory, "{}.csv".format(chunk_start.strftime("%Y-%m-%d")))
+
+def get_chunk_starts(start_date, end_date):
+   '''
+   ' Determines the start times of every chunk overlapping a window, in ascending order.
+   '
+   ' start_date (datetime) - the start time of the window
+   ' end_date (datetime) - the end time of the window
+   '''
+   first = CHUNK_EPOCH + ((start_date - CHUNK_EPOCH) // CHUNK_LENGTH) * CHUNK_LENGTH
+
+   chunk_starts = []
+   chunk_start = first
+   while chunk_start <= end_date:
+      chunk_starts += [chunk_start]
+      chunk_start += CHUNK_LENGTH
+   return chunk_starts
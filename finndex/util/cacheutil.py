@@ -0,0 +1,43 @@
+'''
+Provides utility functions for locating and safely writing the files in the library's local on-disk cache.
+'''
+
+import os
+import tempfile
+
+__author__ = "Finn Frankis"
+__copyright__ = "Copyright 2020, Crypticko"
+
+CACHE_DIRECTORY_VARIABLE = "FINNDEX_CACHE_DIR" # environment variable which overrides the default cache location
+DEFAULT_CACHE_DIRECTORY = os.path.join("~", ".finndex", "cache")
+
+def get_cache_directory(*subdirectories):
+   '''
+   ' Retrieves (and creates, if necessary) a directory within the local cache. The cache is rooted at the directory
+   ' given by the FINNDEX_CACHE_DIR environment variable, if present, and at ~/.finndex/cache otherwise.
+   '
+   ' subdirectories (str...): the path components of the desired directory, relative to the cache root
+   '''
+   root = os.path.expanduser(os.environ.get(CACHE_DIRECTORY_VARIABLE, DEFAULT_CACHE_DIRECTORY))
+   directory = os.path.join(root, *subdirectories)
+   os.makedirs(directory, exist_ok=True)
+   return directory
+
+def atomic_write(path, content, mode="w"):
+   '''
+   ' Writes a file by first writing to a temporary file in the same directory and then renaming it over the destination,
+   ' so that concurrent readers never observe a partially-written file.
+   '
+   ' path (str): the location of the file to be written
+   ' content (str or bytes): the content of the file
+   ' mode (str): the mode with which to open the temporary file ("w" for text, "wb" for bytes)
+   '''
+   directory = os.path.dirname(path)
+   file_descriptor, temp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+   try:
+      with os.fdopen(file_descriptor, mode) as temp_file:
+         temp_file.write(content)
+      os.replace(temp_path, path)
+   except BaseException:
+      os.unlink(temp_path)
+      raise
@@ -0,0 +1,290 @@
+'''
+Records how long the library's hot paths take, how many bytes are downloaded from each upstream service, and how often
+each cache is hit. The measurements accumulate in a process-wide registry, which renders them in the Prometheus text
+format (served by the API at /metrics); a profile collects the measurements made during a single block of code.
+'''
+
+import bisect
+import functools
+import threading
+import time
+from contextlib import contextmanager
+
+__author__ = "Finn Frankis"
+__copyright__ = "Copyright 2020, Crypticko"
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0) # in seconds
+
+UPSTREAM_SECONDS = "finndex_upstream_request_seconds"
+UPSTREAM_BYTES = "finndex_upstream_response_bytes_total"
+PARSE_SECONDS = "finndex_parse_seconds"
+SOURCE_SECONDS = "finndex_source_seconds"
+AGGREGATION_SECONDS = "finndex_aggregation_seconds"
+SERIALIZATION_SECONDS = "finndex_serialization_seconds"
+REQUEST_SECONDS = "finndex_api_request_seconds"
+CACHE_REQUESTS = "finndex_cache_requests_total"
+REFRESH_SECONDS = "finndex_refresh_seconds"
+REFRESH_DEFERRED = "finndex_refresh_deferred_total"
+
+CACHE_HIT = "hit"
+CACHE_MISS = "miss"
+
+DESCRIPTIONS = {UPSTREAM_SECONDS: "Time taken by each request to an upstream service.",
+                UPSTREAM_BYTES: "Bytes received from each upstream service.",
+                PARSE_SECONDS: "Time taken to decode each source's upstream payloads.",
+                SOURCE_SECONDS: "Time taken by each source to retrieve a range of dates.",
+                AGGREGATION_SECONDS: "Time taken by each step of computing historical sentiment.",
+                SERIALIZATION_SECONDS: "Time taken to serialize each API response.",
+                REQUEST_SECONDS: "Time taken to serve each API request.",
+                CACHE_REQUESTS: "Lookups of each cache, by whether they were served from it.",
+                REFRESH_SECONDS: "Time taken by each background refresh of a source, by whether it succeeded.",
+                REFRESH_DEFERRED: "Background refreshes postponed because a source's budget was spent."}
+
+class Histogram:
+   '''
+   ' Counts observed values within cumulative upper bounds, alongside their count and sum.
+   '''
+   def __init__(self, buckets = DEFAULT_BUCKETS):
+      '''
+      ' Creates a new, empty histogram.
+      '
+      ' buckets (list<float>): the upper bound of each bucket, in ascending order; a final unbounded bucket is implied
+      '''
+      self.buckets = tuple(buckets)
+      self.counts = [0] * (len(self.buckets) + 1) # per bucket rather than cumulative
+      self.sum = 0.0
+      self.count = 0
+
+   def observe(self, value):
+      self.counts[bisect.bisect_left(self.buckets, value)] += 1
+      self.sum += value
+      self.count += 1
+
+   def get_cumulative_counts(self):
+      '''
+      ' Retrieves the number of observed values no greater than each bucket's bound, ending with the total count.
+      '''
+      cumulative, total = [], 0
+      for count in self.counts:
+         total += count
+         cumulative += [total]
+      return cumulative
+
+class Profile:
+   '''
+   ' Collects every measurement made (on any thread) while it is active; see profile.
+   '''
+   def __init__(self):
+      self.records = [] # (name, labels, value), in the order made
+
+   def summary(self):
+      '''
+      ' Summarizes the measurements as a data frame with one row per measured name and labels, giving the number of
+      ' measurements, their total, their mean, and their maximum. Times are in seconds and sizes in bytes.
+      '''
+      import pandas as pd # deferred, since the registry itself is used where pandas need not be imported
+
+      frame = pd.DataFrame([(name, format_labels(labels), value) for name, labels, value in self.records],
+                           columns = ["name", "labels", "value"])
+      summary = frame.groupby(["name", "labels"], sort=False)['value'].agg(['count', 'sum', 'mean', 'max'])
+      return summary.rename(columns = {'count': 'calls', 'sum': 'total'})
+
+class Registry:
+   '''
+   ' A thread-safe collection of labeled histograms and counters.
+   '''
+   def __init__(self, buckets = DEFAULT_BUCKETS):
+      '''
+      ' Creates a new, empty registry.
+      '
+      ' buckets (list<float>): the bucket bounds of every histogram
+      '''
+      self.buckets = buckets
+
+      self._histograms = {} # (name, labels) -> Histogram
+      self._counters = {} # (name, labels) -> total
+      self._profiles = []
+      self._lock = threading.Lock()
+
+   def observe(self, name, value, **labels):
+      '''
+      ' Adds a value (ex.: a time in seconds) to a histogram.
+      '
+      ' name (str): the name of the histogram (ex.: UPSTREAM_SECONDS)
+      ' value (float): the observed value
+      ' labels (str...): the labels distinguishing this histogram from others of the same name
+      '''
+      key = (name, tuple(sorted(labels.items())))
+      with self._lock:
+         if key not in self._histograms:
+            self._histograms[key] = Histogram(self.buckets)
+         self._histograms[key].observe(value)
+         for active in self._profiles:
+            active.records += [(name, key[1], value)]
+
+   def increment(self, name, amount = 1, **labels):
+      '''
+      ' Adds an amount to a counter.
+      '
+      ' name (str): the name of the counter (ex.: UPSTREAM_BYTES)
+      ' amount (float): the amount added
+      ' labels (str...): the labels distinguishing this counter from others of the same name
+      '''
+      key = (name, tuple(sorted(labels.items())))
+      with self._lock:
+         self._counters[key] = self._counters.get(key, 0) + amount
+         for active in self._profiles:
+            active.records += [(name, key[1], amount)]
+
+   def get_histogram(self, name, **labels):
+      '''
+      ' Retrieves a histogram, or None if nothing has been observed in it.
+      '''
+      return self._histograms.get((name, tuple(sorted(labels.items()))))
+
+   def get_counter(self, name, **labels):
+      '''
+      ' Retrieves the total of a counter, which is 0 if nothing has been added to it.
+      '''
+      return self._counters.get((name, tuple(sorted(labels.items()))), 0)
+
+   def get_hit_rate(self, cache):
+      '''
+      ' Computes the fraction of a cache's lookups which were served from it, or None if it has not been used.
+      '
+      ' cache (str): the name of the cache (ex.: "coinmetrics")
+      '''
+      hits = self.get_counter(CACHE_REQUESTS, cache=cache, result=CACHE_HIT)
+      misses = self.get_counter(CACHE_REQUESTS, cache=cache, result=CACHE_MISS)
+      return hits / (hits + misses) if hits + misses > 0 else None
+
+   @contextmanager
+   def profile(self):
+      active = Profile()
+      with self._lock:
+         self._profiles += [active]
+      try:
+         yield active
+      finally:
+         with self._lock:
+            self._profiles.remove(active)
+
+   def clear(self):
+      '''
+      ' Removes every histogram and counter.
+      '''
+      with self._lock:
+         self._histograms.clear()
+         self._counters.clear()
+
+   def render(self):
+      '''
+      ' Renders every histogram and counter in the Prometheus text exposition format.
+      '''
+      with self._lock:
+         histograms = {key: (histogram.get_cumulative_counts(), histogram.sum, histogram.count)
+                        for key, histogram in self._histograms.items()}
+         counters = dict(self._counters)
+
+      lines = []
+      for name in sorted(set(name for name, labels in histograms)):
+         lines += describe(name, "histogram")
+         for (histogram_name, labels), (cumulative, total, count) in sorted(histograms.items()):
+            if histogram_name != name:
+               continue
+            bounds = [format_value(bound) for bound in self.buckets] + ["+Inf"]
+            for bound, bucket_count in zip(bounds, cumulative):
+               lines += ["{}_bucket{} {}".format(name, format_labels(labels + (('le', bound),)), bucket_count)]
+            lines += ["{}_sum{} {}".format(name, format_labels(labels), format_value(total)),
+                      "{}_count{} {}".format(name, format_labels(labels), count)]
+
+      for name in sorted(set(name for name, labels in counters)):
+         lines += describe(name, "counter")
+         lines += ["{}{} {}".format(name, format_labels(labels), format_value(total))
+                     for (counter_name, labels), total in sorted(counters.items()) if counter_name == name]
+
+      return "\n".join(lines) + "\n"
+
+def describe(name, kind):
+   return ["# HELP {} {}".format(name, DESCRIPTIONS.get(name, name)), "# TYPE {} {}".format(name, kind)]
+
+def format_labels(labels):
+   '''
+   ' Formats a tuple of (name, value) label pairs as a Prometheus label set (ex.: {source="trends"}), escaping each value.
+   '''
+   if not labels:
+      return ""
+   escape = lambda value: str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+   return "{" + ",".join('{}="{}"'.format(name, escape(value)) for name, value in labels) + "}"
+
+def format_value(value):
+   value = float(value)
+   return str(int(value)) if value.is_integer() else repr(value)
+
+REGISTRY = Registry()
+
+@contextmanager
+def time_block(name, **labels):
+   '''
+   ' A context manager which adds the time taken by its block, in seconds, to a histogram of the process-wide registry.
+   '
+   ' name (str): the name of the histogram (ex.: AGGREGATION_SECONDS)
+   ' labels (str...): the labels distinguishing this histogram from others of the same name
+   '''
+   start = time.perf_counter()
+   try:
+      yield
+   finally:
+      REGISTRY.observe(name, time.perf_counter() - start, **labels)
+
+def timed(name, **labels):
+   '''
+   ' A decorator which adds the time taken by every call of a function to a histogram of the process-wide registry.
+   '
+   ' name (str): the name of the histogram (ex.: SOURCE_SECONDS)
+   ' labels (str...): the labels distinguishing this histogram from others of the same name
+   '''
+   def decorate(function):
+      @functools.wraps(function)
+      def timed_function(*args, **kwargs):
+         with time_block(name, **labels):
+            return function(*args, **kwargs)
+      return timed_function
+   return decorate
+
+def add_bytes(upstream, count):
+   '''
+   ' Adds to the number of bytes received from an upstream service.
+   '
+   ' upstream (str): the host of the upstream service
+   ' count (int): the number of bytes received
+   '''
+   REGISTRY.increment(UPSTREAM_BYTES, count, upstream=upstream)
+
+def record_cache(cache, hit, count = 1):
+   '''
+   ' Records lookups of a cache.
+   '
+   ' cache (str): the name of the cache (ex.: "coinmetrics")
+   ' hit (bool): whether the lookups were served from the cache
+   ' count (int): the number of lookups
+   '''
+   if count > 0:
+      REGISTRY.increment(CACHE_REQUESTS, count, cache=cache, result=CACHE_HIT if hit else CACHE_MISS)
+
+def profile():
+   '''
+   ' A context manager which collects every measurement made while its block runs (including those on other threads,
+   ' such as the concurrent retrievals it starts) into a Profile, for inspecting a single call in a notebook:
+   '
+   '    with instrumentation.profile() as calls:
+   '       manager.get_historical_sentiment()
+   '    calls.summary()
+   '''
+   return REGISTRY.profile()
+
+def render():
+   '''
+   ' Renders every measurement of the process-wide registry in the Prometheus text exposition format.
+   '''
+   return REGISTRY.render()
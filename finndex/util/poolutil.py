@@ -0,0 +1,126 @@
+'''
+Provides utility functions for running independent retrievals concurrently on a thread pool while bounding the number
+of simultaneous requests sent to each upstream service, and for sharing one in-flight request among concurrent callers
+which need the same data.
+'''
+
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+
+from finndex.util import instrumentation
+
+__author__ = "Finn Frankis"
+__copyright__ = "Copyright 2020, Crypticko"
+
+COIN_METRICS_UPSTREAM = "coinmetrics"
+FEAR_AND_GREED_UPSTREAM = "fearandgreed"
+TRENDS_UPSTREAM = "trends"
+NEWS_UPSTREAM = "news"
+CORENLP_UPSTREAM = "corenlp"
+
+DEFAULT_UPSTREAM_LIMIT = 4
+UPSTREAM_LIMITS = {COIN_METRICS_UPSTREAM: 4,
+                   FEAR_AND_GREED_UPSTREAM: 1,
+                   TRENDS_UPSTREAM: 2, # Google Trends rate-limits aggressively
+                   NEWS_UPSTREAM: 8,
+                   CORENLP_UPSTREAM: 4}
+
+MAX_WORKERS = 32
+
+_semaphores = {}
+_semaphores_lock = threading.Lock()
+
+def set_upstream_limit(upstream, limit):
+   '''
+   ' Sets the maximum number of simultaneous requests which may be sent to a given upstream service. Takes effect for
+   ' requests which begin after the call.
+   '
+   ' upstream (str): the name of the upstream service (ex.: "coinmetrics")
+   ' limit (int): the maximum number of simultaneous requests; 1 makes requests to the service sequential
+   '''
+   with _semaphores_lock:
+      UPSTREAM_LIMITS[upstream] = limit
+      _semaphores[upstream] = threading.BoundedSemaphore(limit)
+
+def _get_semaphore(upstream):
+   with _semaphores_lock:
+      if upstream not in _semaphores:
+         _semaphores[upstream] = threading.BoundedSemaphore(UPSTREAM_LIMITS.get(upstream, DEFAULT_UPSTREAM_LIMIT))
+      return _semaphores[upstream]
+
+@contextmanager
+def limit_upstream(upstream):
+   '''
+   ' A context manager which blocks until a request slot for the given upstream service is free and holds that slot
+   ' for the duration of the block.
+   '
+   ' upstream (str): the name of the upstream service (ex.: "coinmetrics")
+   '''
+   semaphore = _get_semaphore(upstream)
+   with semaphore:
+      yield
+
+def map_concurrent(function, items, max_workers = MAX_WORKERS):
+   '''
+   ' Applies a function to every item on a thread pool, returning the results in the same order as the items. If any
+   ' call raises an exception, the first such exception (in item order) is re-raised.
+   '
+   ' function (function): the function to be applied to each item
+   ' items (list): the items to which the function is applied
+   ' max_workers (int): the maximum number of threads; 1 (or a single item) runs every call on the calling thread
+   '''
+   items = list(items)
+   if len(items) <= 1 or max_workers <= 1:
+      return [function(item) for item in items]
+
+   with ThreadPoolExecutor(max_workers = min(max_workers, len(items))) as executor:
+      futures = [executor.submit(function, item) for item in items]
+      return [future.result() for future in futures]
+
+class SingleFlight:
+   '''
+   ' Deduplicates concurrent identical calls: while a call for a given key is running, later callers with the same key
+   ' wait for it and receive its result (or its exception) rather than repeating it. Once the call finishes, the next
+   ' caller with that key starts a new one, so nothing is retained beyond the call itself.
+   '''
+   def __init__(self, name):
+      '''
+      ' Creates a new group of calls.
+      '
+      ' name (str): the name under which shared calls are recorded (ex.: "coinmetrics")
+      '''
+      self.name = name
+
+      self._calls = {} # key -> Future of the running call
+      self._lock = threading.Lock()
+
+   def do(self, key, function):
+      '''
+      ' Calls a function unless a call with the same key is already running, in which case that call's result is
+      ' returned once it finishes. The result is shared by every caller and must not be modified.
+      '
+      ' key (hashable): identifies the call, such as the normalized upstream request
+      ' function (function): called without arguments to produce the result
+      '''
+      with self._lock:
+         call = self._calls.get(key)
+         shared = call is not None
+         if not shared:
+            call = self._calls[key] = Future()
+      instrumentation.record_cache(self.name + "_inflight", shared)
+
+      if shared:
+         return call.result()
+
+      try:
+         result = function()
+      except BaseException as exception:
+         call.set_exception(exception)
+         raise
+      else:
+         call.set_result(result)
+         return result
+      finally:
+         with self._lock:
+            del self._calls[key]
@@ -1,58 +1,227 @@
 '''
 Provides several utility functions for extracting data from websites (including HTML pages as well as JSON files from APIs).
 '''
-from contextlib import closing
+import threading
+from collections import OrderedDict
+from urllib.parse import urlparse
 
-from bs4 import BeautifulSoup
-from requests import get
-from requests.exceptions import RequestException
+from requests import Session
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from finndex.util import instrumentation, poolutil
 
 __author__ = "Finn Frankis"
 __copyright__ = "Copyright 2019, Crypticko"
 
+CONNECTIONS_PER_HOST = 10 # the maximum number of simultaneous keep-alive connections held open to any one host
+CACHED_HOSTS = 10 # the number of hosts for which a connection pool is retained
+TIMEOUT = (5, 30) # seconds allowed to establish a connection and to wait between bytes of the response, respectively
+
+MAX_RETRIES = 3
+RETRY_BACKOFF = 0.5 # retries are delayed by 0.5, 1, 2, ... seconds
+RETRY_STATUSES = [429, 500, 502, 503, 504]
+
+MAX_REVALIDATED_PAGES = 256 # the number of pages whose content is retained for conditional revalidation
+
+def create_session():
+    '''
+    ' Creates an HTTP session which keeps a bounded pool of keep-alive connections to each host, accepts compressed
+    ' responses, and retries failed requests with exponential backoff.
+    '''
+    retries = Retry(total=MAX_RETRIES, backoff_factor=RETRY_BACKOFF, status_forcelist=RETRY_STATUSES, 
+                    raise_on_status=False)
+    adapter = HTTPAdapter(pool_connections=CACHED_HOSTS, pool_maxsize=CONNECTIONS_PER_HOST, pool_block=True, 
+                          max_retries=retries)
 
-# Extracts the content located at any URL.
+    session = Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers.update({"Accept-Encoding": "gzip, deflate"})
+    return session
+
+SESSION = create_session()
+
+_revalidated_pages = OrderedDict() # url -> (ETag, Last-Modified, content), least recently used first
+_revalidated_pages_lock = threading.Lock()
+
+# Extracts the content located at any URL, raising a requests.RequestException if the page cannot be retrieved.
 def getPageContent(url):
-    try: 
-        with closing(get(url, stream = True)) as page:
-            return page.content.decode("utf-8")
-    except RequestException as e:
-        print(e)
-        return
+    headers = {}
+    with _revalidated_pages_lock:
+        cached = _revalidated_pages.get(url)
+    if cached is not None:
+        etag, last_modified, content = cached
+        if etag is not None:
+            headers["If-None-Match"] = etag
+        if last_modified is not None:
+            headers["If-Modified-Since"] = last_modified
+
+    upstream = urlparse(url).netloc
+    with instrumentation.time_block(instrumentation.UPSTREAM_SECONDS, upstream=upstream):
+        page = SESSION.get(url, headers=headers, timeout=TIMEOUT)
+    instrumentation.add_bytes(upstream, len(page.content))
+
+    if cached is not None:
+        instrumentation.record_cache("revalidation", page.status_code == 304)
+    if page.status_code == 304 and cached is not None:
+        with _revalidated_pages_lock:
+            if url in _revalidated_pages:
+                _revalidated_pages.move_to_end(url)
+        return content
+
+    page.raise_for_status()
+    content = page.content.decode("utf-8")
+
+    etag, last_modified = page.headers.get("ETag"), page.headers.get("Last-Modified")
+    if etag is not None or last_modified is not None:
+        with _revalidated_pages_lock:
+            _revalidated_pages[url] = (etag, last_modified, content)
+            _revalidated_pages.move_to_end(url)
+            while len(_revalidated_pages) > MAX_REVALIDATED_PAGES:
+                _revalidated_pages.popitem(last=False)
+
+    return content
     
 # Parses a string representing HTML, returning the parsed result for convenient iteration.
 def parseHTML(url):
-    return BeautifulSoup(getPageContent(url), 'html.parser')
+    from bs4 import BeautifulSoup # deferred, since only the article scrapers parse HTML
+    
+    return BeautifulSoup(getPageContent(url), get_html_parser())
 
-def get_cnn_text(url):
+_html_parser = None
+
+def get_html_parser():
    '''
-   ' Retrieves the body of a given CNN article, excluding the headline and any advertisements.
+   ' Determines the parser BeautifulSoup should use: lxml, which is several times faster, if it is installed, and the
+   ' built-in html.parser otherwise.
+   '''
+   global _html_parser
+
+   if _html_parser is None:
+      try:
+         import lxml
+         _html_parser = 'lxml'
+      except ImportError:
+         _html_parser = 'html.parser'
+   return _html_parser
+
+def has_class(class_name):
+   '''
+   ' Builds an attribute filter matching elements with a given class among their classes. Unlike a plain string, it also
+   ' matches while a page is being parsed (when the class attribute has not yet been split into a list).
+   '
+   ' class_name (str): the class to be matched
+   '''
+   return lambda classes: classes is not None and class_name in (classes.split() if isinstance(classes, str) else classes)
+
+def extract_elements(content, name, attrs):
+   '''
+   ' Parses only the elements of an HTML page which match a given tag and attribute filter, returning those elements.
+   ' Everything else on the page is skipped rather than built into the document tree.
+   '
+   ' content (str): the HTML page
+   ' name (str): the tag of the elements to be extracted (ex.: "div")
+   ' attrs (dict): the attribute filter of the elements to be extracted (ex.: {"class": has_class("article")})
+   '''
+   from bs4 import BeautifulSoup, SoupStrainer
+
+   document = BeautifulSoup(content, get_html_parser(), parse_only=SoupStrainer(name, attrs))
+   return document.find_all(name, attrs)
+
+def extract_cnn_text(content):
+   '''
+   ' Extracts the body of a CNN article, excluding the headline and any advertisements.
+   '
+   ' content (str): the HTML of the article's page
+   '''
+   elements = extract_elements(content, "div", {"class": has_class("zn-body__paragraph")})
+   return "".join(element.text for element in elements).replace('"', ' ')
+
+def extract_coin_desk_text(content):
+   '''
+   ' Extracts the body of a CoinDesk article.
+   '
+   ' content (str): the HTML of the article's page
+   '''
+   elements = extract_elements(content, "div", {"class": has_class("article-pharagraph")})
+   return "".join(element.text for element in elements)
+
+def extract_business_insider_text(content):
+   '''
+   ' Extracts the body of a Business Insider article: every paragraph with an empty class, other than those holding images.
+   '
+   ' content (str): the HTML of the article's page
+   '''
+   elements = extract_elements(content, "p", {"class": lambda classes: classes == ""})
+   return "".join(element.text for element in elements if element.img is None).replace("\n", "").replace("\xa0", " ")
+
+ARTICLE_EXTRACTORS = {'business-insider': extract_business_insider_text,
+                      'cnn': extract_cnn_text,
+                      'CoinDesk': extract_coin_desk_text}
+
+MAX_CACHED_ARTICLES = 1024 # the number of articles whose extracted text is retained
+
+_article_texts = OrderedDict() # url -> text, least recently used first
+_article_texts_lock = threading.Lock()
+
+def get_article_text(url, extract):
+   '''
+   ' Retrieves the text of the article at a given URL, downloading and extracting it only if it has not been extracted
+   ' before.
    '
    ' url (string): the URL where the specific article is located
+   ' extract (function): extracts the article's text from the HTML of its page (ex.: extract_cnn_text)
    '''
-   htmlParser = parseHTML(url)
-   
-   text = ''
+   with _article_texts_lock:
+      if url in _article_texts:
+         _article_texts.move_to_end(url)
+         instrumentation.record_cache("article", True)
+         return _article_texts[url]
+   instrumentation.record_cache("article", False)
 
-   for element in htmlParser.select('div'):
-      if element.has_attr('class') and 'zn-body__paragraph' in element['class']: 
-         text += element.text 
-   text = text.replace('"', ' ')
+   with poolutil.limit_upstream(poolutil.NEWS_UPSTREAM):
+      content = getPageContent(url)
+   text = extract(content)
+
+   with _article_texts_lock:
+      _article_texts[url] = text
+      _article_texts.move_to_end(url)
+      while len(_article_texts) > MAX_CACHED_ARTICLES:
+         _article_texts.popitem(last=False)
    return text
 
+def get_article_texts(articles):
+   '''
+   ' Retrieves the text of several articles. Pages are downloaded concurrently (bounded by the news upstream limit) and
+   ' each is extracted as soon as it arrives, while the remaining downloads continue.
+   '
+   ' articles (list<tuple>): the (source, url) pair of each article, where the source is a key of ARTICLE_EXTRACTORS
+   '''
+   return poolutil.map_concurrent(lambda article: get_article_text(article[1], ARTICLE_EXTRACTORS[article[0]]), articles)
+
+def clear_article_texts():
+   '''
+   ' Discards every cached article text.
+   '''
+   with _article_texts_lock:
+      _article_texts.clear()
+
+def get_cnn_text(url):
+   '''
+   ' Retrieves the body of a given CNN article, excluding the headline and any advertisements.
+   '
+   ' url (string): the URL where the specific article is located
+   '''
+   return get_article_text(url, extract_cnn_text)
+
 def get_coin_desk_text(url):
    '''
    ' Retrieves the body of a given CoinDesk article.
    '
    ' url (string): the URL where the specific article is located
    '''
-   parser = parseHTML(url)
-
-   text = ""
-   for element in parser.findAll("div", {"class": "article-pharagraph"}):
-      text += element.text
-      
-   return text
+   return get_article_text(url, extract_coin_desk_text)
 
 def get_business_insider_text(url):
    '''
@@ -60,12 +229,4 @@ def get_business_insider_text(url):
    '
    ' url (string): the URL where the specific article is located
    '''
-   parser = parseHTML(url)
-   text = ""
-   paragraphs = parser.findAll("p", {"class": ""})
-
-   for element in paragraphs:
-      if element.img == None:
-         text += element.text
-
-   return text.replace("\n", "").replace("\xa0", " ")
\ No newline at end of file
+   return get_article_text(url, extract_business_insider_text)
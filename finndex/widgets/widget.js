@@ -67,16 +67,16 @@ function populateDateDropdowns(id, offset) {
 }
 
 /**
- * Retrieves sentiment data from the finndex API.
+ * Retrieves sentiment and price data for a set of coins from the finndex API in a single request.
  * 
- * @param coin the ticker symbol for the coin to be retrieved
+ * @param coins the string array containing the ticker symbols for the coins to be retrieved
  * @param startDate the date from which the API search will begin, formatted as YYYY-mm-dd
  * @param endDate the date at which the API search will end, formatted as YYYY-mm-dd
  * @param metrics the string array containing the metric IDs (e.g. 'trends', 'fear_and_greed')
  * @param weights the float array containing the weights
  */
-function retrieveSentimentData(coin, startDate, endDate, metrics, weights) {
-  apiFormatted = "http://44.233.186.17:9200/api/sentiment/coin=" + coin + "?start_date=" + startDate 
+function retrieveBatchData(coins, startDate, endDate, metrics, weights) {
+  apiFormatted = "http://44.233.186.17:9200/api/batch?coins=" + coins.join() + "&start_date=" + startDate 
                   + "&end_date=" + endDate + "&metrics=" + metrics.join() + "&weights=" + weights.join();
 
   let request = new XMLHttpRequest();
@@ -87,21 +87,21 @@ function retrieveSentimentData(coin, startDate, endDate, metrics, weights) {
 }
 
 /**
- * Retrieves price data from the finndex API.
+ * Splits an object keyed by date into the arrays of dates and values used by a Plotly trace.
  * 
- * @param coin the ticker symbol for the coin to be retrieved
- * @param startDate the date from which the API search will begin, formatted as YYYY-mm-dd
- * @param endDate the date at which the API search will end, formatted as YYYY-mm-dd
+ * @param obj the object with dates as keys and numeric values as values
+ * @param trace the trace whose x and y arrays are to be populated
  */
-function retrievePriceData(coin, startDate, endDate) {
-  apiFormatted = "http://44.233.186.17:9200/api/price/coin=" + coin + "?start_date=" + startDate 
-                  + "&end_date=" + endDate;
-
-  let request = new XMLHttpRequest();
-  request.open("GET", apiFormatted);
-  request.send();
+function populateTrace(obj, trace) {
+  x = [];
+  y = [];
+  for (var key in obj) {
+    x.push(key);
+    y.push(parseFloat(obj[key]));
+  }
 
-  return request;
+  trace.x = x;
+  trace.y = y;
 }
 
 /**
@@ -127,47 +127,19 @@ function updateGraph() {
     }
   }
   
-  requestSentiment = retrieveSentimentData(coin, startDate, endDate, metrics, weights);
-
-  requestSentiment.onload = () => {
-    if (requestSentiment.status == 200) {// success 
-      obj = JSON.parse(requestSentiment.response);
-
-      x = [];
-      y = [];
-      for (var key in obj) {
-        x.push(key);
-        y.push(parseFloat(obj[key]));
-      }
-    
-      traceSentiment.x = x;
-      traceSentiment.y = y;
-      
-      requestPrice = retrievePriceData(coin, startDate, endDate);
-
-      requestPrice.onload = () => {
-        if (requestPrice.status == 200) {// success 
-          obj = JSON.parse(requestPrice.response);
+  requestBatch = retrieveBatchData([coin], startDate, endDate, metrics, weights);
+
+  requestBatch.onload = () => {
+    if (requestBatch.status == 200) {// success 
+      obj = JSON.parse(requestBatch.response)[coin.toUpperCase()];
+
+      populateTrace(obj.sentiment, traceSentiment);
+      populateTrace(obj.price, tracePrice);
     
-          x = [];
-          y = [];
-          for (var key in obj) {
-            x.push(key);
-            y.push(parseFloat(obj[key]));
-          }
-        
-          tracePrice.x = x;
-          tracePrice.y = y;
-        
-          Plotly.newPlot(graphSentiment, [traceSentiment, tracePrice], sentimentLayout);
-        } 
-        else {
-            console.log(`Error ${requestPrice.status}: ${requestPrice.statusText}`)
-        }
-      };
+      Plotly.newPlot(graphSentiment, [traceSentiment, tracePrice], sentimentLayout);
     } 
     else {
-        console.log(`Error ${requestSentiment.status}: ${requestSentiment.statusText}`)
+        console.log(`Error ${requestBatch.status}: ${requestBatch.statusText}`)
     }
   };
 }
\ No newline at end of file
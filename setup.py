@@ -10,7 +10,7 @@ setup(name='finndex',
       author='Finn Frankis',
       author_email='finn@teachmy.com',
       license='MIT',
-      packages=['finndex', 'finndex.util', 'finndex.sentiment', 'finndex.fundamental', 'finndex.aggregate'],
+      packages=['finndex', 'finndex.util', 'finndex.sentiment', 'finndex.fundamental', 'finndex.aggregate', 'finndex.api'],
       install_requires=['beautifulsoup4',
                         'ipykernel',
                         'ipython',
@@ -24,4 +24,6 @@ setup(name='finndex',
                         'requests',
                         'scipy',
                         'stanfordnlp'],
+      extras_require={'serve': ['gunicorn', 'waitress']},
+      package_data={'finndex': ['widgets/*']},
       zip_safe=False)